@@ -1,55 +1,200 @@
-import librosa
+import time
+STARTUP_T0 = time.perf_counter()
+
+import numpy as np
 import shutil
 import os
-from PIL import Image
-from tensorflow.keras.models import load_model
-import sounddevice as sd
-from scipy.io.wavfile import write
-import time
+import tempfile
 
-from service.cut_sound import cut_sound_per_action
-from service.cut_sound_splite_on_silence import cut_sound_per_action_split_on_silence
-from utils.plot_compare import plot_compare
-from service.converting_sound_to_mel_image import sound_to_image, sound_to_image_mel_mfcc
-from service.redution import reduce_audio_noise
-from utils.preprocess_the_image import convert_to_array
+from service.cut_sound import cut_sound_per_action, cut_sound_per_action_array, salience_order
+from service.converting_sound_to_mel_image import sound_to_image_mel_mfcc, mel_mfcc_image
+from utils.preprocess_the_image import convert_to_array, stack_images
+from service.inference import classify_batch, load_backend
+from service.warmup import warm_up
+from utils.debug_sink import save_debug_artifacts
+from utils.timing import PhaseTimer
+from utils.metrics import metrics, COUNT_BUCKETS
 from sensor.servo_control import set_angle, cleanup
 from sensor.stepper_controls import setup_gpio, motor_control, reset_motors_position
+from sensor.motion_planner import MotionPlanner
 from sensor.LED_status import LED_status_color
 from sensor.Ultrasonic_control import DropPassDetector      # <-- add this
-from service.amplify import amplify_audio
+from sensor.audio_capture import AudioCapture, SoundDeviceSource
+from service.amplify import amplify_audio, normalize_peak
+from service.redution import SpectralGate
+from service.pipeline import DropPipeline
 
-Image.MAX_IMAGE_PIXELS = None
+# Hand NumPy buffers from capture to model without WAV/PNG files in between.
+IN_MEMORY_PIPELINE = True
+# Set to a folder (e.g. "./debug") to also keep the WAV/PNG of every drop.
+DEBUG_DIR = None
+# Audio kept from before the ultrasonic trigger (part of the recording window).
+PRE_TRIGGER_MS = 200
+# Drops waiting between pipeline stages, and what to do when that is full:
+# "block" (stop capturing), "drop_newest" or "drop_oldest" (skip inference and tip
+# the item into PIPELINE_FALLBACK_BIN, a carousel position 0-6; required for those two).
+PIPELINE_QUEUE_SIZE = 2
+PIPELINE_DROP_POLICY = "block"
+PIPELINE_FALLBACK_BIN = None
+# Early exit: classify the segments of a drop one at a time, most salient first,
+# and stop at the first one at least this confident (None = off: classify all in one
+# batch). Changes which segment wins; tune it (e.g. 0.95) from the logged inferences saved.
+EARLY_EXIT_CONFIDENCE = None
+# Spectral noise gate with a noise profile learned from idle audio between drops
+# (in-memory pipeline only). Off by default: the current model was trained on
+# ungated features.
+NOISE_GATE = False
+NOISE_UPDATE_INTERVAL_S = 1.0   # learn from idle audio this often while waiting
+NOISE_WINDOW_S = 0.5            # idle audio per update
+NOISE_IDLE_GUARD_S = 2.5        # no update this soon after a trigger (impact, sorting)
+LAST_TRIGGER_TIME = 0.0
+# Carousel motion planner: both motors at once, an idle pose chosen from the class
+# frequencies (kept in CLASS_COUNTS_PATH, with the pose the carousel was left in)
+# and pre-positioning while the remaining segments are classified once one is at
+# least PREPOSITION_CONFIDENCE (None = off; needs EARLY_EXIT_CONFIDENCE).
+MOTION_PLANNER = True
+PARALLEL_MOVES = True
+PREPOSITION_CONFIDENCE = 0.8
+CLASS_COUNTS_PATH = "./models/class_counts.json"
+planner = None
+pipeline = None   # the running DropPipeline (pre-positioning waits for its earlier items)
+# Prometheus text on http://127.0.0.1:<port>/metrics (None = off) and a summary line every N s
+METRICS_PORT = 9108
+METRICS_LOG_INTERVAL_S = 60
+# Inference runtime: "cached" (.h5, loaded from a cached TFLite copy after the first start),
+# "keras", "compiled" (.h5 as pre-traced tf.functions), "tflite" or "onnx"
+# (export with python -m service.export_model), or "remote" to use a shared
+# inference server (python -m service.inference_server) instead of a local model
+INFERENCE_BACKEND = "cached"
+MODEL_NAME = "Resnet34_Mel_MFCC_1SEC_100each_noise70%_Rescaling_max_07SEC400-40"
+MODEL_PATHS = {
+    "keras": f"./models/{MODEL_NAME}.h5",
+    "cached": f"./models/{MODEL_NAME}.h5",
+    "compiled": f"./models/{MODEL_NAME}.h5",
+    "tflite": f"./models/{MODEL_NAME}_int8.tflite",
+    "onnx": f"./models/{MODEL_NAME}.onnx",
+    "remote": "http://127.0.0.1:8765",
+}
+CLASS_NAMES = ['battery', 'bottle', 'box', 'can', 'glass', 'paper', 'pingpong']
+SAMPLE_RATE = 22050
+DURATION = 1.5  # sec, recording window per drop
+ULTRASONIC = dict(TRIG=26, ECHO=25, NEAR_CM=17, FAR_CM_RELEASE=18, CYCLE_MS=12)
+# Second HC-SR04 across the chute (test2.py wiring) for fast/small items:
+# ULTRASONIC.update(sensors=[(26, 25), (16, 7)], COOLDOWN_MS=60)
 
-def process_and_predict(model, class_names, amplified_path, input_path, sample_rate):
-    check_action = cut_sound_per_action(amplified_path, "./results/sound", sample_rate)
+def process_and_predict(model, class_names, amplified_path, work_dir, sample_rate):
+    # Segments and images go into this item's own work_dir (no shared ./results, ./images)
+    sound_dir = os.path.join(work_dir, "sound")
+    image_dir = os.path.join(work_dir, "images")
+    with metrics.span("segment"):
+        check_action = cut_sound_per_action(amplified_path, sound_dir, sample_rate)
     if not check_action:
         print("No actions detected, skipping processing.")
-        safe_remove(amplified_path)
-        safe_remove(input_path)
+        metrics.inc("items_silent")
         time.sleep(0.2)
         return None
 
-    sound_to_image_mel_mfcc(
-        dataset_path="./results/sound",
-        output_path="./images",
-        n_mels=128, n_mfcc=20, n_fft=2048, hop_length=512
-    )
-
-    all_preds = []
-    for dirpath, _, filenames in os.walk("./images"):
-        for f in filenames:
-            if f.endswith('.png'):
-                img_path = os.path.join(dirpath, f)
-                img_array = convert_to_array(img_path)
-                pred = model.predict(img_array, verbose=0)
-                predicted_class_index = pred.argmax(axis=1)[0]
-                pred_max = float(pred.max())
-                all_preds.append((predicted_class_index, pred_max))
+    with metrics.span("features"):
+        sound_to_image_mel_mfcc(
+            dataset_path=sound_dir,
+            output_path=image_dir,
+            n_mels=128, n_mfcc=20, n_fft=2048, hop_length=512
+        )
+
+        img_arrays = []
+        for dirpath, _, filenames in os.walk(image_dir):
+            for f in filenames:
+                if f.endswith('.png'):
+                    img_path = os.path.join(dirpath, f)
+                    img_arrays.append(convert_to_array(img_path))
+    metrics.observe("segments_per_item", len(img_arrays), COUNT_BUCKETS)
+
+    # One predict call for all segments of this drop
+    with metrics.span("inference"):
+        all_preds = classify_batch(model, np.concatenate(img_arrays)) if img_arrays else []
+
+    return report_predictions(all_preds, class_names)
+
+def process_and_predict_in_memory(model, class_names, audio, sample_rate, profile=None, debug_dir=None,
+                                  noise_gate=None, gain=1.0):
+    with metrics.span("segment"):
+        segments = cut_sound_per_action_array(audio, sample_rate, profile=profile)
+    if not segments:
+        print("No actions detected, skipping processing.")
+        metrics.inc("items_silent")
+        return None
+    metrics.observe("segments_per_item", len(segments), COUNT_BUCKETS)
+
+    gated = noise_gate is not None and noise_gate.ready
+    if EARLY_EXIT_CONFIDENCE is not None and len(segments) > 1:
+        return predict_early_exit(model, class_names, segments, sample_rate,
+                                  noise_gate if gated else None, gain, debug_dir, audio)
 
+    with metrics.span("features"):
+        if gated:
+            # Gate the segments' STFT once and build the features from it
+            spectra = noise_gate.segments_power(segments, gain)
+        else:
+            spectra = [None] * len(segments)
+        images = [mel_mfcc_image(segment, sample_rate,
+                                 n_mels=128, n_mfcc=20, n_fft=2048, hop_length=512, S=S)
+                  for segment, S in zip(segments, spectra)]
+
+    if debug_dir is not None:
+        save_debug_artifacts(debug_dir, time.strftime("%Y%m%d_%H%M%S"), sample_rate,
+                             audio=audio, segments=segments, images=images)
+
+    # One predict call for all segments of this drop
+    with metrics.span("inference"):
+        all_preds = classify_batch(model, stack_images(images))
+
+    return report_predictions(all_preds, class_names)
+
+def predict_early_exit(model, class_names, segments, sample_rate, noise_gate=None, gain=1.0,
+                       debug_dir=None, audio=None):
+    """
+    Features + inference per segment in salience order, stopping at the first
+    prediction >= EARLY_EXIT_CONFIDENCE. If none gets there every segment is
+    classified and the max-confidence rule picks the class, as in batch mode.
+    """
+    order = salience_order(segments)
+    all_preds, images = [], []
+    for i in order:
+        with metrics.span("features"):
+            S = noise_gate.segments_power([segments[i]], gain)[0] if noise_gate is not None else None
+            image = mel_mfcc_image(segments[i], sample_rate,
+                                   n_mels=128, n_mfcc=20, n_fft=2048, hop_length=512, S=S)
+        images.append(image)
+        with metrics.span("inference"):
+            class_idx, confidence = classify_batch(model, stack_images([image]))[0]
+        all_preds.append((i, class_idx, confidence))
+        if confidence >= EARLY_EXIT_CONFIDENCE:
+            break
+        if (planner is not None and PREPOSITION_CONFIDENCE is not None and len(all_preds) == 1
+                and confidence >= PREPOSITION_CONFIDENCE
+                and (pipeline is None or pipeline.actuation_idle())):
+            # Top candidate already clear and no earlier item left to sort:
+            # turn the carousel while the rest is classified
+            planner.preposition(int(class_idx), item=pipeline.classifying if pipeline else None)
+
+    saved = len(segments) - len(all_preds)
+    metrics.inc("inferences_run", len(all_preds))
+    metrics.inc("inferences_saved", saved)
+    print(f"Early exit: {len(all_preds)}/{len(segments)} segments classified, {saved} inferences saved")
+
+    if debug_dir is not None:
+        save_debug_artifacts(debug_dir, time.strftime("%Y%m%d_%H%M%S"), sample_rate,
+                             audio=audio, segments=[segments[i] for i, _, _ in all_preds], images=images)
+
+    # Same printing and decision rule as batch mode; images numbered by segment
+    return report_predictions([(class_idx, confidence) for _, class_idx, confidence in all_preds],
+                              class_names, image_ids=[i for i, _, _ in all_preds])
+
+def report_predictions(all_preds, class_names, image_ids=None):
+    """all_preds: (class_idx, confidence) per image; image_ids: their segment numbers (default 0, 1, ...)."""
     if all_preds:
         print("Class predictions and confidences:")
-        for idx, (class_idx, confidence) in enumerate(all_preds):
+        for idx, (class_idx, confidence) in zip(image_ids or range(len(all_preds)), all_preds):
             print(f"Image {idx+1}: {class_names[class_idx]} (class {class_idx}), confidence: {confidence*100:.2f}%")
         best_idx, best_conf = max(all_preds, key=lambda x: x[1])
         print(f"Best class: {class_names[best_idx]} (class {best_idx}), confidence: {best_conf*100:.2f}%")
@@ -58,74 +203,195 @@ def process_and_predict(model, class_names, amplified_path, input_path, sample_r
         print("No valid class predicted, no motor rotation.")
         return None
 
-def safe_remove(path):
-    try:
-        os.remove(path)
-    except FileNotFoundError:
-        pass
+def cleanup_artifacts(work_dir):
+    shutil.rmtree(work_dir, ignore_errors=True)
 
-def cleanup_artifacts(amplified_path, input_path):
-    shutil.rmtree('./results', ignore_errors=True)
-    shutil.rmtree("./images", ignore_errors=True)
-    for p in (amplified_path, input_path):
-        safe_remove(p)
+def learn_noise(noise_gate, capture):
+    """While nothing is falling, fold the latest idle audio into the noise profile."""
+    if time.monotonic() - LAST_TRIGGER_TIME < NOISE_IDLE_GUARD_S:
+        return
+    if not noise_gate.update(capture.latest(NOISE_WINDOW_S)):
+        metrics.inc("noise_updates_skipped")
+
+def detect_and_capture(detector, capture, duration, noise_gate=None):
+    """Pipeline stage 1: wait for a FAR->NEAR edge, then take the recording window."""
+    global LAST_TRIGGER_TIME
+    # A drop queued while this stage was blocked may have left the ring buffer
+    # already: skip it rather than fail the capture
+    max_age_s = capture.buffer_seconds - duration
+    stale = detector.stale_drops
+    if noise_gate is None:
+        trigger_time = detector.wait_for_drop(max_age_s=max_age_s)
+    else:
+        trigger_time = detector.wait_for_drop(timeout=NOISE_UPDATE_INTERVAL_S, max_age_s=max_age_s)
+        while trigger_time is None:
+            learn_noise(noise_gate, capture)
+            trigger_time = detector.wait_for_drop(timeout=NOISE_UPDATE_INTERVAL_S, max_age_s=max_age_s)
+    if detector.stale_drops > stale:
+        print(f"Skipped {detector.stale_drops - stale} drop(s) older than the audio buffer")
+        metrics.inc("drops_skipped_stale", detector.stale_drops - stale)
+    LAST_TRIGGER_TIME = trigger_time
+    print("Detected !!")
+    print(f"Recording for {duration} seconds ({PRE_TRIGGER_MS} ms before trigger)...")
+    with metrics.span("capture"):
+        recording = capture.capture(duration, trigger_time=trigger_time)
+    print("Recording complete!")
+    return recording, trigger_time
+
+def classify_recording(model, class_names, recording, sample_rate, noise_gate=None):
+    """Pipeline stage 2: amplify, segment, features, inference -> class index or None."""
+    start_time = time.time()
+
+    if IN_MEMORY_PIPELINE:
+        # The recording belongs to this item only, so normalize it in place
+        with metrics.span("amplify"):
+            normalized = normalize_peak(recording, sample_rate, out=recording)
+        if normalized.audio is None:
+            print("No actions detected, skipping processing.")
+            metrics.inc("items_silent")
+            return None
+
+        best_idx = process_and_predict_in_memory(model, class_names, normalized.audio, sample_rate,
+                                                 profile=normalized.profile, debug_dir=DEBUG_DIR,
+                                                 noise_gate=noise_gate, gain=normalized.gain)
+    else:
+        from scipy.io.wavfile import write
+        work_dir = tempfile.mkdtemp(prefix="ecosonic_")
+        try:
+            input_path = os.path.join(work_dir, "input.wav")
+            write(input_path, sample_rate, recording)
+
+            with metrics.span("amplify"):
+                amplified_path, sound_action = amplify_audio(input_path,
+                                                             output_path=os.path.join(work_dir, "amplified.wav"))
+            if not sound_action:
+                print("No actions detected, skipping processing.")
+                metrics.inc("items_silent")
+                return None
+
+            best_idx = process_and_predict(model, class_names, amplified_path, work_dir, sample_rate)
+        finally:
+            cleanup_artifacts(work_dir)
+
+    end_time = time.time()
+    print(f"Processing time: {end_time - start_time:.2f} seconds")
+    return best_idx
+
+def setup_motion(backend=None):
+    """Carousel on the GPIO driver (or the given stepper backend), with the planner if enabled."""
+    global planner
+    carousel = setup_gpio(backend)
+    if MOTION_PLANNER:
+        planner = MotionPlanner(carousel, parallel=PARALLEL_MOVES, counts_path=CLASS_COUNTS_PATH)
+    return carousel
+
+def actuate(best_idx):
+    """Pipeline stage 3: rotate the carousel to the class and tip the item in."""
+    if best_idx is None:
+        return
+    if planner is None:
+        with metrics.span("motor_move"):
+            motor_control(int(best_idx))
+        tip_item()
+        return
+
+    # No background move (pre-positioning, going home) while this item is sorted
+    with planner.lock:
+        with metrics.span("motor_move"):
+            travel = planner.move_to(int(best_idx), item=pipeline.actuating if pipeline else None)
+        metrics.observe("motor_expected_seconds", travel.expected)
+        metrics.observe("motor_actual_seconds", travel.actual)
+        print(f"Motor travel: expected {travel.expected:.3f} s, actual {travel.actual:.3f} s"
+              + (f" (+{travel.early:.3f} s pre-positioned)" if travel.early else ""))
+        tip_item()
+        planner.go_home()
+
+def tip_item():
+    time.sleep(0.2)
+    with metrics.span("servo"):
+        set_angle(120)
+        time.sleep(1)
+        set_angle(0)
 
 if __name__ == "__main__":
     detector = None
+    capture = None
+    pipeline = None
+    carousel = None
     try:
-        LED_status_color("Red")
-        class_names = ['battery', 'bottle', 'box', 'can', 'glass', 'paper', 'pingpong']
-        model_name = "Resnet34_Mel_MFCC_1SEC_100each_noise70%_Rescaling_max_07SEC400-40.h5"
-        model = load_model(f"./models/{model_name}")
+        startup = PhaseTimer(STARTUP_T0)
+        startup.mark("imports")
+
+        class_names = CLASS_NAMES
+        sample_rate = SAMPLE_RATE
+        duration = DURATION
+
+        with startup.phase("GPIO"):
+            LED_status_color("Red")
+            carousel = setup_motion()
+
+        with startup.phase("model load"):
+            model = load_backend(INFERENCE_BACKEND, MODEL_PATHS[INFERENCE_BACKEND])
+
+        with startup.phase("warm-up"):
+            warm_up(model, sample_rate, duration)
+
+        with startup.phase("audio stream"):
+            capture = AudioCapture(SoundDeviceSource(sample_rate), sample_rate,
+                                   buffer_seconds=5.0, pre_trigger_ms=PRE_TRIGGER_MS).start()
+
+        with startup.phase("ultrasonic"):
+            detector = DropPassDetector(**ULTRASONIC)
+
+        startup.report()
 
-        sample_rate = 22050
-        duration = 1.5  # sec
+        if METRICS_PORT is not None:
+            metrics.serve(METRICS_PORT)
+        metrics.start_summary_log(METRICS_LOG_INTERVAL_S)
 
-        setup_gpio()
-        detector = DropPassDetector(TRIG=26, ECHO=25, NEAR_CM=17, FAR_CM_RELEASE=18, CYCLE_MS=12)
+        # Ready: LED follows the detector state from now on, updated only on transitions
+        detector.subscribe(lambda state, t: LED_status_color("Red" if state == 0 else "Green"))
+        LED_status_color("Red" if detector.read() == 0 else "Green")
+        noise_gate = SpectralGate(sample_rate) if NOISE_GATE and IN_MEMORY_PIPELINE else None
 
         print("System is ready, waiting for ultrasonic trigger...")
 
-        while True:
-            state = detector.read()
-            LED_status_color("Red" if state == 0 else "Green")
-
-            if state == 0:
-                print("Detected !!")
-                print(f"Recording for {duration} seconds...")
-                recording = sd.rec(int(duration * sample_rate),
-                                   samplerate=sample_rate, channels=1, dtype='float32')
-                sd.wait()
-                print("Recording complete!")
-                input_path = "temp_input.wav"
-                start_time = time.time()
-                write(input_path, sample_rate, recording)
-
-                amplified_path, sound_action = amplify_audio(input_path)
-                if not sound_action:
-                    print("No actions detected, skipping processing.")
-                    safe_remove(input_path)
-                    time.sleep(0.2)
-                    continue
-
-                best_idx = process_and_predict(model, class_names, amplified_path, input_path, sample_rate)
-                if best_idx is not None:
-                    motor_control(int(best_idx))
-                    time.sleep(0.2)
-                    set_angle(120)
-                    time.sleep(1)
-                    set_angle(0)
-
-                cleanup_artifacts(amplified_path, input_path)
-                end_time = time.time()
-                print(f"Processing time: {end_time - start_time:.2f} seconds")
-
-            time.sleep(0.001)
+        pipeline = DropPipeline(
+            capture_fn=lambda: detect_and_capture(detector, capture, duration, noise_gate),
+            classify_fn=lambda recording: classify_recording(model, class_names, recording, sample_rate,
+                                                             noise_gate),
+            actuate_fn=actuate,
+            queue_size=PIPELINE_QUEUE_SIZE,
+            drop_policy=PIPELINE_DROP_POLICY,
+            fallback_idx=PIPELINE_FALLBACK_BIN,
+        ).start()
+        pipeline.join()
 
     except KeyboardInterrupt:
         print("Exiting program")
-        reset_motors_position()
-        cleanup()
     finally:
+        # On every exit (Ctrl+C or an error): the next start assumes the default pose
+        if pipeline is not None:
+            # Let items already captured finish sorting before resetting the motors
+            pipeline.stop(timeout=10)
+        if carousel is not None:
+            try:
+                if planner is not None:
+                    planner.park()
+                else:
+                    reset_motors_position()
+            except Exception as e:
+                print(f"Could not reset the motors: {e}")
+            if planner is not None:
+                # also if parking failed: the saved pose is where the carousel really is
+                try:
+                    planner.save()
+                except Exception as e:
+                    print(f"Could not save the class counts: {e}")
+            cleanup()
+        if capture is not None:
+            capture.stop()
         if detector is not None:
-            detector.close
+            detector.close()
+        print(metrics.summary())
+        metrics.stop()
@@ -0,0 +1,175 @@
+"""
+Per-function benchmarks for the audio -> image -> model path on synthetic
+drop recordings (utils/synthetic_audio.drop_recording), no hardware and no
+model file needed.
+
+    python -m benchmarks.bench_functions --repeat 20 --out bench.json
+    python -m benchmarks.bench_functions --compare bench.json   # vs an older run
+
+Every function is timed `repeat` times (median / p95 ms) after one untimed
+warm-up call, then run once more under tracemalloc for the peak Python/NumPy
+allocation. The file-based functions run inside a temporary directory, so
+their temp_*.wav outputs do not land in the working tree.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import soundfile as sf
+
+from utils.synthetic_audio import drop_recording
+
+SAMPLE_RATE = 22050
+
+
+class StubModel:
+    """Stands in for the Keras model: fixed random projection + softmax."""
+
+    def __init__(self, n_classes=5, seed=0):
+        self.weights = np.random.default_rng(seed).normal(size=(3, n_classes)).astype(np.float32)
+
+    def predict(self, batch):
+        logits = batch.mean(axis=(1, 2)) @ self.weights / 255.0
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+
+def measure(fn, repeat):
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - t0) * 1000)
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "median_ms": float(np.median(times)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "min_ms": float(np.min(times)),
+        "peak_alloc_kb": peak / 1024,
+        "repeat": repeat,
+    }
+
+
+def make_inputs(work_dir, snr_db, n_segments=4):
+    """Recording, one pre-cut segment dataset and one feature PNG on disk."""
+    y = drop_recording(SAMPLE_RATE, duration=3.0, impact_times=(0.5, 1.6), snr_db=snr_db)
+    recording = os.path.join(work_dir, "recording.wav")
+    sf.write(recording, y, SAMPLE_RATE)
+
+    dataset = os.path.join(work_dir, "dataset", "class_a")
+    os.makedirs(dataset)
+    for i in range(n_segments):
+        segment = drop_recording(SAMPLE_RATE, duration=0.7, impact_times=(0.05,), snr_db=snr_db, seed=i)
+        sf.write(os.path.join(dataset, f"value_{i + 1}.wav"), segment, SAMPLE_RATE)
+
+    from PIL import Image
+    from service.converting_sound_to_mel_image import mel_mfcc_image
+    image = os.path.join(work_dir, "value_1.png")
+    Image.fromarray(mel_mfcc_image(y[:int(0.7 * SAMPLE_RATE)], SAMPLE_RATE)).save(image)
+    return recording, os.path.dirname(dataset), image
+
+
+def benchmarks(work_dir, recording, dataset, image):
+    from service.amplify import amplify_audio
+    from service.redution import reduce_audio_noise
+    from service.cut_sound import cut_sound_per_action
+    from service.cut_sound_splite_on_silence import cut_sound_per_action_split_on_silence
+    from service.converting_sound_to_mel_image import sound_to_image_mel_mfcc, sound_to_image
+    from service.inference import classify_batch
+    from utils.preprocess_the_image import convert_to_array
+
+    segments_dir = os.path.join(work_dir, "segments")
+    images_dir = os.path.join(work_dir, "images")
+    batch = np.concatenate([convert_to_array(image)] * 3)
+    model = StubModel()
+    return {
+        "amplify_audio": lambda: os.remove(amplify_audio(recording)[0]),
+        "reduce_audio_noise": lambda: reduce_audio_noise(recording),
+        "cut_sound_per_action": lambda: cut_sound_per_action(recording, segments_dir),
+        "cut_sound_per_action_split_on_silence":
+            lambda: cut_sound_per_action_split_on_silence(recording, segments_dir),
+        "sound_to_image_mel_mfcc": lambda: sound_to_image_mel_mfcc(dataset, images_dir),
+        "sound_to_image": lambda: sound_to_image(dataset, images_dir),
+        "convert_to_array": lambda: convert_to_array(image),
+        "classify_batch (stub model)": lambda: classify_batch(model, batch),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, previous=None):
+    print(f"{'function':<40} {'median ms':>10} {'p95 ms':>9} {'peak KiB':>10}" + ("  vs previous" if previous else ""))
+    for name, r in results.items():
+        line = f"{name:<40} {r['median_ms']:>10.2f} {r['p95_ms']:>9.2f} {r['peak_alloc_kb']:>10.0f}"
+        if previous and name in previous:
+            line += f"  {r['median_ms'] / previous[name]['median_ms']:>6.2f}x"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-function benchmarks on synthetic drops")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--snr-db", type=float, default=30.0)
+    parser.add_argument("--only", help="comma separated function names")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON from an earlier run to compare medians against")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    out = os.path.abspath(args.out) if args.out else None
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            inputs = make_inputs(work_dir, args.snr_db)
+            selected = args.only.split(",") if args.only else None
+            for name, fn in benchmarks(work_dir, *inputs).items():
+                if selected and name not in selected:
+                    continue
+                print(f"Benchmarking {name} . . .", file=sys.stderr)
+                results[name] = measure(fn, args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    print_results(results, previous)
+    if out:
+        report = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "snr_db": args.snr_db,
+            "results": results,
+        }
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to: {out}")
+
+
+if __name__ == "__main__":
+    main()
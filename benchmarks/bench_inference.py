@@ -0,0 +1,68 @@
+"""
+Micro-benchmark: KerasBackend (model.predict per drop) vs CompiledKerasBackend
+(pre-traced tf.function per batch bucket) for the 1-5 image batches one drop
+produces.
+
+    python -m benchmarks.bench_inference --model models/X.h5 --repeat 50
+
+Without --model a small random CNN with the same input shape is used, which
+shows the per-call overhead but not the real model's compute time.
+"""
+
+import argparse
+import time
+import numpy as np
+
+from service.inference import CompiledKerasBackend, KerasBackend, INPUT_SHAPE
+
+
+def stub_model(n_classes=5):
+    import tensorflow as tf
+    return tf.keras.Sequential([
+        tf.keras.Input(INPUT_SHAPE),
+        tf.keras.layers.Rescaling(1 / 255.0),
+        tf.keras.layers.Conv2D(8, 3, strides=4, activation="relu"),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(n_classes, activation="softmax"),
+    ])
+
+
+def time_calls(backend, batch, repeat):
+    backend.predict(batch)  # first call outside the timing
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        backend.predict(batch)
+        times.append((time.perf_counter() - t0) * 1000)
+    return np.median(times), np.percentile(times, 95)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="model.predict vs compiled inference")
+    parser.add_argument("--model", help="Keras .h5 model (default: small stub CNN)")
+    parser.add_argument("--batch-sizes", default="1,2,3,4,5")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    if args.model:
+        keras = KerasBackend(args.model)
+    else:
+        keras = KerasBackend(model=stub_model())
+
+    t0 = time.perf_counter()
+    compiled = CompiledKerasBackend(model=keras.model)
+    print(f"Tracing buckets {compiled.buckets}: {time.perf_counter() - t0:.2f} s (once, at startup)")
+
+    rng = np.random.default_rng(0)
+    print(f"{'batch':>5} {'predict ms':>16} {'compiled ms':>16} {'speed-up':>9} {'max |diff|':>11}")
+    for n in [int(b) for b in args.batch_sizes.split(",")]:
+        batch = rng.uniform(0, 255, (n,) + INPUT_SHAPE).astype(np.float32)
+        k_med, k_p95 = time_calls(keras, batch, args.repeat)
+        c_med, c_p95 = time_calls(compiled, batch, args.repeat)
+        diff = np.abs(keras.predict(batch) - compiled.predict(batch)).max()
+        print(f"{n:>5} {k_med:>7.2f} (p95 {k_p95:>5.1f}) {c_med:>7.2f} (p95 {c_p95:>5.1f}) "
+              f"{k_med / c_med:>8.1f}x {diff:>11.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Load generator for the inference server: N simulated bins, each dropping
+items at a given rate (Poisson arrivals), every drop sending 1-4 feature
+images like a real drop's segments.
+
+    python -m benchmarks.load_inference_server --bins 8 --drops-per-min 30 --seconds 30
+    python -m benchmarks.load_inference_server --url http://10.0.0.5:8765 --bins 8
+
+Without --url a server is started in this process (--model, or a small
+random CNN as in bench_inference). Reports request latency p50/p99,
+throughput and the server's mean batch size; run with --max-wait-ms 0 to
+compare against no coalescing.
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.request
+import numpy as np
+
+from service.inference import CompiledKerasBackend, INPUT_SHAPE, load_backend
+from service.inference_server import DEFAULT_PORT, MAX_BATCH, MAX_WAIT_MS, MicroBatcher, RemoteBackend, make_server
+
+
+def simulate_bin(url, drops_per_min, seconds, seed, latencies, errors):
+    client = RemoteBackend(url)
+    rng = np.random.default_rng(seed)
+    images = rng.integers(0, 256, (4, *INPUT_SHAPE), dtype=np.uint8)
+    end = time.monotonic() + seconds
+    next_drop = time.monotonic() + rng.exponential(60 / drops_per_min)
+    while next_drop < end:
+        time.sleep(max(0.0, next_drop - time.monotonic()))
+        n = int(rng.integers(1, 5))
+        t0 = time.perf_counter()
+        try:
+            client.predict(images[:n])
+            latencies.append((time.perf_counter() - t0) * 1000)
+        except Exception as e:
+            errors.append(e)
+        next_drop += rng.exponential(60 / drops_per_min)
+
+
+def start_local_server(args):
+    if args.model:
+        backend = load_backend(args.backend, args.model)
+    else:
+        from benchmarks.bench_inference import stub_model
+        backend = CompiledKerasBackend(model=stub_model())
+    for n in range(1, args.max_batch + 1):
+        backend.predict(np.zeros((n, *INPUT_SHAPE), dtype=np.float32))
+    batcher = MicroBatcher(backend, args.max_batch, args.max_wait_ms)
+    server = make_server(batcher, "127.0.0.1", args.port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, batcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate N bins against the inference server")
+    parser.add_argument("--url", default=None, help="existing server; default starts one in-process")
+    parser.add_argument("--bins", type=int, default=8)
+    parser.add_argument("--drops-per-min", type=float, default=30.0, help="per bin")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--backend", default="compiled")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args(argv)
+
+    server = batcher = None
+    url = args.url
+    if url is None:
+        server, batcher = start_local_server(args)
+        url = f"http://127.0.0.1:{args.port}"
+
+    latencies, errors = [], []
+    bins = [threading.Thread(target=simulate_bin,
+                             args=(url, args.drops_per_min, args.seconds, seed, latencies, errors))
+            for seed in range(args.bins)]
+    t0 = time.perf_counter()
+    for b in bins:
+        b.start()
+    for b in bins:
+        b.join()
+    elapsed = time.perf_counter() - t0
+
+    with urllib.request.urlopen(f"{url}/health") as response:
+        health = json.loads(response.read())
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        batcher.stop()
+
+    print(f"{args.bins} bins x {args.drops_per_min:g} drops/min for {elapsed:.1f} s "
+          f"(max batch {args.max_batch}, max wait {args.max_wait_ms:g} ms)")
+    if latencies:
+        print(f"  requests: {len(latencies)} ok, {len(errors)} failed, "
+              f"{len(latencies) / elapsed:.2f} drops/s")
+        print(f"  latency: p50 {np.percentile(latencies, 50):.1f} ms, "
+              f"p99 {np.percentile(latencies, 99):.1f} ms, max {max(latencies):.1f} ms")
+    else:
+        print(f"  no completed requests ({len(errors)} failed)")
+    print(f"  server: {health['batches']} batches, {health['images']} images, "
+          f"mean batch {health['mean_batch']:.2f}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
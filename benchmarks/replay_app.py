@@ -0,0 +1,240 @@
+"""
+Offline replay of the app.py loop: recorded or synthetic drops go through the
+real detection -> capture -> classify_recording -> actuate code, with the
+Pi hardware simulated:
+
+- microphone: ArraySource playing one timeline with every drop's audio placed
+  at its trigger time (PRE_TRIGGER_MS before it, like the live capture window)
+- ultrasonic: sensor/fake_pigpio.py replaying a distance trace (synthetic
+  dips at the drop times, or a recorded CSV "seconds,cm")
+- steppers, servo and LED: SimulatedDriver(realtime=True) from
+  sensor/gpio_driver.py, which sleeps for the real pulse-train and servo times
+
+Everything runs in real time, so the numbers include actuation time.
+
+    python -m benchmarks.replay_app --dataset data/test_drops --count 20 --interval 4
+    python -m benchmarks.replay_app --synthetic --count 10 --stub-model
+
+Dataset layout: <dataset>/<class name>/*.wav, one drop per file; class names
+must match app.CLASS_NAMES to count towards accuracy. Reports items/minute,
+end-to-end latency (trigger -> item sorted) and accuracy.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+
+from sensor.gpio_driver import SimulatedDriver, set_driver
+
+MATCH_WINDOW_S = 0.3    # a trigger this close to a drop belongs to it
+
+
+def dataset_drops(dataset, class_names, count, sample_rate, seed=0):
+    from service.convert_dataset import list_audio_files
+    from utils.audio_io import load_audio
+    from utils.feature_shards import label_of
+
+    files = list_audio_files(dataset)
+    if not files:
+        raise ValueError(f"No audio files in {dataset}")
+    rng = np.random.default_rng(seed)
+    rng.shuffle(files)
+    drops = []
+    for rel in files[:count]:
+        audio, _ = load_audio(os.path.join(dataset, rel), sr=sample_rate, cache=False)
+        label = label_of(rel)
+        drops.append((audio, class_names.index(label) if label in class_names else None, rel))
+    return drops
+
+
+def synthetic_drops(count, sample_rate, duration, pre_trigger_ms, seed=0):
+    from utils.synthetic_audio import drop_recording
+
+    rng = np.random.default_rng(seed)
+    impact = pre_trigger_ms / 1000 + 0.1
+    return [(drop_recording(sample_rate, duration, impact_times=(impact,), freq=float(rng.uniform(400, 2000)),
+                            seed=seed + i), None, f"synthetic_{i + 1}")
+            for i in range(count)]
+
+
+def trace_drop_times(trace, near_cm):
+    """Times at which a recorded distance trace goes below near_cm."""
+    near = trace.distances_cm < near_cm
+    edges = np.flatnonzero(near[1:] & ~near[:-1]) + 1
+    return [float(trace.times_s[i]) for i in edges]
+
+
+def build_timeline(drops, drop_times, sample_rate, pre_trigger_ms, tail_s=3.0, idle_noise=1e-3, seed=0):
+    """One mono recording with every drop's audio starting pre_trigger_ms before its trigger."""
+    pre = int(pre_trigger_ms * sample_rate / 1000)
+    end = max(int(t * sample_rate) - pre + len(audio) for (audio, _, _), t in zip(drops, drop_times))
+    n = end + int(tail_s * sample_rate)
+    timeline = np.random.default_rng(seed).normal(0, idle_noise, n).astype(np.float32)
+    for (audio, _, _), t in zip(drops, drop_times):
+        start = max(0, int(t * sample_rate) - pre)
+        timeline[start:start + len(audio)] += audio[:n - start]
+    return timeline
+
+
+def match_items(triggers, drop_times):
+    """Drop index for every trigger (None for an extra trigger)."""
+    matched, used = [], set()
+    for t in triggers:
+        hits = [i for i, d in enumerate(drop_times) if abs(t - d) < MATCH_WINDOW_S and i not in used]
+        matched.append(hits[0] if hits else None)
+        used.update(hits[:1])
+    return matched
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay drops through the full app loop with simulated hardware")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dataset", help="folder of <class>/<file>.wav drops")
+    source.add_argument("--synthetic", action="store_true", help="synthetic drops (no labels)")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=4.0, help="seconds between drops")
+    parser.add_argument("--trace", default=None, help="recorded distance trace CSV (seconds,cm); drops at its NEAR edges")
+    parser.add_argument("--backend", default=None, help="default: app.INFERENCE_BACKEND")
+    parser.add_argument("--model", default=None, help="default: app.MODEL_PATHS[backend]")
+    parser.add_argument("--stub-model", action="store_true", help="random NumPy model instead of the real one")
+    parser.add_argument("--file-pipeline", action="store_true", help="IN_MEMORY_PIPELINE = False")
+    parser.add_argument("--queue-size", type=int, default=None)
+    parser.add_argument("--drop-policy", default=None)
+    parser.add_argument("--fallback-bin", type=int, default=None, help="bin for skipped items (PIPELINE_FALLBACK_BIN)")
+    parser.add_argument("--early-exit", type=float, default=None, help="EARLY_EXIT_CONFIDENCE (0 = off)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="keep the app's per-stage prints")
+    args = parser.parse_args(argv)
+
+    import app
+    from sensor import fake_pigpio
+    from sensor.audio_capture import ArraySource, AudioCapture
+    from sensor.stepper_motion import StepperBackend
+    from service.pipeline import DropPipeline
+    from utils.metrics import metrics
+
+    if args.file_pipeline:
+        app.IN_MEMORY_PIPELINE = False
+    if args.early_exit is not None:
+        app.EARLY_EXIT_CONFIDENCE = args.early_exit or None
+    queue_size = args.queue_size or app.PIPELINE_QUEUE_SIZE
+    drop_policy = args.drop_policy or app.PIPELINE_DROP_POLICY
+    fallback_idx = args.fallback_bin if args.fallback_bin is not None else app.PIPELINE_FALLBACK_BIN
+    sample_rate, duration, class_names = app.SAMPLE_RATE, app.DURATION, app.CLASS_NAMES
+
+    # ===== scenario =====
+    if args.dataset:
+        drops = dataset_drops(args.dataset, class_names, args.count, sample_rate, args.seed)
+    else:
+        drops = synthetic_drops(args.count, sample_rate, duration, app.PRE_TRIGGER_MS, args.seed)
+    if args.trace:
+        trace = fake_pigpio.DistanceTrace.from_csv(args.trace)
+        drop_times = trace_drop_times(trace, app.ULTRASONIC["NEAR_CM"])[:len(drops)]
+        drops = drops[:len(drop_times)]
+    else:
+        drop_times = [2.0 + i * args.interval for i in range(len(drops))]
+        trace = None
+    timeline = build_timeline(drops, drop_times, sample_rate, app.PRE_TRIGGER_MS, seed=args.seed)
+    if trace is None:
+        trace = fake_pigpio.DistanceTrace.synthetic(drop_times, idle_cm=app.ULTRASONIC["FAR_CM_RELEASE"] + 2,
+                                                    duration_s=len(timeline) / sample_rate)
+
+    # ===== model =====
+    if args.stub_model:
+        from benchmarks.bench_functions import StubModel
+        model = StubModel(len(class_names), seed=args.seed)
+    else:
+        backend = args.backend or app.INFERENCE_BACKEND
+        model = app.load_backend(backend, args.model or app.MODEL_PATHS[backend])
+    out = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(out):
+        app.warm_up(model, sample_rate, duration)
+
+    # ===== simulated hardware =====
+    sim = set_driver(SimulatedDriver(realtime=True))
+    stepper = StepperBackend(sim)
+    app.setup_motion(stepper)
+    capture = AudioCapture(ArraySource(timeline, sample_rate), sample_rate,
+                           buffer_seconds=5.0, pre_trigger_ms=app.PRE_TRIGGER_MS).start()
+    pi = fake_pigpio.pi(trace)      # t = 0 of the trace ~ first audio sample
+    detector = app.DropPassDetector(**app.ULTRASONIC, pi=pi, pigpio_module=fake_pigpio)
+
+    triggers, sorted_items = [], []
+
+    def capture_fn():
+        recording, trigger_time = app.detect_and_capture(detector, capture, duration)
+        triggers.append(trigger_time)
+        return recording, trigger_time
+
+    def actuate_fn(best_idx):
+        app.actuate(best_idx)
+        sorted_items.append((best_idx, time.monotonic()))
+
+    print(f"Replaying {len(drops)} drops over {len(timeline) / sample_rate:.1f} s (real time) . . .")
+    pipeline = DropPipeline(
+        capture_fn=capture_fn,
+        classify_fn=lambda recording: app.classify_recording(model, class_names, recording, sample_rate),
+        actuate_fn=actuate_fn,
+        queue_size=queue_size,
+        drop_policy=drop_policy,
+        fallback_idx=fallback_idx,
+    )
+    app.pipeline = pipeline
+    end = pi.t0 + len(timeline) / sample_rate
+    with contextlib.redirect_stdout(out):
+        pipeline.start()
+        # until the timeline is over and every captured item has been sorted
+        while time.monotonic() < end or pipeline.completed < pipeline.captured:
+            if time.monotonic() > end + 60 or pipeline.error is not None:
+                break
+            time.sleep(0.1)
+        pipeline.stop(timeout=10)
+    capture.stop()
+    detector.close()
+
+    # ===== report =====
+    n = min(len(triggers), len(sorted_items))
+    trigger_s = [t - pi.t0 for t in triggers[:n]]
+    matched = match_items(trigger_s, drop_times)
+    latencies = [(sorted_items[k][1] - triggers[k]) * 1000 for k in range(n)]
+    labelled = [(sorted_items[k][0], drops[i][1]) for k, i in enumerate(matched)
+                if i is not None and drops[i][1] is not None]
+    correct = sum(pred == label for pred, label in labelled)
+    detected = sum(i is not None for i in matched)
+
+    print(f"Drops: {len(drops)}, sorted: {n}, missed: {len(drops) - detected}, "
+          f"extra triggers: {n - detected}, unclassified: {sum(p is None for p, _ in sorted_items[:n])}")
+    if n:
+        span_s = sorted_items[n - 1][1] - triggers[0]
+        print(f"Throughput: {n / span_s * 60:.1f} items/min over {span_s:.1f} s "
+              f"(offered {len(drops) / (drop_times[-1] - drop_times[0] + duration) * 60:.1f} drops/min)")
+        print(f"End-to-end latency (trigger -> sorted): p50 {percentile(latencies, 50):.0f} ms, "
+              f"p90 {percentile(latencies, 90):.0f} ms, max {max(latencies):.0f} ms")
+    if labelled:
+        print(f"Accuracy: {correct}/{len(labelled)} = {correct / len(labelled) * 100:.1f}%")
+    else:
+        print("Accuracy: n/a (no labelled drops)")
+    servo_moves = sum(1 for _, _, duty in sim.pwm_log if duty > 0)
+    print(f"Actuation: {len(stepper.moves)} stepper moves ({sum(m['duration'] for m in stepper.moves):.2f} s), "
+          f"{servo_moves} servo moves")
+    if app.planner is not None:
+        print(app.planner.summary())
+    print(metrics.summary())
+    metrics.stop()
+    if pipeline.error is not None:
+        # a crashed pipeline is not a run with missed drops
+        print(f"Pipeline stopped: {type(pipeline.error).__name__}: {pipeline.error}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
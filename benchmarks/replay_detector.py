@@ -0,0 +1,156 @@
+"""
+Trace replay for DropPassDetector: detection rate and trigger latency
+against ground-truth drop times, one HC-SR04 vs several side by side.
+
+Synthetic drops fall through a CHUTE_CM wide chute at a random lateral
+position, size and speed (Poisson arrivals, --rate per second); a sensor
+sees an item only if it passes through its beam, for as long as the item
+takes to cross it. Each sensor gets its own distance trace on a
+SimulatedDriver, so the detector's real ping scheduling, echo callbacks,
+hysteresis and cooldown decide what is detected.
+
+    python -m benchmarks.replay_detector --count 1000 --rate 4
+    python -m benchmarks.replay_detector --trace drops.csv --truth truth.csv
+
+A recorded trace is a CSV "seconds,cm[,cm...]" with one distance column per
+sensor; --truth is one drop time per line (default: the NEAR edges of the
+closest sensor). Runs on the virtual clock unless --realtime (background
+ping thread, real time).
+"""
+
+import argparse
+import time
+import numpy as np
+
+from benchmarks.replay_app import percentile, trace_drop_times
+from sensor.fake_pigpio import DistanceTrace
+from sensor.gpio_driver import SimulatedDriver
+from sensor.Ultrasonic_control import DropPassDetector
+
+PINS = [(26, 25), (16, 7)]         # (TRIG, ECHO) of sensor 1 and 2 (test2.py wiring)
+CHUTE_CM = 12.0
+BEAM_CM = 2.5                      # beam half-width across the chute at the item (~15 degree cone)
+LAYOUTS = {1: [0.0], 2: [-3.0, 3.0]}   # beam centres across the chute
+IDLE_CM, ITEM_CM = 20.0, 8.0           # idle above FAR_CM_RELEASE, as in benchmarks/replay_app.py
+MATCH_WINDOW_S = 0.1               # a trigger this soon after a drop belongs to it
+POLL_S = 0.001
+
+
+def synthetic_drops(count, rate, seed=0, min_gap_s=0.1):
+    """Drop times plus each item's lateral centre, size (cm) and speed (cm/ms)."""
+    rng = np.random.default_rng(seed)
+    times = 0.5 + np.cumsum(np.maximum(rng.exponential(1 / rate, count), min_gap_s))
+    size = rng.uniform(1.0, 7.0, count)
+    x = rng.uniform(-CHUTE_CM / 2 + size / 2, CHUTE_CM / 2 - size / 2)
+    speed = rng.uniform(0.15, 0.4, count)
+    return times, x, size, speed
+
+
+def sensor_traces(centres, times, x, size, speed, duration):
+    """One DistanceTrace per beam: a dip for every item that crosses it."""
+    traces = []
+    for c in centres:
+        seen = np.abs(x - c) < BEAM_CM + size / 2
+        pass_ms = (size[seen] + BEAM_CM) / speed[seen]
+        traces.append(DistanceTrace.synthetic(times[seen], idle_cm=IDLE_CM, near_cm=ITEM_CM,
+                                              pass_ms=pass_ms, duration_s=duration))
+    return traces
+
+
+def replay(traces, duration, realtime=False, **detector_args):
+    """Detector on a SimulatedDriver answering from the traces; returns trigger times."""
+    sim = SimulatedDriver(realtime=realtime)
+    t0 = sim.now()
+    for (trig, echo), trace in zip(PINS, traces):
+        sim.attach_distance(trig, echo, lambda t, trace=trace: trace.at(t - t0))
+    detector = DropPassDetector(sensors=PINS[:len(traces)], driver=sim, background=realtime, **detector_args)
+    triggers = []
+    try:
+        while sim.now() - t0 < duration:
+            if not realtime:
+                detector.read()
+            t = detector.wait_for_drop(timeout=0)
+            if t is not None:
+                triggers.append(t - t0)
+            sim.sleep(POLL_S)
+    finally:
+        detector.close()
+    return triggers
+
+
+def score(triggers, drop_times):
+    """(latency of each drop in s, None if missed), number of extra triggers."""
+    latency = [None] * len(drop_times)
+    extra = 0
+    for t in triggers:
+        i = np.searchsorted(drop_times, t, side="right") - 1
+        if i >= 0 and t - drop_times[i] < MATCH_WINDOW_S and latency[i] is None:
+            latency[i] = t - drop_times[i]
+        else:
+            extra += 1
+    return latency, extra
+
+
+def report(name, latency, extra, small=None):
+    hits = [l * 1000 for l in latency if l is not None]
+    line = (f"{name:<22} detected {len(hits)}/{len(latency)} ({len(hits) / len(latency) * 100:5.1f}%), "
+            f"extra {extra}, latency ms p50 {percentile(hits, 50):.1f} p90 {percentile(hits, 90):.1f} "
+            f"max {max(hits, default=float('nan')):.1f}")
+    if small is not None and small.any():
+        small_hits = sum(latency[i] is not None for i in np.flatnonzero(small))
+        line += f", small items {small_hits}/{int(small.sum())}"
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay drops through DropPassDetector (1 vs 2 sensors)")
+    parser.add_argument("--count", type=int, default=500, help="synthetic drops")
+    parser.add_argument("--rate", type=float, default=4.0, help="drops per second")
+    parser.add_argument("--sensors", type=int, nargs="+", default=[1, 2], choices=sorted(LAYOUTS))
+    parser.add_argument("--trace", default=None, help="recorded CSV seconds,cm[,cm...] (one column per sensor)")
+    parser.add_argument("--truth", default=None, help="ground-truth drop times, one per line")
+    parser.add_argument("--cycle-ms", type=float, default=12, help="CYCLE_MS (each sensor)")
+    parser.add_argument("--cooldown-ms", type=float, default=60, help="COOLDOWN_MS")
+    parser.add_argument("--near-cm", type=float, default=17.0)
+    parser.add_argument("--far-cm", type=float, default=18.0)
+    parser.add_argument("--realtime", action="store_true", help="background ping thread in real time")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    detector_args = dict(NEAR_CM=args.near_cm, FAR_CM_RELEASE=args.far_cm, CYCLE_MS=args.cycle_ms,
+                         COOLDOWN_MS=args.cooldown_ms)
+    runs = []
+    small = None
+    if args.trace:
+        data = np.loadtxt(args.trace, delimiter=",", ndmin=2)
+        traces = [DistanceTrace(data[:, 0], data[:, k]) for k in range(1, min(data.shape[1], len(PINS) + 1))]
+        if args.truth:
+            drop_times = np.sort(np.loadtxt(args.truth, ndmin=1))
+        else:
+            drop_times = np.asarray(trace_drop_times(DistanceTrace(data[:, 0], data[:, 1:].min(axis=1)), args.near_cm))
+        duration = float(data[-1, 0]) + 0.2
+        runs.append(("sensor 1", traces[:1]))
+        if len(traces) > 1:
+            runs.append((f"{len(traces)} sensors fused", traces))
+    else:
+        drop_times, x, size, speed = synthetic_drops(args.count, args.rate, args.seed)
+        duration = float(drop_times[-1]) + 0.5
+        small = size < 3.0
+        for n in args.sensors:
+            runs.append((f"{n} sensor{'s' if n > 1 else ''}", sensor_traces(LAYOUTS[n], drop_times, x, size, speed, duration)))
+
+    print(f"{len(drop_times)} drops over {duration:.1f} s, CYCLE_MS {args.cycle_ms:g}, COOLDOWN_MS {args.cooldown_ms:g}"
+          f"{', real time' if args.realtime else ''}")
+    for name, traces in runs:
+        t_wall = time.perf_counter()
+        triggers = replay(traces, duration, realtime=args.realtime, **detector_args)
+        latency, extra = score(triggers, drop_times)
+        report(name, latency, extra, small)
+        if not args.realtime:
+            print(f"{'':<22} ({time.perf_counter() - t_wall:.1f} s wall)")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -1,14 +1,18 @@
-import RPi.GPIO as GPIO
-import time
+from sensor.gpio_driver import get_driver
 
 IR_PIN = 3
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(IR_PIN, GPIO.IN)
+_ready = False
+
+def setup_ir_sensor():
+    global _ready
+    get_driver().setup_input(IR_PIN)
+    _ready = True
 
 def read_ir_sensor():
-    if GPIO.input(IR_PIN) == GPIO.LOW:
+    if not _ready:
+        setup_ir_sensor()
+    if get_driver().read(IR_PIN) == 0:
         return 0
     else:
-        return 1 
-    
+        return 1
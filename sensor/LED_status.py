@@ -1,20 +1,25 @@
-import RPi.GPIO as GPIO
-import time
+from sensor.gpio_driver import get_driver
 
 LED_PIN = 27
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(LED_PIN, GPIO.OUT)
+_ready = False
+
+def setup_led():
+    global _ready
+    get_driver().setup_output(LED_PIN)
+    _ready = True
 
 def LED_status_color(color):
+    if not _ready:
+        setup_led()
     if color == "Green":
-        GPIO.output(LED_PIN, GPIO.HIGH)
+        get_driver().write(LED_PIN, 1)
     elif color == "Red":
-        GPIO.output(LED_PIN, GPIO.LOW )
+        get_driver().write(LED_PIN, 0)
     else:
         print("The color have just Red and Green !!")
 
 if __name__ == "__main__":
     while True:
         color_input = str(input("Input color of LED !"))
-        LED_status_color(color=color_input)
\ No newline at end of file
+        LED_status_color(color=color_input)
@@ -1,17 +1,49 @@
 # sensor/ultra_drop_pass.py
 """
-HC-SR04 drop-pass detector (µs-accurate, non-blocking) for pigpio.
-- Provides a class you can import and call like an IR sensor:
-    detector.read() -> 0 (NEAR / detected) or 1 (FAR / not detected)
+HC-SR04 drop-pass detector (µs-accurate with pigpio, event-driven).
+- The ping scheduler runs in its own thread and the hysteresis is updated
+  from the echo callback, so the app does not have to poll.
+- wait_for_drop(timeout) blocks until the next FAR->NEAR edge and returns
+  its time.monotonic() timestamp; subscribe(cb) gets every state change.
+- read() -> 0 (NEAR / detected) or 1 (FAR / not detected) still works.
 - Hysteresis + dead-zone release to avoid sticky states.
-- No LED calls here; handle LEDs in your app to keep responsibilities clean.
+- Several sensors (sensors=[(TRIG, ECHO), ...], e.g. two beams across the
+  chute for fast or small items): pinged one at a time, PING_GAP_MS apart
+  and never while another echo is in flight, each with its own hysteresis.
+  NEAR when any sensor is NEAR, FAR when all are; COOLDOWN_MS keeps one
+  item seen by two beams a single drop.
+- No LED calls here; handle LEDs in your app (e.g. via subscribe).
+- GPIO goes through sensor/gpio_driver.py (default: the process-wide driver).
+  Pass driver=SimulatedDriver() with background=False to run on a virtual
+  clock, or pi= / pigpio_module= (see sensor/fake_pigpio.py) for a fake pigpiod.
 """
 
+import collections
+import functools
+import threading
 import time
-import pigpio
+
+from sensor.gpio_driver import PigpioDriver, get_driver
 
 US_PER_CM_ROUND_TRIP = 58.0
 
+
+class _Sensor:
+    """One HC-SR04: pins, own hysteresis thresholds and state."""
+
+    def __init__(self, trig, echo, near_cm, far_cm):
+        if far_cm <= near_cm:
+            raise ValueError("FAR_CM_RELEASE must be > NEAR_CM for hysteresis")
+        self.trig, self.echo = trig, echo
+        self.near_cm, self.far_cm = near_cm, far_cm
+        self.latest_cm = float("inf")
+        self.rise_tick = None
+        self.state = 1            # 1=FAR, 0=NEAR
+        self.last_near_ms = 0
+        self.ping_t = 0.0
+        self.cb = None
+
+
 class DropPassDetector:
     def __init__(
         self,
@@ -21,129 +53,250 @@ class DropPassDetector:
         # FAR must be > NEAR (hysteresis gap ~1–2 cm typically).
         NEAR_CM: float = 15.6,       # into NEAR when d < NEAR_CM
         FAR_CM_RELEASE: float = 17.0,# back to FAR when d > FAR_CM_RELEASE
-        CYCLE_MS: int = 12,
+        CYCLE_MS: int = 12,          # each sensor is pinged every CYCLE_MS
         DEADZONE_TIMEOUT_MS: int = 120,
+        sensors=None,                # [(TRIG, ECHO) or (TRIG, ECHO, NEAR_CM, FAR_CM_RELEASE), ...]
+        PING_GAP_MS: float = None,   # between pings of different sensors (default CYCLE_MS / sensors)
+        COOLDOWN_MS: int = 0,        # no new drop this soon after the last one
         glitch_filter_us: int = 100,
         watchdog_ms: int = 25,
+        driver=None,
+        pi=None,
+        pigpio_module=None,
+        background: bool = True,
     ):
-        if FAR_CM_RELEASE <= NEAR_CM:
-            raise ValueError("FAR_CM_RELEASE must be > NEAR_CM for hysteresis")
+        sensors = sensors or [(TRIG, ECHO)]
+        self.sensors = [_Sensor(*s) if len(s) == 4 else _Sensor(*s, NEAR_CM, FAR_CM_RELEASE) for s in sensors]
 
-        self.TRIG = TRIG
-        self.ECHO = ECHO
+        self.TRIG = self.sensors[0].trig
+        self.ECHO = self.sensors[0].echo
         self.NEAR_CM = NEAR_CM
         self.FAR_CM_RELEASE = FAR_CM_RELEASE
         self.CYCLE_MS = CYCLE_MS
+        self.PING_GAP_MS = PING_GAP_MS if PING_GAP_MS is not None else CYCLE_MS / len(self.sensors)
+        self.COOLDOWN_MS = COOLDOWN_MS
         self.DEADZONE_TIMEOUT_MS = DEADZONE_TIMEOUT_MS
 
-        self.pi = pigpio.pi()
-        if not self.pi.connected:
-            raise RuntimeError("pigpio not running. Start with: sudo systemctl enable --now pigpiod")
+        # A pigpio connection made from pi= / pigpio_module= belongs to the
+        # detector and is closed with it; a given or shared driver is not.
+        self._owns_driver = driver is None and (pi is not None or pigpio_module is not None)
+        if self._owns_driver:
+            driver = PigpioDriver(pi, pigpio_module)
+        self.driver = driver if driver is not None else get_driver()
 
         # GPIO setup
-        self.pi.set_mode(self.TRIG, pigpio.OUTPUT)
-        self.pi.write(self.TRIG, 0)
-        self.pi.set_mode(self.ECHO, pigpio.INPUT)
-        self.pi.set_pull_up_down(self.ECHO, pigpio.PUD_OFF)
-        self.pi.set_glitch_filter(self.ECHO, glitch_filter_us)
-        self.pi.set_watchdog(self.ECHO, watchdog_ms)
-
-        # measurement state
-        self._latest_cm = float("inf")
-        self._rise_tick = None
-        self._cb = self.pi.callback(self.ECHO, pigpio.EITHER_EDGE, self._echo_cb)
-
-        # detection state
-        self._current_state = 1   # 1=FAR, 0=NEAR
+        for sensor in self.sensors:
+            self.driver.setup_output(sensor.trig, 0)
+            self.driver.setup_input(sensor.echo)
+            self.driver.glitch_filter(sensor.echo, glitch_filter_us)
+            self.driver.watchdog(sensor.echo, watchdog_ms)
+
+        # detection state (guarded by _lock; callbacks come from pigpio's thread)
+        self._lock = threading.Lock()
+        self._current_state = 1   # fused: 0=NEAR if any sensor is NEAR, 1=FAR when all are
         self._armed = True        # re-arms in FAR
-        self._last_near_ms = 0
-        self._next_ping_ms = 0
+        self._last_drop_ms = float("-inf")
+
+        # ping scheduling: one sensor at a time, round robin, and never while
+        # another sensor's echo is still on its way (crosstalk)
+        self._turn = 0
+        self._next_ping = 0.0
+        self._in_flight = None
+        self._echo_timeout_s = (watchdog_ms + 5) / 1000
+
+        # events
+        self._subscribers = []
+        self._drops = collections.deque(maxlen=8)   # monotonic timestamps of FAR->NEAR edges
+        self._drop_cond = threading.Condition()
+        self.stale_drops = 0      # edges discarded by wait_for_drop(max_age_s=...)
 
-    # ====== pigpio echo callback ======
-    def _echo_cb(self, gpio, level, tick):
+        for sensor in self.sensors:
+            sensor.cb = self.driver.callback(sensor.echo, functools.partial(self._echo_cb, sensor))
+
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name="DropPassDetector", daemon=True)
+            self._thread.start()
+
+    # ====== echo callback (driver's thread) ======
+    def _echo_cb(self, sensor, gpio, level, tick):
         if level == 1:  # rising
-            self._rise_tick = tick
-        elif level == 0 and self._rise_tick is not None:  # falling
-            width_us = pigpio.tickDiff(self._rise_tick, tick)
-            self._latest_cm = width_us / US_PER_CM_ROUND_TRIP
-            self._rise_tick = None
+            sensor.rise_tick = tick
+            return
+        elif level == 0 and sensor.rise_tick is not None:  # falling
+            width_us = self.driver.tick_diff(sensor.rise_tick, tick)
+            sensor.latest_cm = width_us / US_PER_CM_ROUND_TRIP
+            sensor.rise_tick = None
         elif level == 2:  # watchdog (no echo)
-            self._latest_cm = float("inf")
-            self._rise_tick = None
+            sensor.latest_cm = float("inf")
+            sensor.rise_tick = None
+        else:
+            return
+        if self._in_flight is sensor:
+            self._in_flight = None
+            self._wake.set()
+        # New measurement: update hysteresis right away (no polling delay)
+        self._update(self._now_ms())
 
     # ====== internal ======
-    def _trigger(self):
+    def _now_ms(self):
+        return self.driver.now() * 1000
+
+    def _ping_if_due(self, now):
+        """Ping the next sensor if its slot has come and no echo is in flight; returns when to look again."""
+        with self._lock:
+            if self._in_flight is not None:
+                timeout = self._in_flight.ping_t + self._echo_timeout_s
+                if now < timeout:
+                    return timeout
+                self._in_flight = None   # lost echo, the watchdog did not fire
+            if now < self._next_ping:
+                return self._next_ping
+            sensor = self.sensors[self._turn]
+            self._turn = (self._turn + 1) % len(self.sensors)
+            # after a stall, wait a full gap: a second ping right away
+            # would overlap the first one's echo
+            self._next_ping = max(self._next_ping, now) + self.PING_GAP_MS / 1000
+            sensor.ping_t = now
+            self._in_flight = sensor
         # 10 µs HIGH pulse
-        self.pi.gpio_trigger(self.TRIG, 10, 1)
+        self.driver.trigger(sensor.trig, 10)
+        return self._next_ping
 
-    def _now_ms(self):
-        return int(time.time() * 1000)
+    def _run(self):
+        """Ping scheduler thread: one ping every PING_GAP_MS, sleeps in between."""
+        while not self._stop.is_set():
+            now = self.driver.now()
+            wake_at = self._ping_if_due(now)
+            # dead-zone timeout needs a clock tick even without new echoes
+            self._update(now * 1000)
+            # an echo coming back early wakes us for the next sensor's slot
+            self._wake.wait(max(0.0, wake_at - self.driver.now()))
+            self._wake.clear()
 
-    def _step(self):
-        """Run one fast step: ping, update hysteresis, manage dead-zone."""
-        now_ms = self._now_ms()
+    def _update(self, now_ms):
+        """Update every sensor's hysteresis and dead-zone, fuse them; emit events on transitions."""
+        with self._lock:
+            prev_state = self._current_state
+
+            for sensor in self.sensors:
+                d = sensor.latest_cm
+                near_now = (d < sensor.near_cm)
+                far_now  = (d > sensor.far_cm) or (d == float("inf"))
 
-        # Fast pinging
-        if now_ms >= self._next_ping_ms:
-            self._trigger()
-            self._next_ping_ms = now_ms + self.CYCLE_MS
+                if near_now:
+                    sensor.state = 0
+                    sensor.last_near_ms = now_ms
+                elif far_now:
+                    sensor.state = 1
 
-        d = self._latest_cm
-        near_now = (d < self.NEAR_CM)
-        far_now  = (d > self.FAR_CM_RELEASE) or (d == float("inf"))
+                # Dead-zone release if stuck between thresholds
+                if (not near_now) and (not far_now) and sensor.state == 0:
+                    if now_ms - sensor.last_near_ms > self.DEADZONE_TIMEOUT_MS:
+                        sensor.state = 1
 
-        if near_now:
-            self._current_state = 0
-            self._last_near_ms = now_ms
-        elif far_now:
-            self._current_state = 1
+            self._current_state = 0 if any(s.state == 0 for s in self.sensors) else 1
 
-        # Dead-zone release if stuck between thresholds
-        if (not near_now) and (not far_now) and self._current_state == 0:
-            if now_ms - self._last_near_ms > self.DEADZONE_TIMEOUT_MS:
-                self._current_state = 1
+            # One shot per FAR->NEAR edge; an edge inside the cooldown is the
+            # same item (e.g. seen by the next sensor) and is swallowed
+            drop = self._armed and self._current_state == 0
+            if drop:
+                self._armed = False
+                drop = now_ms - self._last_drop_ms >= self.COOLDOWN_MS
+                if drop:
+                    self._last_drop_ms = now_ms
+            # Re-arm in FAR
+            if self._current_state == 1:
+                self._armed = True
 
-        # Re-arm in FAR
-        if self._current_state == 1:
-            self._armed = True
+            state = self._current_state
+
+        t = now_ms / 1000
+        if drop:
+            with self._drop_cond:
+                self._drops.append(t)
+                self._drop_cond.notify_all()
+        if state != prev_state:
+            for callback in list(self._subscribers):
+                try:
+                    callback(state, t)
+                except Exception as e:
+                    print(f"DropPassDetector subscriber failed: {e}")
+
+    def _step(self):
+        """Polling mode (background=False): ping if due, then update."""
+        now = self.driver.now()
+        self._ping_if_due(now)
+        self._update(now * 1000)
 
     # ====== public APIs ======
+    def subscribe(self, callback):
+        """callback(state, t) on every NEAR(0)/FAR(1) transition; t is the driver clock (time.monotonic() on hardware)."""
+        self._subscribers.append(callback)
+
+    def wait_for_drop(self, timeout=None, max_age_s=None):
+        """
+        Block until a FAR->NEAR edge (or return one that already happened and
+        was not consumed yet). Returns its driver-clock timestamp, or
+        None on timeout. Edges older than max_age_s (e.g. queued while the
+        caller was busy) are discarded and counted in stale_drops.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._drop_cond:
+            while True:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if not self._drop_cond.wait_for(lambda: self._drops, timeout=remaining):
+                    return None
+                t = self._drops.popleft()
+                if max_age_s is None or self.driver.now() - t <= max_age_s:
+                    return t
+                self.stale_drops += 1
+
     def read(self) -> int:
         """
         Drop-in replacement style:
         - Returns 0 when NEAR (detected)
         - Returns 1 when FAR  (not detected)
-        Call this frequently inside your main loop (e.g., every iteration).
+        In polling mode (background=False) call this frequently inside your loop.
         """
-        self._step()
+        if self._thread is None:
+            self._step()
         return self._current_state  # 0 or 1
 
     def edge_detected(self) -> bool:
         """
-        Returns True exactly once on FAR->NEAR transitions ("Detected !!").
-        Read it in your loop if you want a one-shot trigger.
+        Returns True exactly once per FAR->NEAR transition ("Detected !!").
+        Non-blocking; use wait_for_drop() to block instead.
         """
-        prev_armed = self._armed
-        # _step already re-arms in FAR; we need to see if we just went NEAR while armed
-        self._step()
-        if self._armed and self._current_state == 0:
-            # not triggered yet; after going NEAR, disarm and report True once
-            self._armed = False
-            return True
-        return False if prev_armed or self._current_state == 1 else False
-
-    def distance_cm(self) -> float:
-        """Latest measured distance in cm (float('inf') if no echo yet)."""
-        return self._latest_cm
+        if self._thread is None:
+            self._step()
+        return self.wait_for_drop(timeout=0) is not None
+
+    def distance_cm(self, sensor: int = 0) -> float:
+        """Latest measured distance in cm of one sensor (float('inf') if no echo yet)."""
+        return self.sensors[sensor].latest_cm
+
+    def distances_cm(self):
+        return [s.latest_cm for s in self.sensors]
 
     def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
         try:
-            if self._cb is not None:
-                self._cb.cancel()
-                self._cb = None
+            for sensor in self.sensors:
+                if sensor.cb is not None:
+                    sensor.cb.cancel()
+                    sensor.cb = None
         finally:
-            try:
-                self.pi.write(self.TRIG, 0)
-            except Exception:
-                pass
-            self.pi.stop()
+            for sensor in self.sensors:
+                try:
+                    self.driver.write(sensor.trig, 0)
+                except Exception:
+                    pass
+            if self._owns_driver:
+                self.driver.close()
@@ -0,0 +1,193 @@
+"""
+Continuous microphone capture into a preallocated circular buffer.
+- The input stream never stops, so a trigger can ask for audio from
+  *before* it fired (pre-trigger history) and the process is never blind.
+- capture() copies the requested window out of the ring exactly once.
+- Sources are pluggable: SoundDeviceSource for the real microphone,
+  ArraySource for synthetic audio or a WAV file (no hardware needed).
+"""
+
+import threading
+import time
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-size float32 circular buffer indexed by absolute sample number."""
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self._buf = np.zeros(self.capacity, dtype=np.float32)
+        self.written = 0  # total samples ever written
+
+    def write(self, block):
+        n = len(block)
+        if n >= self.capacity:
+            block = block[-self.capacity:]
+            self.written += n - self.capacity
+            n = self.capacity
+        pos = self.written % self.capacity
+        first = min(n, self.capacity - pos)
+        self._buf[pos:pos + first] = block[:first]
+        self._buf[:n - first] = block[first:]
+        self.written += n
+
+    def read(self, start, stop, out=None):
+        """Copy absolute samples [start, stop) into out (one copy, two slices if wrapped)."""
+        n = stop - start
+        if n > self.capacity or start < self.written - self.capacity:
+            raise ValueError("Requested audio is older than the ring buffer")
+        if stop > self.written:
+            raise ValueError("Requested audio has not been recorded yet")
+        if out is None:
+            out = np.empty(n, dtype=np.float32)
+        pos = start % self.capacity
+        first = min(n, self.capacity - pos)
+        out[:first] = self._buf[pos:pos + first]
+        out[first:n] = self._buf[:n - first]
+        return out
+
+
+class SoundDeviceSource:
+    """Real microphone through a continuous sounddevice.InputStream."""
+
+    def __init__(self, sample_rate=22050, blocksize=256, device=None):
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.device = device
+        self._stream = None
+
+    def start(self, on_block):
+        import sounddevice as sd
+
+        def _callback(indata, frames, time_info, status):
+            if status:
+                print(f"Audio input status: {status}")
+            on_block(indata[:, 0])
+
+        self._stream = sd.InputStream(samplerate=self.sample_rate, channels=1, dtype='float32',
+                                      blocksize=self.blocksize, device=self.device, callback=_callback)
+        self._stream.start()
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+class ArraySource:
+    """
+    Feeds a NumPy array (synthetic audio or a decoded file) block by block
+    from a thread, like a microphone would. After the end it keeps feeding
+    silence (or loops if loop=True). realtime=False feeds as fast as possible.
+    """
+
+    def __init__(self, audio, sample_rate=22050, blocksize=256, realtime=True, loop=False):
+        self.audio = np.asarray(audio, dtype=np.float32)
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.realtime = realtime
+        self.loop = loop
+        self._thread = None
+        self._running = False
+
+    @classmethod
+    def from_file(cls, path, sample_rate=22050, **kwargs):
+        from utils.audio_io import load_audio
+        audio, _ = load_audio(path, sr=sample_rate, cache=False)
+        return cls(audio, sample_rate, **kwargs)
+
+    def start(self, on_block):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(on_block,), daemon=True)
+        self._thread.start()
+
+    def _run(self, on_block):
+        silence = np.zeros(self.blocksize, dtype=np.float32)
+        pos = 0
+        next_t = time.monotonic()
+        while self._running:
+            if self.loop and pos >= len(self.audio):
+                pos = 0
+            if pos < len(self.audio):
+                block = self.audio[pos:pos + self.blocksize]
+                pos += len(block)
+            else:
+                block = silence
+            on_block(block)
+            if self.realtime:
+                next_t += len(block) / self.sample_rate
+                delay = next_t - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class AudioCapture:
+    def __init__(self, source, sample_rate=22050, buffer_seconds=5.0, pre_trigger_ms=200):
+        self.source = source
+        self.sample_rate = sample_rate
+        self.pre_trigger_ms = pre_trigger_ms
+        self.buffer_seconds = buffer_seconds
+        self.ring = RingBuffer(int(buffer_seconds * sample_rate))
+
+        self._cond = threading.Condition()
+        self._last_block_time = None
+
+    # ====== source callback ======
+    def _on_block(self, block):
+        with self._cond:
+            self.ring.write(block)
+            self._last_block_time = time.monotonic()
+            self._cond.notify_all()
+
+    # ====== public APIs ======
+    def start(self):
+        self.source.start(self._on_block)
+        return self
+
+    def stop(self):
+        self.source.stop()
+
+    def sample_at(self, t=None):
+        """Absolute sample index that corresponds to time.monotonic() value t (default: now)."""
+        with self._cond:
+            if self._last_block_time is None:
+                return self.ring.written
+            if t is None:
+                return self.ring.written
+            offset = int((self._last_block_time - t) * self.sample_rate)
+            return self.ring.written - offset
+
+    def capture(self, duration, pre_trigger_ms=None, trigger_time=None, timeout=None, out=None):
+        """
+        Return `duration` seconds of audio of which `pre_trigger_ms` lie
+        before the trigger. trigger_time is a time.monotonic() timestamp
+        (e.g. from the drop detector); default is now. Blocks until the
+        post-trigger part has been recorded.
+        """
+        if pre_trigger_ms is None:
+            pre_trigger_ms = self.pre_trigger_ms
+
+        trigger = self.sample_at(trigger_time)
+        start = max(0, trigger - int(pre_trigger_ms * self.sample_rate / 1000))
+        stop = start + int(duration * self.sample_rate)
+
+        with self._cond:
+            ok = self._cond.wait_for(lambda: self.ring.written >= stop, timeout=timeout)
+            if not ok:
+                raise TimeoutError("Audio source stopped delivering samples")
+            return self.ring.read(start, stop, out=out)
+
+    def latest(self, duration, out=None):
+        """The most recent `duration` seconds (e.g. idle audio between drops)."""
+        n = int(duration * self.sample_rate)
+        with self._cond:
+            stop = self.ring.written
+            return self.ring.read(max(0, stop - n), stop, out=out)
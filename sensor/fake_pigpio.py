@@ -0,0 +1,176 @@
+"""
+Fake pigpio for running DropPassDetector without the sensor.
+- Same module-level names the detector uses (pi, OUTPUT, INPUT, PUD_OFF,
+  EITHER_EDGE, tickDiff), so pass it as pigpio_module=fake_pigpio.
+- gpio_trigger() looks up the distance in a replayed trace and delivers
+  the ECHO rising/falling edges (or a watchdog timeout) from one scheduler
+  thread at the right time, like pigpiod would.
+
+Run this file to replay a synthetic trace and report detection latency
+and CPU use:  python -m sensor.fake_pigpio
+"""
+
+import heapq
+import threading
+import time
+import numpy as np
+
+OUTPUT = 1
+INPUT = 0
+PUD_OFF = 0
+EITHER_EDGE = 2
+
+US_PER_CM_ROUND_TRIP = 58.0
+ECHO_DELAY_US = 450       # HC-SR04: echo goes high ~0.45 ms after the trigger
+MAX_RANGE_CM = 400
+
+
+def tickDiff(t1, t2):
+    return (t2 - t1) & 0xFFFFFFFF
+
+
+class DistanceTrace:
+    """Step-wise distance over time: distance_cm[i] holds from times_s[i] on."""
+
+    def __init__(self, times_s, distances_cm):
+        self.times_s = np.asarray(times_s, dtype=np.float64)
+        self.distances_cm = np.asarray(distances_cm, dtype=np.float64)
+
+    @classmethod
+    def from_csv(cls, path):
+        data = np.loadtxt(path, delimiter=",", ndmin=2)
+        return cls(data[:, 0], data[:, 1])
+
+    @classmethod
+    def synthetic(cls, drop_times_s, idle_cm=16.2, near_cm=8.0, pass_ms=25, duration_s=None):
+        """Idle distance with a short NEAR dip for every drop (ground truth = drop_times_s); pass_ms may be per drop."""
+        times, dists = [0.0], [idle_cm]
+        pass_ms = np.broadcast_to(pass_ms, (len(drop_times_s),))
+        for t, ms in sorted(zip(drop_times_s, pass_ms)):
+            times += [t, t + ms / 1000]
+            dists += [near_cm, idle_cm]
+        if duration_s is not None:
+            times.append(duration_s)
+            dists.append(idle_cm)
+        return cls(times, dists)
+
+    def at(self, t):
+        i = np.searchsorted(self.times_s, t, side="right") - 1
+        return float(self.distances_cm[max(i, 0)])
+
+
+class _Callback:
+    def __init__(self, owner, gpio, func):
+        self.owner, self.gpio, self.func = owner, gpio, func
+
+    def cancel(self):
+        self.owner._callbacks.remove(self)
+
+
+class pi:
+    def __init__(self, trace=None, echo_gpio=None):
+        """trace: DistanceTrace (time 0 = creation of this object) or None for always-idle."""
+        self.connected = True
+        self.trace = trace if trace is not None else DistanceTrace([0.0], [16.2])
+        self.echo_gpio = echo_gpio
+        self.t0 = time.monotonic()
+        self.pings = 0
+        self.levels = {}
+        self._watchdog_ms = {}
+        self._callbacks = []
+
+        self._events = []
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._deliver, name="fake_pigpio", daemon=True)
+        self._thread.start()
+
+    # ====== pigpio API used by the detector ======
+    def set_mode(self, gpio, mode):
+        pass
+
+    def set_pull_up_down(self, gpio, pud):
+        pass
+
+    def set_glitch_filter(self, gpio, steady):
+        pass
+
+    def set_watchdog(self, gpio, timeout_ms):
+        self._watchdog_ms[gpio] = timeout_ms
+
+    def write(self, gpio, level):
+        self.levels[gpio] = level
+
+    def callback(self, gpio, edge, func):
+        cb = _Callback(self, gpio, func)
+        self._callbacks.append(cb)
+        if self.echo_gpio is None:
+            self.echo_gpio = gpio
+        return cb
+
+    def gpio_trigger(self, gpio, pulse_len, level):
+        self.pings += 1
+        now = time.monotonic()
+        d = self.trace.at(now - self.t0)
+        rise = now + ECHO_DELAY_US / 1e6
+        if d == float("inf") or d > MAX_RANGE_CM:
+            self._schedule(now + self._watchdog_ms.get(self.echo_gpio, 25) / 1000, 2)
+        else:
+            self._schedule(rise, 1)
+            self._schedule(rise + d * US_PER_CM_ROUND_TRIP / 1e6, 0)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    # ====== edge delivery ======
+    def _schedule(self, t, level):
+        with self._cond:
+            heapq.heappush(self._events, (t, level))
+            self._cond.notify()
+
+    def _deliver(self):
+        while True:
+            with self._cond:
+                while self._running and (not self._events or self._events[0][0] > time.monotonic()):
+                    timeout = self._events[0][0] - time.monotonic() if self._events else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                t, level = heapq.heappop(self._events)
+            tick = int(t * 1e6) & 0xFFFFFFFF
+            for cb in list(self._callbacks):
+                cb.func(cb.gpio, level, tick)
+
+
+if __name__ == "__main__":
+    import sys
+    from sensor.Ultrasonic_control import DropPassDetector
+
+    drop_times = np.arange(1.0, 11.0, 0.75)
+    duration = 12.0
+    fake = pi(DistanceTrace.synthetic(drop_times, duration_s=duration))
+    detector = DropPassDetector(TRIG=26, ECHO=25, NEAR_CM=15.6, FAR_CM_RELEASE=17.0,
+                                CYCLE_MS=12, pi=fake, pigpio_module=sys.modules[__name__])
+
+    detected = []
+    cpu0, wall0 = time.process_time(), time.monotonic()
+    while time.monotonic() - fake.t0 < duration:
+        t = detector.wait_for_drop(timeout=0.5)
+        if t is not None:
+            detected.append(t - fake.t0)
+    cpu = time.process_time() - cpu0
+    wall = time.monotonic() - wall0
+    detector.close()
+
+    latencies = []
+    for truth in drop_times:
+        hits = [t for t in detected if 0 <= t - truth < 0.2]
+        if hits:
+            latencies.append((hits[0] - truth) * 1000)
+    print(f"Drops: {len(drop_times)}, detected: {len(latencies)}, extra triggers: {len(detected) - len(latencies)}")
+    if latencies:
+        print(f"Latency ms: median {np.median(latencies):.1f}, max {np.max(latencies):.1f}")
+    print(f"Pings: {fake.pings}, CPU {cpu / wall * 100:.1f}% of one core over {wall:.1f} s")
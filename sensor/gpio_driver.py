@@ -0,0 +1,634 @@
+"""
+GPIO drivers: one small interface for everything the sensors and actuators
+need, so no module touches RPi.GPIO or pigpio at import time.
+
+- setup_output(pin, level) / setup_input(pin, pull) / write(pin, level) / read(pin)
+- pwm(pin, frequency) -> object with duty(percent) and stop()
+- pulse_train(pin, periods_s, pulse_us) -> seconds; one pulse per period (steppers)
+- pulse_trains({pin: periods_s}, pulse_us) -> seconds; several trains started
+  together (both steppers moving at once)
+- trigger(pin, pulse_us): single pulse (HC-SR04 TRIG)
+- callback(pin, func) -> handle with cancel(); func(pin, level, tick_us) like
+  pigpio, level 2 = watchdog timeout; watchdog(pin, ms), glitch_filter(pin, us)
+- now() / sleep(s): the driver's clock, tick_diff(t1, t2), close()
+
+Implementations:
+- PigpioDriver: pigpiod (hardware-timed waves, µs edge ticks)
+- RPiGPIODriver: RPi.GPIO (busy-wait pulse timing, edge ticks from the event thread)
+- SimulatedDriver: no hardware; keeps a virtual clock that only moves on
+  sleep()/pulse_train() and logs every edge, so actuation time and control
+  loop latency can be measured on any Linux box. realtime=True sleeps for real.
+
+get_driver() returns the process-wide driver: ECOSONIC_GPIO=pigpio|rpi|sim,
+or by default pigpio when pigpiod is running, else RPi.GPIO.
+
+Run this file for a simulated drop -> sort timing report: python -m sensor.gpio_driver
+"""
+
+import collections
+import heapq
+import itertools
+import os
+import threading
+import time
+import numpy as np
+
+INPUT = 0
+OUTPUT = 1
+EITHER_EDGE = 2
+WATCHDOG = 2              # level passed to callbacks on a watchdog timeout
+
+PULSE_US = 10
+US_PER_CM_ROUND_TRIP = 58.0
+ECHO_DELAY_US = 450       # HC-SR04: echo goes high ~0.45 ms after the trigger
+
+# pigpio limits: keep each wave small, loop long constant-speed runs
+WAVE_CHUNK_STEPS = 500
+MIN_LOOP_RUN = 16
+WAVE_CHUNK_PULSES = 1000  # merged trains are streamed in waves of this many pulses
+
+_driver = None
+_driver_lock = threading.Lock()
+
+
+def tick_diff(t1, t2):
+    """µs from tick t1 to tick t2 (32-bit wrap-around, like pigpio.tickDiff)."""
+    return (t2 - t1) & 0xFFFFFFFF
+
+
+def _tick(t):
+    return int(t * 1e6) & 0xFFFFFFFF
+
+
+def _runs(periods_us):
+    """Group equal consecutive periods: [(period_us, count), ...]."""
+    if len(periods_us) == 0:
+        return []
+    change = np.flatnonzero(np.diff(periods_us)) + 1
+    starts = np.concatenate(([0], change))
+    counts = np.diff(np.concatenate((starts, [len(periods_us)])))
+    return [(int(periods_us[s]), int(c)) for s, c in zip(starts, counts)]
+
+
+def train_edges(periods, pulse_s, start=0.0):
+    """(times, levels) of the rising and falling edge of every pulse in a train."""
+    periods = np.asarray(periods, dtype=np.float64)
+    rise = start + np.concatenate(([0.0], np.cumsum(periods)[:-1]))
+    return np.column_stack((rise, rise + pulse_s)).ravel(), np.tile([1, 0], len(rise))
+
+
+def merge_trains(trains, pulse_s):
+    """{pin: periods} started together -> (times, pins, levels) of all edges in time order."""
+    times, pins, levels = [np.zeros(0)], [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)]
+    for pin, periods in trains.items():
+        t, level = train_edges(periods, pulse_s)
+        times.append(t)
+        pins.append(np.full(len(t), pin))
+        levels.append(level)
+    times, pins, levels = np.concatenate(times), np.concatenate(pins), np.concatenate(levels)
+    order = np.argsort(times, kind="stable")
+    return times[order], pins[order], levels[order]
+
+
+class _Handle:
+    def __init__(self, cancel):
+        self._cancel = cancel
+
+    def cancel(self):
+        if self._cancel is not None:
+            self._cancel()
+            self._cancel = None
+
+
+# ====== pigpio ======
+class _PigpioPWM:
+    RANGE = 10000    # duty resolution 0.01 %
+
+    def __init__(self, pi, pin, frequency):
+        self.pi, self.pin = pi, pin
+        pi.set_PWM_frequency(pin, frequency)
+        pi.set_PWM_range(pin, self.RANGE)
+
+    def duty(self, percent):
+        self.pi.set_PWM_dutycycle(self.pin, int(round(percent * self.RANGE / 100)))
+
+    def stop(self):
+        self.duty(0)
+
+
+class PigpioDriver:
+    def __init__(self, pi=None, pigpio_module=None):
+        """pi / pigpio_module can be a fake (see sensor/fake_pigpio.py)."""
+        if pigpio_module is None:
+            import pigpio as pigpio_module
+        self._pg = pigpio_module
+        self.pi = pi if pi is not None else pigpio_module.pi()
+        if not self.pi.connected:
+            raise RuntimeError("pigpio not running. Start with: sudo systemctl enable --now pigpiod")
+
+    def setup_output(self, pin, level=0):
+        self.pi.set_mode(pin, self._pg.OUTPUT)
+        self.pi.write(pin, level)
+
+    def setup_input(self, pin, pull="off"):
+        self.pi.set_mode(pin, self._pg.INPUT)
+        self.pi.set_pull_up_down(pin, {"off": self._pg.PUD_OFF, "up": getattr(self._pg, "PUD_UP", 2),
+                                       "down": getattr(self._pg, "PUD_DOWN", 1)}[pull])
+
+    def write(self, pin, level):
+        self.pi.write(pin, level)
+
+    def read(self, pin):
+        return self.pi.read(pin)
+
+    def pwm(self, pin, frequency):
+        return _PigpioPWM(self.pi, pin, frequency)
+
+    def _wave(self, pin, periods_us, pulse_us):
+        pulse = self._pg.pulse
+        mask = 1 << pin
+        pulses = []
+        for period in periods_us:
+            pulses.append(pulse(mask, 0, pulse_us))
+            pulses.append(pulse(0, mask, period - pulse_us))
+        self.pi.wave_add_generic(pulses)
+        return self.pi.wave_create()
+
+    def pulse_train(self, pin, periods, pulse_us=PULSE_US):
+        periods_us = np.maximum(np.rint(np.asarray(periods) * 1e6).astype(np.int64), 2 * pulse_us)
+        self.pi.wave_clear()
+
+        # Build the chain: ramps as chunked waves, cruise as one looped step
+        chain, pending = [], []
+        wave_ids = []
+
+        def flush():
+            for k in range(0, len(pending), WAVE_CHUNK_STEPS):
+                wid = self._wave(pin, pending[k:k + WAVE_CHUNK_STEPS], pulse_us)
+                wave_ids.append(wid)
+                chain.append(wid)
+            pending.clear()
+
+        for period, count in _runs(periods_us):
+            if count < MIN_LOOP_RUN:
+                pending.extend([period] * count)
+                continue
+            flush()
+            wid = self._wave(pin, [period], pulse_us)
+            wave_ids.append(wid)
+            while count > 0:
+                n = min(count, 65535)
+                chain += [255, 0, wid, 255, 1, n & 255, n >> 8]
+                count -= n
+        flush()
+
+        start = time.monotonic()
+        self.pi.wave_chain(chain)
+        while self.pi.wave_tx_busy():
+            time.sleep(0.002)
+        for wid in wave_ids:
+            self.pi.wave_delete(wid)
+        return time.monotonic() - start
+
+    def pulse_trains(self, trains, pulse_us=PULSE_US):
+        trains = {pin: periods for pin, periods in trains.items() if len(periods)}
+        if len(trains) <= 1:
+            return sum(self.pulse_train(pin, periods, pulse_us) for pin, periods in trains.items())
+
+        # One wave timeline for all pins: a pulse per distinct edge time
+        # (set / clear masks, then wait until the next edge). pigpio plays one
+        # chain at a time, so the motors cannot each get their own.
+        trains = {pin: np.maximum(np.asarray(p, dtype=np.float64), 2 * pulse_us / 1e6)
+                  for pin, p in trains.items()}
+        times, pins, levels = merge_trains(trains, pulse_us / 1e6)
+        ticks = np.rint(times * 1e6).astype(np.int64)
+        edge_ticks, first = np.unique(ticks, return_index=True)
+        masks = np.left_shift(1, pins.astype(np.int64))
+        on = np.bitwise_or.reduceat(np.where(levels == 1, masks, 0), first)
+        off = np.bitwise_or.reduceat(np.where(levels == 0, masks, 0), first)
+        delays = np.diff(edge_ticks, append=edge_ticks[-1])
+        pulse = self._pg.pulse
+        pulses = [pulse(int(a), int(b), int(d)) for a, b, d in zip(on, off, delays)]
+
+        # Stream: each chunk queues behind the previous one (ONE_SHOT_SYNC),
+        # finished chunks are deleted so the wave memory never fills up
+        self.pi.wave_clear()
+        start = time.monotonic()
+        queued = collections.deque()
+        for k in range(0, len(pulses), WAVE_CHUNK_PULSES):
+            self.pi.wave_add_generic(pulses[k:k + WAVE_CHUNK_PULSES])
+            wid = self.pi.wave_create()
+            self.pi.wave_send_using_mode(wid, self._pg.WAVE_MODE_ONE_SHOT_SYNC)
+            queued.append(wid)
+            while len(queued) > 2:
+                if self.pi.wave_tx_at() == queued[0]:
+                    time.sleep(0.002)
+                    continue
+                self.pi.wave_delete(queued.popleft())
+        while self.pi.wave_tx_busy():
+            time.sleep(0.002)
+        for wid in queued:
+            self.pi.wave_delete(wid)
+        return time.monotonic() - start
+
+    def trigger(self, pin, pulse_us=PULSE_US):
+        self.pi.gpio_trigger(pin, pulse_us, 1)
+
+    def callback(self, pin, func, edge=EITHER_EDGE):
+        return self.pi.callback(pin, self._pg.EITHER_EDGE if edge == EITHER_EDGE else edge, func)
+
+    def watchdog(self, pin, ms):
+        self.pi.set_watchdog(pin, ms)
+
+    def glitch_filter(self, pin, us):
+        self.pi.set_glitch_filter(pin, us)
+
+    def tick_diff(self, t1, t2):
+        return self._pg.tickDiff(t1, t2)
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def cleanup(self):
+        pass
+
+    def close(self):
+        self.pi.stop()
+
+
+# ====== RPi.GPIO ======
+class _RPiPWM:
+    def __init__(self, GPIO, pin, frequency):
+        self.pwm = GPIO.PWM(pin, frequency)
+        self.pwm.start(0)
+
+    def duty(self, percent):
+        self.pwm.ChangeDutyCycle(percent)
+
+    def stop(self):
+        self.pwm.stop()
+
+
+class RPiGPIODriver:
+    """
+    RPi.GPIO: pulse timing by busy-waiting on perf_counter; edge ticks are
+    taken in RPi.GPIO's event thread (less precise than pigpio) and the
+    watchdog is emulated with a timer armed by trigger().
+    """
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        GPIO.setmode(GPIO.BCM)
+        self._watchdog_ms = {}
+        self._last_edge = {}
+        self._callbacks = {}
+
+    def setup_output(self, pin, level=0):
+        self.GPIO.setup(pin, self.GPIO.OUT, initial=level)
+
+    def setup_input(self, pin, pull="off"):
+        GPIO = self.GPIO
+        self.GPIO.setup(pin, GPIO.IN, pull_up_down={"off": GPIO.PUD_OFF, "up": GPIO.PUD_UP,
+                                                    "down": GPIO.PUD_DOWN}[pull])
+
+    def write(self, pin, level):
+        self.GPIO.output(pin, level)
+
+    def read(self, pin):
+        return self.GPIO.input(pin)
+
+    def pwm(self, pin, frequency):
+        return _RPiPWM(self.GPIO, pin, frequency)
+
+    def _busy_wait(self, until):
+        while time.perf_counter() < until:
+            pass
+
+    def pulse_train(self, pin, periods, pulse_us=PULSE_US):
+        GPIO = self.GPIO
+        pulse_s = pulse_us / 1e6
+        start = t = time.perf_counter()
+        for d in periods:
+            GPIO.output(pin, GPIO.HIGH)
+            self._busy_wait(t + pulse_s)
+            GPIO.output(pin, GPIO.LOW)
+            t += d
+            self._busy_wait(t)
+        return time.perf_counter() - start
+
+    def pulse_trains(self, trains, pulse_us=PULSE_US):
+        GPIO = self.GPIO
+        times, pins, levels = merge_trains(trains, pulse_us / 1e6)
+        start = time.perf_counter()
+        for t, pin, level in zip(times.tolist(), pins.tolist(), levels.tolist()):
+            self._busy_wait(start + t)
+            GPIO.output(pin, level)
+        return time.perf_counter() - start
+
+    def trigger(self, pin, pulse_us=PULSE_US):
+        t = time.monotonic()
+        self.GPIO.output(pin, 1)
+        self._busy_wait(time.perf_counter() + pulse_us / 1e6)
+        self.GPIO.output(pin, 0)
+        for watched, ms in self._watchdog_ms.items():
+            if ms and watched in self._callbacks:
+                timer = threading.Timer(ms / 1000, self._watchdog_fire, args=(watched, t))
+                timer.daemon = True
+                timer.start()
+
+    def _watchdog_fire(self, pin, since):
+        if self._last_edge.get(pin, 0.0) < since and pin in self._callbacks:
+            self._callbacks[pin](pin, WATCHDOG, _tick(time.monotonic()))
+
+    def callback(self, pin, func, edge=EITHER_EDGE):
+        GPIO = self.GPIO
+
+        def on_edge(channel):
+            t = time.monotonic()
+            self._last_edge[channel] = t
+            func(channel, GPIO.input(channel), _tick(t))
+
+        self._callbacks[pin] = func
+        GPIO.add_event_detect(pin, GPIO.BOTH, callback=on_edge)
+
+        def cancel():
+            GPIO.remove_event_detect(pin)
+            self._callbacks.pop(pin, None)
+        return _Handle(cancel)
+
+    def watchdog(self, pin, ms):
+        self._watchdog_ms[pin] = ms
+
+    def glitch_filter(self, pin, us):
+        pass    # not available in RPi.GPIO
+
+    def tick_diff(self, t1, t2):
+        return tick_diff(t1, t2)
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+    def close(self):
+        self.cleanup()
+
+
+# ====== simulated ======
+class _SimPWM:
+    def __init__(self, driver, pin, frequency):
+        self.driver, self.pin, self.frequency = driver, pin, frequency
+
+    def duty(self, percent):
+        with self.driver._lock:
+            self.driver.pwm_log.append((self.driver.now(), self.pin, percent))
+
+    def stop(self):
+        self.duty(0)
+
+
+class SimulatedDriver:
+    """
+    No hardware. With realtime=False (default) now() is a virtual clock that
+    advances only in sleep()/advance()/pulse_train(), so a control loop can run
+    as fast as the CPU allows while all timings stay those of the real device.
+
+    Logs: writes (every level change), trains (every pulse_train, expanded
+    by edges()), pwm_log (duty changes). Inputs are driven with set_input()
+    or, for an ultrasonic sensor, attach_distance(); their edges are
+    delivered to callbacks when the clock passes them.
+    """
+
+    def __init__(self, realtime=False, start=0.0):
+        self.realtime = realtime
+        self.clock = start
+        self.levels = {}
+        self.writes = []       # (t, pin, level)
+        self.trains = []       # (start, pin, periods_s, pulse_s)
+        self.pwm_log = []      # (t, pin, duty)
+        self._events = []      # heap of (t, seq, pin, level)
+        self._seq = itertools.count()
+        self._callbacks = {}
+        self._watchdog_ms = {}
+        self._distance = {}    # trig pin -> (echo pin, distance_cm(t))
+        self._lock = threading.RLock()
+
+    # ====== clock ======
+    def now(self):
+        return time.monotonic() if self.realtime else self.clock
+
+    def sleep(self, seconds):
+        if self.realtime:
+            time.sleep(max(0.0, seconds))
+            self._deliver(time.monotonic())
+        else:
+            self.advance(seconds)
+
+    def advance(self, seconds):
+        self.run_until(self.clock + max(0.0, seconds))
+
+    def run_until(self, t):
+        """Virtual clock: deliver every input edge up to t, then stop at t."""
+        self._deliver(t)
+        with self._lock:
+            self.clock = max(self.clock, t)
+
+    def _deliver(self, t):
+        while True:
+            with self._lock:
+                if not self._events or self._events[0][0] > t:
+                    return
+                et, _, pin, level = heapq.heappop(self._events)
+                if not self.realtime:
+                    self.clock = max(self.clock, et)
+                if level != WATCHDOG:
+                    self.levels[pin] = level
+                callbacks = list(self._callbacks.get(pin, ()))
+            for func in callbacks:
+                func(pin, level, _tick(et))
+
+    # ====== outputs ======
+    def setup_output(self, pin, level=0):
+        self.write(pin, level)
+
+    def setup_input(self, pin, pull="off"):
+        with self._lock:
+            self.levels.setdefault(pin, 1 if pull == "up" else 0)
+
+    def write(self, pin, level):
+        level = int(bool(level))
+        with self._lock:
+            if self.levels.get(pin) != level:
+                self.writes.append((self.now(), pin, level))
+            self.levels[pin] = level
+
+    def read(self, pin):
+        return self.levels.get(pin, 0)
+
+    def pwm(self, pin, frequency):
+        return _SimPWM(self, pin, frequency)
+
+    def pulse_train(self, pin, periods, pulse_us=PULSE_US):
+        periods = np.asarray(periods, dtype=np.float64)
+        duration = float(periods.sum())
+        with self._lock:
+            self.trains.append((self.now(), pin, periods, pulse_us / 1e6))
+        self.sleep(duration)
+        return duration
+
+    def pulse_trains(self, trains, pulse_us=PULSE_US):
+        start = self.now()
+        duration = 0.0
+        with self._lock:
+            for pin, periods in trains.items():
+                periods = np.asarray(periods, dtype=np.float64)
+                self.trains.append((start, pin, periods, pulse_us / 1e6))
+                duration = max(duration, float(periods.sum()))
+        self.sleep(duration)
+        return duration
+
+    # ====== inputs ======
+    def set_input(self, pin, level, at=None):
+        """Input edge at clock time `at` (default: now)."""
+        with self._lock:
+            heapq.heappush(self._events, (self.now() if at is None else at, next(self._seq), pin, level))
+        if at is None:
+            self._deliver(self.now())
+
+    def attach_distance(self, trig_pin, echo_pin, distance_cm):
+        """Simulated HC-SR04: trigger(trig_pin) answers on echo_pin for distance_cm(t)."""
+        self._distance[trig_pin] = (echo_pin, distance_cm)
+
+    def trigger(self, pin, pulse_us=PULSE_US):
+        t = self.now()
+        with self._lock:
+            self.writes += [(t, pin, 1), (t + pulse_us / 1e6, pin, 0)]
+        if pin not in self._distance:
+            return
+        echo, distance_cm = self._distance[pin]
+        d = distance_cm(t)
+        if d == float("inf"):
+            self.set_input(echo, WATCHDOG, at=t + self._watchdog_ms.get(echo, 25) / 1000)
+            return
+        rise = t + ECHO_DELAY_US / 1e6
+        self.set_input(echo, 1, at=rise)
+        self.set_input(echo, 0, at=rise + d * US_PER_CM_ROUND_TRIP / 1e6)
+
+    def callback(self, pin, func, edge=EITHER_EDGE):
+        with self._lock:
+            self._callbacks.setdefault(pin, []).append(func)
+        return _Handle(lambda: self._callbacks[pin].remove(func))
+
+    def watchdog(self, pin, ms):
+        self._watchdog_ms[pin] = ms
+
+    def glitch_filter(self, pin, us):
+        pass
+
+    def tick_diff(self, t1, t2):
+        return tick_diff(t1, t2)
+
+    def cleanup(self):
+        pass
+
+    def close(self):
+        pass
+
+    # ====== logs ======
+    def edges(self, pin=None):
+        """(times, pins, levels) of every output edge, pulse trains expanded, in time order."""
+        times, pins, levels = [], [], []
+        for t, p, level in self.writes:
+            if pin is None or p == pin:
+                times.append([t])
+                pins.append([p])
+                levels.append([level])
+        for start, p, periods, pulse_s in self.trains:
+            if pin is not None and p != pin or len(periods) == 0:
+                continue
+            t, level = train_edges(periods, pulse_s, start)
+            times.append(t)
+            pins.append(np.full(len(t), p))
+            levels.append(level)
+        if not times:
+            return np.zeros(0), np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        times, pins, levels = np.concatenate(times), np.concatenate(pins), np.concatenate(levels)
+        order = np.argsort(times, kind="stable")
+        return times[order], pins[order].astype(int), levels[order].astype(int)
+
+    def pulses(self, pin):
+        """Number of pulses sent on pin by pulse_train()."""
+        return sum(len(periods) for _, p, periods, _ in self.trains if p == pin)
+
+
+# ====== process-wide driver ======
+def make_driver(kind=None):
+    """kind: "pigpio", "rpi", "sim" or None (ECOSONIC_GPIO, else pigpio -> RPi.GPIO)."""
+    kind = kind or os.environ.get("ECOSONIC_GPIO")
+    if kind == "pigpio":
+        return PigpioDriver()
+    if kind == "rpi":
+        return RPiGPIODriver()
+    if kind == "sim":
+        return SimulatedDriver(realtime=True)
+    if kind is not None:
+        raise ValueError(f"Unknown GPIO driver {kind!r}; expected pigpio, rpi or sim")
+    try:
+        return PigpioDriver()
+    except Exception as e:
+        print(f"pigpio not available ({e}), using RPi.GPIO")
+        return RPiGPIODriver()
+
+
+def get_driver():
+    global _driver
+    with _driver_lock:
+        if _driver is None:
+            _driver = make_driver()
+        return _driver
+
+
+def set_driver(driver):
+    """Use this driver everywhere (e.g. SimulatedDriver()); returns it."""
+    global _driver
+    with _driver_lock:
+        _driver = driver
+    return driver
+
+
+if __name__ == "__main__":
+    from sensor.Ultrasonic_control import DropPassDetector
+    from sensor.servo_control import Servo
+    from sensor.stepper_controls import Carousel
+
+    sim = SimulatedDriver()
+    drop_times = [0.5 + 3.0 * i for i in range(7)]
+    sim.attach_distance(26, 25, lambda t: 8.0 if any(d <= t < d + 0.025 for d in drop_times) else 20.0)
+    detector = DropPassDetector(TRIG=26, ECHO=25, NEAR_CM=17, FAR_CM_RELEASE=18, CYCLE_MS=12,
+                                driver=sim, background=False)
+    carousel = Carousel(driver=sim)
+    servo = Servo(driver=sim)
+
+    t_wall = time.perf_counter()
+    for target, drop in enumerate(drop_times):
+        while not detector.edge_detected():
+            sim.sleep(0.001)
+        detected = sim.now()
+        move_start = sim.now()
+        carousel.move_to(target)
+        move_end = sim.now()
+        servo.set_angle(120)
+        servo.set_angle(0)
+        print(f"class {target}: detected +{(detected - drop) * 1000:.1f} ms, "
+              f"carousel {(move_end - move_start) * 1000:.0f} ms, sorted +{(sim.now() - drop) * 1000:.0f} ms")
+    detector.close()
+    times, pins, _ = sim.edges()
+    print(f"{len(times)} output edges, {sim.now():.2f} s virtual in {time.perf_counter() - t_wall:.2f} s wall")
@@ -0,0 +1,192 @@
+"""
+Motion planner for the two stacked carousels (sensor/stepper_controls.py).
+
+- Both motors move at the same time (Carousel.move_motors, one merged pulse
+  timeline). This is safe because every move finishes before the servo tips
+  the item in. Set parallel=False if the carousels must turn one at a time.
+- Idle (home) pose: after an item is sorted the carousels go to the pose with
+  the least expected travel to the next item, weighted by the class
+  frequencies seen so far (saved in counts_path between runs). Classes 4-6
+  leave the lower motor free, so it can wait where classes 0-3 need it.
+- preposition(class, item) starts moving towards a class while inference
+  is still running (early exit path), if the carousel is idle. The caller
+  makes sure no earlier item is still waiting to be sorted.
+- Every item records its expected (profile) and actual seconds of travel.
+- save() keeps the carousel pose next to the class counts and the next
+  start restores it, so the positions stay right even when the carousel
+  could not be parked on exit.
+"""
+
+import collections
+import json
+import os
+import threading
+import numpy as np
+
+from sensor.stepper_controls import HOME_MO1, HOME_MO2, STEPS_PER_90, shortest_delta
+from sensor.stepper_motion import move_duration
+
+N_CLASSES = 7
+
+# target: class; expected / actual: seconds of the move made for the item;
+# early: seconds already moved by preposition() before the class was final
+Travel = collections.namedtuple("Travel", "target expected actual early")
+
+
+def required_pose(target):
+    """(lower, upper) positions class `target` needs; None = that motor is free."""
+    if 0 <= target <= 3:
+        return target, HOME_MO2
+    if 4 <= target <= 6:
+        return None, target - 4
+    raise ValueError("The number should between 0 and 6")
+
+
+class MotionPlanner:
+    def __init__(self, carousel, parallel=True, adaptive_home=True, counts_path=None, n_classes=N_CLASSES):
+        self.carousel = carousel
+        self.parallel = parallel
+        self.adaptive_home = adaptive_home
+        self.counts_path = counts_path
+        self.counts = np.ones(n_classes)   # observed classes, +1 prior each
+        if counts_path and os.path.exists(counts_path):
+            with open(counts_path) as f:
+                saved = json.load(f)
+            if isinstance(saved, list):      # older files: counts only
+                saved = {"counts": saved}
+            self.counts = np.asarray(saved["counts"], dtype=np.float64)
+            if "pose" in saved:
+                # where the carousel was left last time (parked or not)
+                carousel.position1, carousel.position2 = saved["pose"]
+
+        # Held for a whole actuation (move + servo) and by background moves
+        self.lock = threading.RLock()
+        self.history = []
+        self._generation = 0     # bumped by every move made for an item
+        self._early = collections.defaultdict(float)   # item -> seconds pre-positioned
+        self._threads = []
+        self._seconds = {d: move_duration(d * STEPS_PER_90, max_speed=carousel.max_speed) for d in range(3)}
+
+    # ====== cost model ======
+    def _motor_seconds(self, target, current):
+        return 0.0 if target is None else self._seconds[abs(shortest_delta(target, current))]
+
+    def expected_seconds(self, target, pose=None):
+        """Seconds of travel from pose (default: current positions) to class target."""
+        p1, p2 = pose if pose is not None else (self.carousel.position1, self.carousel.position2)
+        r1, r2 = required_pose(target)
+        t1, t2 = self._motor_seconds(r1, p1), self._motor_seconds(r2, p2)
+        return max(t1, t2) if self.parallel else t1 + t2
+
+    def home_pose(self):
+        """Pose with the least frequency-weighted expected travel (ties: the default pose)."""
+        if not self.adaptive_home:
+            return HOME_MO1, HOME_MO2
+        freq = self.counts / self.counts.sum()
+        best, best_cost = (HOME_MO1, HOME_MO2), None
+        for pose in [(HOME_MO1, HOME_MO2)] + [(a, b) for a in range(4) for b in range(4)]:
+            cost = sum(f * self.expected_seconds(c, pose) for c, f in enumerate(freq))
+            if best_cost is None or cost < best_cost - 1e-9:
+                best, best_cost = pose, cost
+        return best
+
+    # ====== moves ======
+    def move_to(self, target, item=None):
+        """Move to class target (blocking, waits for a background move first) -> Travel."""
+        with self.lock:
+            self._generation += 1
+            expected = self.expected_seconds(target)
+            actual = self.carousel.move_motors(*required_pose(target), parallel=self.parallel)
+            travel = Travel(target, expected, actual, self._early.pop(item, 0.0))
+            # anything left belongs to items that were never sorted
+            self._early.clear()
+            self.counts[target] += 1
+            self.history.append(travel)
+            return travel
+
+    def preposition(self, target, item=None):
+        """Start towards a likely class for item in the background; skipped if the carousel is busy."""
+        def run():
+            if not self.lock.acquire(blocking=False):
+                return
+            try:
+                self._generation += 1
+                self._early[item] += self.carousel.move_motors(*required_pose(target), parallel=self.parallel)
+            finally:
+                self.lock.release()
+        self._background(run)
+
+    def go_home(self):
+        """After an item: go to the home pose in the background, unless a new move comes first."""
+        generation = self._generation
+
+        def run():
+            with self.lock:
+                if self._generation == generation:
+                    self.carousel.move_motors(*self.home_pose(), parallel=self.parallel)
+        self._background(run)
+
+    def park(self):
+        """Default pose on exit (the one the carousels start from next time)."""
+        self.wait()
+        with self.lock:
+            self._generation += 1
+            self.carousel.move_motors(HOME_MO1, HOME_MO2, parallel=self.parallel)
+        print("Motors reset to position 0 (defult position)")
+
+    def _background(self, fn):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        thread = threading.Thread(target=fn, name="MotionPlanner", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def wait(self):
+        for thread in list(self._threads):
+            thread.join()
+
+    # ====== stats ======
+    def save(self):
+        """Class counts and the current carousel pose, for the next start."""
+        if self.counts_path:
+            os.makedirs(os.path.dirname(self.counts_path) or ".", exist_ok=True)
+            pose = [self.carousel.position1, self.carousel.position2]
+            with open(self.counts_path, "w") as f:
+                json.dump({"counts": self.counts.tolist(), "pose": pose}, f)
+
+    def summary(self):
+        if not self.history:
+            return "Motor travel: no items"
+        expected = sum(t.expected for t in self.history)
+        actual = sum(t.actual for t in self.history)
+        early = sum(t.early for t in self.history)
+        return (f"Motor travel: {len(self.history)} items, expected {expected:.2f} s, actual {actual:.2f} s, "
+                f"pre-positioned {early:.2f} s, home pose {self.home_pose()}")
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+    from sensor.gpio_driver import SimulatedDriver
+    from sensor.stepper_controls import Carousel
+
+    # Skewed class mix (bottles and cans most common), virtual clock
+    rng = np.random.default_rng(0)
+    targets = rng.choice(N_CLASSES, size=200, p=[0.05, 0.35, 0.1, 0.3, 0.1, 0.05, 0.05])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        old = Carousel(driver=SimulatedDriver())
+        for target in targets:
+            old.move_to(int(target))
+        old_seconds = old.backend.driver.now()
+
+        planner = MotionPlanner(Carousel(driver=SimulatedDriver()))
+        on_path = 0.0
+        for target in targets:
+            on_path += planner.move_to(int(target)).actual
+            planner.go_home()
+            planner.wait()
+
+    print(f"{len(targets)} items, seconds of motor travel before the servo can tip:")
+    print(f"  sequential, stays at the last class (motor_control): {old_seconds:.1f} s")
+    print(f"  planner (parallel, home {planner.home_pose()}): {on_path:.1f} s")
+    print(f"  expected by the planner: {sum(t.expected for t in planner.history):.1f} s")
@@ -1,29 +1,54 @@
-import RPi.GPIO as GPIO
 import time
 
+from sensor.gpio_driver import get_driver
+
 servo_pin = 13
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(servo_pin, GPIO.OUT)
 
-pwm = GPIO.PWM(servo_pin, 50)  # 50Hz for servo
-pwm.start(0)
-     
+class Servo:
+    def __init__(self, pin=servo_pin, driver=None, frequency=50, settle_s=0.5):
+        self.pin = pin
+        self.driver = driver if driver is not None else get_driver()
+        self.settle_s = settle_s
+        self.driver.setup_output(pin)
+        self.pwm = self.driver.pwm(pin, frequency)  # 50Hz for servo
+
+    def set_angle(self, angle):
+        print(f"Setting servo angle to {angle} degrees")
+        if 0 <= angle <= 180:
+            duty = 2 + (angle / 18)  # Map angle to duty cycle
+            self.driver.write(self.pin, True)
+            self.pwm.duty(duty)
+            self.driver.sleep(self.settle_s)
+            self.driver.write(self.pin, False)
+            self.pwm.duty(0)
+        else:
+            raise ValueError("Angle must be between 0 and 180")
+
+    def stop(self):
+        self.pwm.stop()
+
+
+_servo = None
+
+
+def setup_servo(driver=None):
+    global _servo
+    _servo = Servo(driver=driver)
+    return _servo
+
+
 def set_angle(angle):
-    print(f"Setting servo angle to {angle} degrees")
-    if 0 <= angle <= 180:
-        duty = 2 + (angle / 18)  # Map angle to duty cycle
-        GPIO.output(servo_pin, True)
-        pwm.ChangeDutyCycle(duty)
-        time.sleep(0.5)
-        GPIO.output(servo_pin, False)
-        pwm.ChangeDutyCycle(0)
-    else:
-        raise ValueError("Angle must be between 0 and 180")
+    if _servo is None:
+        setup_servo()
+    _servo.set_angle(angle)
+
 
 def cleanup():
-    pwm.stop()
-    GPIO.cleanup()
+    if _servo is not None:
+        _servo.stop()
+    get_driver().cleanup()
+
 
 if __name__ == "__main__":
     try:
@@ -36,5 +61,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("Exiting program")
         cleanup()
-        exit(0)    
-
+        exit(0)
@@ -1,82 +1,151 @@
-import RPi.GPIO as GPIO
-import time
+from sensor.stepper_motion import trapezoid_delays, StepperBackend, MAX_SPEED_SPS
 
 DIR_PIN1 = 6
 STEP_PIN1 = 24
 DIR_PIN2 = 5
 STEP_PIN2 = 23
 
-CURRENT_MO1 = 0
-CURRENT_MO2 = 3
+# Home pose: lower motor (1) at 0, upper motor (2) at 3 (the hole)
+HOME_MO1 = 0
+HOME_MO2 = 3
 
 # DIR pin level to move in the +position direction (0->1->2->3)
 DIR_POS_LEVEL_M1 = 1   # set to 0 or 1 to match your wiring for motor 1
 DIR_POS_LEVEL_M2 = 1   # set to 0 or 1 to match your wiring for motor 2
 
-
-def setup_gpio():
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(DIR_PIN1, GPIO.OUT)
-    GPIO.setup(STEP_PIN1, GPIO.OUT)
-    GPIO.setup(DIR_PIN2, GPIO.OUT)
-    GPIO.setup(STEP_PIN2, GPIO.OUT)
-
-def motor_rotate(step_pin, dir_pin, direction, step, step_delay):
-    GPIO.output(dir_pin, direction)
-    for i in range(4):
-        for _ in range(int(step)):
-            GPIO.output(step_pin, GPIO.HIGH)
-            time.sleep(step_delay)
-            GPIO.output(step_pin, GPIO.LOW)
-            time.sleep(step_delay)
-
-def rotate_to_position(target_position, current_position, step_pin, dir_pin, step_delay=0.00001):
-    MOD = 4
-    target_position %= MOD
-    current_position %= MOD
-
-    raw = (target_position - current_position) % MOD   # 0..3
-    delta = raw - MOD if raw > MOD / 2 else raw        # -2..+2 (shortest path)
-
-    step_count_per_90 = 3200 / 4
-    step = abs(delta) * step_count_per_90
-
-    # choose mapping for this motor from its DIR pin
-    dir_pos_level = DIR_POS_LEVEL_M1 if dir_pin == DIR_PIN1 else DIR_POS_LEVEL_M2
-    # If delta > 0 (e.g., 0->1), use dir_pos_level; if delta < 0 (e.g., 0->3), use the opposite
-    direction = dir_pos_level if delta > 0 else 1 - dir_pos_level
-
-    print(f"Delta : {delta}  (raw={raw})")
-    print(f"Step : {step/step_count_per_90}")
-    print(f"Direction : {direction}")
-
-    if delta == 0:
-        print("Don't rotate, already at target position")
-        return current_position
-
-    motor_rotate(step_pin, dir_pin, direction, step, step_delay)
-    return target_position
-
+# Step pulses per 90 degrees (800 steps x 4 passes in the old bit-bang loop)
+STEPS_PER_90 = 3200
+
+
+def shortest_delta(target_position, current_position, mod=4):
+    raw = (target_position - current_position) % mod   # 0..3
+    return raw - mod if raw > mod / 2 else raw         # -2..+2 (shortest path)
+
+
+class Carousel:
+    """
+    The two stacked stepper carousels and their positions (0-3 each).
+    Classes 0-3: upper motor at the hole (3), lower motor to the class;
+    classes 4-6: upper motor to class - 4.
+    """
+
+    def __init__(self, backend=None, driver=None, max_speed=MAX_SPEED_SPS):
+        """backend: a StepperBackend (default: one on driver / the process-wide driver)."""
+        self.backend = backend if backend is not None else StepperBackend(driver)
+        self.backend.setup((DIR_PIN1, STEP_PIN1, DIR_PIN2, STEP_PIN2))
+        self.max_speed = max_speed
+        self.position1 = HOME_MO1
+        self.position2 = HOME_MO2
+
+    def motor_rotate(self, step_pin, dir_pin, direction, step):
+        delays = trapezoid_delays(step, max_speed=self.max_speed)
+        duration = self.backend.move(step_pin, dir_pin, direction, delays)
+        print(f"Moved {int(step)} steps in {duration:.3f} s")
+
+    def rotate_to_position(self, target_position, current_position, step_pin, dir_pin):
+        MOD = 4
+        target_position %= MOD
+        current_position %= MOD
+
+        raw = (target_position - current_position) % MOD   # 0..3
+        delta = shortest_delta(target_position, current_position, MOD)
+        step = abs(delta) * STEPS_PER_90
+
+        # DIR level from this motor's wiring: dir_pos_level if delta > 0 (e.g., 0->1),
+        # the opposite if delta < 0 (e.g., 0->3)
+        direction = self._direction(delta, dir_pin)
+
+        print(f"Delta : {delta}  (raw={raw})")
+        print(f"Step : {step/STEPS_PER_90}")
+        print(f"Direction : {direction}")
+
+        if delta == 0:
+            print("Don't rotate, already at target position")
+            return current_position
+
+        self.motor_rotate(step_pin, dir_pin, direction, step)
+        return target_position
+
+    def _direction(self, delta, dir_pin):
+        dir_pos_level = DIR_POS_LEVEL_M1 if dir_pin == DIR_PIN1 else DIR_POS_LEVEL_M2
+        return dir_pos_level if delta > 0 else 1 - dir_pos_level
+
+    def move_motors(self, position1=None, position2=None, parallel=True):
+        """
+        Move both motors to the given positions (None = stay), shortest path,
+        together when parallel=True. Returns the seconds the motors took.
+        """
+        moves = []
+        for motor, target, current, step_pin, dir_pin in ((1, position1, self.position1, STEP_PIN1, DIR_PIN1),
+                                                          (2, position2, self.position2, STEP_PIN2, DIR_PIN2)):
+            if target is None:
+                continue
+            delta = shortest_delta(target % 4, current % 4)
+            if delta:
+                delays = trapezoid_delays(abs(delta) * STEPS_PER_90, max_speed=self.max_speed)
+                moves.append((motor, target % 4, (step_pin, dir_pin, self._direction(delta, dir_pin), delays)))
+            else:
+                self._set_position(motor, target % 4)
+        # A position changes only once its move has returned, so after a failed
+        # move the carousel's idea of where it is still matches the hardware
+        if parallel and len(moves) > 1:
+            duration = self.backend.move_many([move for _, _, move in moves])
+            for motor, target, _ in moves:
+                self._set_position(motor, target)
+            return duration
+        duration = 0.0
+        for motor, target, move in moves:
+            duration += self.backend.move(*move)
+            self._set_position(motor, target)
+        return duration
+
+    def _set_position(self, motor, position):
+        if motor == 1:
+            self.position1 = position
+        else:
+            self.position2 = position
+
+    def move_to(self, target_pos):
+        if 0 <= target_pos <= 3:
+            if self.position2 != HOME_MO2:
+                self.position2 = self.rotate_to_position(HOME_MO2, self.position2, STEP_PIN2, DIR_PIN2)
+                print("Upper motor to position hole")
+            self.position1 = self.rotate_to_position(target_pos, self.position1, STEP_PIN1, DIR_PIN1)
+        elif 4 <= target_pos <= 6:
+            self.position2 = self.rotate_to_position(target_pos - 4, self.position2, STEP_PIN2, DIR_PIN2)
+        else:
+            print("The number should between 0 and 6")
+
+    def reset(self):
+        self.position1 = self.rotate_to_position(HOME_MO1, self.position1, STEP_PIN1, DIR_PIN1)
+        self.position2 = self.rotate_to_position(HOME_MO2, self.position2, STEP_PIN2, DIR_PIN2)
+        print("Motors reset to position 0 (defult position)")
+
+
+_carousel = None
+
+
+def setup_gpio(backend=None):
+    """
+    Set up the carousel on the given motion backend (e.g. SimulatedStepperBackend),
+    else on the process-wide GPIO driver (pigpio waves, else RPi.GPIO timing).
+    """
+    global _carousel
+    _carousel = Carousel(backend)
+    return _carousel
 
 
 def motor_control(target_pos):
-    global CURRENT_MO1, CURRENT_MO2
-    if 0 <= target_pos <= 3:
-        if CURRENT_MO2 != 3:
-            CURRENT_MO2 = rotate_to_position(3, CURRENT_MO2, STEP_PIN2, DIR_PIN2)
-            print("Upper motor to position hole")
-        CURRENT_MO1 = rotate_to_position(target_pos, CURRENT_MO1, STEP_PIN1, DIR_PIN1)
-    elif 4 <= target_pos <= 6 :
-        CURRENT_MO2 = rotate_to_position(target_pos - 4, CURRENT_MO2, STEP_PIN2, DIR_PIN2)
-    else:
-        print("The number should between 0 and 6")
+    _carousel.move_to(target_pos)
+
 
 def reset_motors_position():
-    rotate_to_position(0, CURRENT_MO1, STEP_PIN1, DIR_PIN1)
-    rotate_to_position(3, CURRENT_MO2, STEP_PIN2, DIR_PIN2)
-    print("Motors reset to position 0 (defult position)")
+    _carousel.reset()
+
 
 if __name__ == "__main__":
+    from sensor.gpio_driver import get_driver
+
     setup_gpio()
     try:
         while True:
@@ -85,5 +154,5 @@ if __name__ == "__main__":
 
     except KeyboardInterrupt:
         reset_motors_position()
-        GPIO.cleanup()
+        get_driver().cleanup()
         print("Program is Terminated <3")
@@ -0,0 +1,118 @@
+"""
+Stepper motion engine: trapezoidal step profiles played as precomputed pulse
+trains instead of bit-banging each step with time.sleep().
+
+- trapezoid_delays(): per-step periods for accel / cruise / decel
+- StepperBackend: plays them through a GPIO driver (sensor/gpio_driver.py):
+  pigpio hardware-timed waves, RPi.GPIO busy-wait timing or simulated
+- SimulatedStepperBackend: StepperBackend on a SimulatedDriver, so step
+  counts and move durations can be checked on a plain Linux box
+"""
+
+import numpy as np
+
+from sensor.gpio_driver import SimulatedDriver, get_driver
+
+# Speed profile (steps/s, steps/s^2). Tune to what the carousel mechanics allow.
+MAX_SPEED_SPS = 10000
+ACCEL_SPS2 = 50000
+START_SPEED_SPS = 800
+STEP_PULSE_US = 10
+
+
+def trapezoid_delays(steps, max_speed=MAX_SPEED_SPS, accel=ACCEL_SPS2, start_speed=START_SPEED_SPS):
+    """
+    Step periods in seconds for a trapezoidal (or triangular, for short
+    moves) velocity profile: v(i) = min(sqrt(v0^2 + 2*a*i), vmax, mirror).
+    """
+    steps = int(steps)
+    if steps <= 0:
+        return np.zeros(0)
+    i = np.arange(steps)
+    v_up = np.sqrt(start_speed ** 2 + 2.0 * accel * i)
+    v_down = v_up[::-1]
+    v = np.minimum(np.minimum(v_up, v_down), max(max_speed, start_speed))
+    return 1.0 / v
+
+
+def move_duration(steps, **profile):
+    """Expected seconds for a move of `steps` with the given profile."""
+    return float(trapezoid_delays(steps, **profile).sum())
+
+
+class StepperBackend:
+    """
+    One STEP/DIR driver board per motor on a GPIO driver.
+    moves: list of dicts (start, duration, step_pin, dir_pin, direction, steps)
+    with start on the driver's clock.
+    """
+
+    def __init__(self, driver=None, pulse_us=STEP_PULSE_US):
+        self.driver = driver if driver is not None else get_driver()
+        self.pulse_us = pulse_us
+        self.moves = []
+
+    def setup(self, pins):
+        for pin in pins:
+            self.driver.setup_output(pin, 0)
+
+    def move(self, step_pin, dir_pin, direction, delays):
+        self.driver.write(dir_pin, direction)
+        start = self.driver.now()
+        duration = self.driver.pulse_train(step_pin, delays, self.pulse_us)
+        self.moves.append({
+            "start": start,
+            "duration": duration,
+            "step_pin": step_pin,
+            "dir_pin": dir_pin,
+            "direction": direction,
+            "steps": len(delays),
+        })
+        return duration
+
+    def move_many(self, moves):
+        """
+        Start several motors together: moves = [(step_pin, dir_pin, direction, delays), ...].
+        Returns the seconds until the last one finished.
+        """
+        for _, dir_pin, direction, _ in moves:
+            self.driver.write(dir_pin, direction)
+        start = self.driver.now()
+        duration = self.driver.pulse_trains({step_pin: delays for step_pin, _, _, delays in moves},
+                                            self.pulse_us)
+        for step_pin, dir_pin, direction, delays in moves:
+            self.moves.append({
+                "start": start,
+                "duration": float(np.sum(delays)),
+                "step_pin": step_pin,
+                "dir_pin": dir_pin,
+                "direction": direction,
+                "steps": len(delays),
+            })
+        return duration
+
+    def total_steps(self):
+        return sum(m["steps"] for m in self.moves)
+
+
+class SimulatedStepperBackend(StepperBackend):
+    """StepperBackend on its own SimulatedDriver (virtual clock unless realtime=True)."""
+
+    def __init__(self, pulse_us=STEP_PULSE_US, realtime=False, driver=None):
+        super().__init__(driver if driver is not None else SimulatedDriver(realtime=realtime), pulse_us)
+
+    @property
+    def clock(self):
+        return self.driver.now()
+
+    def edges(self, index=-1):
+        """(time, level) of every STEP edge of one recorded move."""
+        move = self.moves[index]
+        start, _, periods, pulse_s = [t for t in self.driver.trains if t[1] == move["step_pin"]
+                                      and t[0] == move["start"]][-1]
+        rise = start + np.concatenate(([0.0], np.cumsum(periods)[:-1]))
+        times = np.empty(2 * len(rise))
+        times[0::2] = rise
+        times[1::2] = rise + pulse_s
+        levels = np.tile([1, 0], len(rise))
+        return times, levels
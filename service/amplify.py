@@ -1,32 +1,126 @@
+import collections
+import os
+import tempfile
 import numpy as np
-import librosa
 import soundfile as sf
-from pydub import AudioSegment
-from pydub.silence import detect_nonsilent
 
-def amplify_audio(input_file, action_duration=400,silence_thresh=-45):
-    # โหลดไฟล์เสียง
-    output_path = './temp_output_amp.wav'
+from service.silence import EnergyProfile, INT16_SCALE
+from utils.audio_io import load_audio
+
+MAX_TARGET_RESCALE = .6
+# Samples per block of the fused scan (fits in L2 with its int16/float64 copies)
+BLOCK_SIZE = 16384
+
+# audio: normalized float32 clip, ranges: non-silent [start, end] ms of the
+# recording, profile: EnergyProfile of audio (for cut_sound_per_action_array),
+# gain: factor applied
+Normalized = collections.namedtuple("Normalized", "audio ranges profile gain")
+
+
+def peak_gain(y, max_target_rescale=MAX_TARGET_RESCALE):
+    return gain_for_peak(np.max(np.abs(y)), max_target_rescale)
 
-    sound = AudioSegment.from_wav(input_file)
-    nonsilent_ranges = detect_nonsilent(sound, min_silence_len=action_duration, silence_thresh=silence_thresh)
-    
-    if not nonsilent_ranges:
-        print("No sound detection in this file")
-        return "" , False
-    
-    y, sr = librosa.load(input_file, sr=None)
 
-    max_val = np.max(np.abs(y))
-    max_target_rescale = .6
+def gain_for_peak(max_val, max_target_rescale=MAX_TARGET_RESCALE):
     if max_val > 0 and max_val < max_target_rescale:
-        y_new = (max_target_rescale /max_val) * y
-    else:
-        y_new = y
+        return max_target_rescale / max_val
+    return 1.0
+
+
+def rescale_peak(y, max_target_rescale=MAX_TARGET_RESCALE):
+    gain = peak_gain(y, max_target_rescale)
+    return gain * y if gain != 1.0 else y
+
+
+def scan(y, sample_rate, gain=1.0, out=None, block_size=BLOCK_SIZE):
+    """
+    One blockwise pass over y: scales it by gain into out (out may be y),
+    quantizes to 16-bit like convert_to_2bytes and accumulates the energy.
+    Returns (peak of |y|, EnergyProfile of the scaled clip).
+    """
+    n = len(y)
+    samples = np.empty(n, dtype=np.int16)
+    squares = np.empty(n, dtype=np.float64)
+    scaled = np.empty(min(block_size, n), dtype=np.float32)
+    peak = y.dtype.type(0)
+    for i in range(0, n, block_size):
+        block = y[i:i + block_size]
+        m = len(block)
+        if m:
+            peak = max(peak, np.max(np.abs(block)))
+        if gain != 1.0:
+            np.multiply(block, gain, out=scaled[:m])
+            block = scaled[:m]
+        if out is not None and (gain != 1.0 or out is not y):
+            out[i:i + m] = block
+        q = samples[i:i + m]
+        np.multiply(block, INT16_SCALE, out=scaled[:m])
+        q[:] = scaled[:m]                       # truncates like astype(np.int16)
+        np.square(q, out=squares[i:i + m], dtype=np.float64)
+    return peak, EnergyProfile(samples, sample_rate, squares=squares)
 
 
-    sf.write(output_path, y_new, sr)
+def normalize_peak(y, sample_rate, action_duration=400, silence_thresh=-45,
+                   max_target_rescale=MAX_TARGET_RESCALE, out=None):
+    """
+    Array-based amplify: the peak and the silence decision come from the
+    same pass over the recording, then one more pass rescales into `out`
+    (pass out=y to rescale in place, or a preallocated float32 buffer) and
+    builds the EnergyProfile the cut stage needs.
+    Returns Normalized(audio, ranges, profile, gain); audio is None when
+    the recording is all silence.
+    """
+    y = np.asarray(y, dtype=np.float32)
+    peak, raw_profile = scan(y, sample_rate)
+    ranges = raw_profile.detect_nonsilent(min_silence_len=action_duration, silence_thresh=silence_thresh)
+    if not ranges:
+        return Normalized(None, [], None, 1.0)
+
+    gain = gain_for_peak(peak, max_target_rescale)
+    if out is None:
+        out = np.empty_like(y)
+    if gain == 1.0:
+        if out is not y:
+            out[:] = y
+        return Normalized(out, ranges, raw_profile, gain)
+    _, profile = scan(y, sample_rate, gain=gain, out=out)
+    return Normalized(out, ranges, profile, gain)
+
+
+def amplify_audio(input_file, action_duration=400, silence_thresh=-45, output_path=None):
+    """
+    File version for the WAV-based pipeline: writes the amplified clip to
+    output_path (default: a new temp file, so concurrent calls never share
+    a path; the caller removes it) and returns (path, True), or ("", False)
+    when the file is all silence.
+    """
+    # โหลดไฟล์เสียง (ครั้งเดียว)
+    y, sr = load_audio(input_file, sr=None)
+    result = normalize_peak(y, sr, action_duration, silence_thresh)
+    if result.audio is None:
+        print("No sound detection in this file")
+        return "", False
+
+    if output_path is None:
+        fd, output_path = tempfile.mkstemp(prefix="amp_", suffix=".wav")
+        os.close(fd)
+    sf.write(output_path, result.audio, sr)
     print("Amplified audio saved to:", output_path)
 
-    return output_path,  True
- 
\ No newline at end of file
+    return output_path, True
+
+
+def amplify_array(y, sample_rate, action_duration=400, silence_thresh=-45, out=None):
+    """
+    In-memory version of amplify_audio: takes the float32 recording and
+    returns (amplified_array, profile), or (None, None) when it is all silence.
+    profile is the EnergyProfile of the amplified array; hand it to
+    cut_sound_per_action_array so the clip is not analysed twice.
+    """
+    result = normalize_peak(y, sample_rate, action_duration, silence_thresh, out=out)
+    if result.audio is None:
+        print("No sound detection in this file")
+        return None, None
+
+    print("Amplified audio in memory")
+    return result.audio, result.profile
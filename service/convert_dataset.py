@@ -0,0 +1,273 @@
+"""
+Parallel, incremental dataset conversion (audio -> feature PNGs) for retraining.
+
+    python -m service.convert_dataset ./dataset/sound ./dataset/images --workers 4
+    python -m service.convert_dataset ./dataset/sound ./dataset/mel --kind mel
+
+- Files are fanned out over a process pool (one librosa per core).
+- A manifest (<output>/.convert_manifest.json) keyed by source path stores
+  the content hash and the feature parameters of every converted file; files
+  whose hash and parameters are unchanged and whose output still exists are
+  skipped, so re-running on an unchanged dataset only stats the files
+  (size + mtime match -> the hash is not even recomputed).
+- Outputs are written atomically (temp file + rename).
+- The sub-folder layout (class folders) is kept under the output path.
+- --format shards writes memory-mapped .npy shards (utils/feature_shards.py)
+  instead of PNGs; unchanged records are copied from the previous shards and
+  the new shard dir is swapped in when complete.
+- One summary at the end instead of per-file prints.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from service.converting_sound_to_mel_image import (
+    convert_file_mel, convert_file_mel_mfcc, file_to_mel_mfcc_image, n_fft, n_mels, n_mfcc, hop_length,
+)
+from utils.feature_shards import FeatureShards, ShardWriter, label_of, replace_dir
+
+MANIFEST_NAME = ".convert_manifest.json"
+AUDIO_EXTENSIONS = ('.wav', '.mp3')
+MANIFEST_SAVE_EVERY = 500
+OUTPUT_FORMATS = ("png", "shards")
+
+KINDS = {
+    # kind: (converter, default parameters)
+    "mel_mfcc": (convert_file_mel_mfcc, {"n_mels": n_mels, "n_mfcc": n_mfcc, "n_fft": n_fft, "hop_length": hop_length}),
+    "mel": (convert_file_mel, {"n_mels": 256, "n_fft": 2048, "hop_length": 256}),
+}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def params_key(kind, params):
+    return json.dumps({"kind": kind, **params}, sort_keys=True)
+
+
+def list_audio_files(dataset_path):
+    files = []
+    for dirpath, _, filenames in os.walk(dataset_path):
+        for f in sorted(filenames):
+            if f.endswith(AUDIO_EXTENSIONS):
+                files.append(os.path.relpath(os.path.join(dirpath, f), dataset_path))
+    return sorted(files)
+
+
+def output_name(rel_path, extension=".png"):
+    return os.path.splitext(rel_path)[0] + extension
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def plan(dataset_path, manifest, key, output_exists, force=False):
+    """
+    Split the dataset into (todo, unchanged): todo = [(rel_path, size, mtime, hash)],
+    unchanged = [rel_path]. Manifest entries of deleted files are dropped.
+    """
+    todo, unchanged = [], []
+    files = list_audio_files(dataset_path)
+    for rel in set(manifest) - set(files):
+        del manifest[rel]
+    for rel in files:
+        src = os.path.join(dataset_path, rel)
+        st = os.stat(src)
+        entry = manifest.get(rel)
+        digest = None
+        if not force and entry is not None and entry["params"] == key and output_exists(entry):
+            if entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+                unchanged.append(rel)
+                continue
+            digest = file_hash(src)
+            if entry["hash"] == digest:
+                # touched but not changed: refresh size/mtime so the next run is stat-only
+                entry["size"], entry["mtime"] = st.st_size, st.st_mtime
+                unchanged.append(rel)
+                continue
+        todo.append((rel, st.st_size, st.st_mtime, digest))
+    return todo, unchanged
+
+
+def _convert_one(task):
+    """
+    Worker: convert one file, never raise (errors go into the summary).
+    Returns (rel, output, hash, error); output is the PNG path, or the
+    image itself for shards.
+    """
+    kind, params, dataset_path, output_path, output_format, rel, digest = task
+    src = os.path.join(dataset_path, rel)
+    out = output_name(rel)
+    try:
+        if digest is None:
+            digest = file_hash(src)
+        if output_format == "shards":
+            return rel, file_to_mel_mfcc_image(src, **params), digest, None
+        KINDS[kind][0](src, os.path.join(output_path, out), **params)
+        return rel, out, digest, None
+    except Exception as e:
+        return rel, out, digest, f"{type(e).__name__}: {e}"
+
+
+def _run_pool(tasks, workers, progress_every):
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, min(32, len(tasks) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for done, result in enumerate(pool.map(_convert_one, tasks, chunksize=chunksize), 1):
+            yield result
+            if progress_every and done % progress_every == 0:
+                print(f"  {done}/{len(tasks)} files . . .")
+
+
+def convert_dataset(dataset_path, output_path, kind="mel_mfcc", params=None, workers=None,
+                    manifest_path=None, force=False, progress_every=1000, output_format="png"):
+    """
+    Convert every audio file under dataset_path that changed since the last run.
+    Returns a summary dict (total, converted, skipped, failed, errors, seconds, files_per_s).
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind '{kind}', expected one of {tuple(KINDS)}")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {OUTPUT_FORMATS}")
+    if output_format == "shards" and kind != "mel_mfcc":
+        raise ValueError("Shards hold mel_mfcc feature images only")
+
+    params = {**KINDS[kind][1], **(params or {})}
+    key = params_key(kind, params)
+    os.makedirs(output_path, exist_ok=True)
+    manifest_in_output = manifest_path is None
+    manifest_path = manifest_path or os.path.join(output_path, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    start = time.perf_counter()
+    old_shards, old_records = None, {}
+    if output_format == "shards":
+        if FeatureShards.exists(output_path):
+            old_shards = FeatureShards(output_path)
+            old_records = {str(source): i for i, source in enumerate(old_shards.sources)}
+        output_exists = lambda entry: entry["output"] in old_records
+    else:
+        output_exists = lambda entry: os.path.exists(os.path.join(output_path, entry["output"]))
+
+    todo, unchanged = plan(dataset_path, manifest, key, output_exists, force)
+    tasks = [(kind, params, dataset_path, output_path, output_format, rel, digest)
+             for rel, _, _, digest in todo]
+    stats = {rel: (size, mtime) for rel, size, mtime, _ in todo}
+    converted, errors = 0, []
+
+    def record(rel, digest, error):
+        if error is None:
+            size, mtime = stats[rel]
+            manifest[rel] = {"hash": digest, "size": size, "mtime": mtime, "params": key, "output": rel}
+            return True
+        manifest.pop(rel, None)
+        errors.append((rel, error))
+        return False
+
+    if output_format == "png":
+        for done, (rel, out, digest, error) in enumerate(_run_pool(tasks, workers, progress_every), 1):
+            converted += record(rel, digest, error)
+            if error is None:
+                manifest[rel]["output"] = out
+            if done % MANIFEST_SAVE_EVERY == 0:
+                save_manifest(manifest, manifest_path)
+        save_manifest(manifest, manifest_path)
+
+    elif tasks or set(unchanged) != set(old_records):
+        # Rebuild the shards next to the old ones: unchanged records first, then new ones
+        all_files = unchanged + [rel for rel, _, _, _ in todo]
+        class_names = sorted({label_of(rel) for rel in all_files} - {""})
+        tmp_dir = output_path.rstrip("/\\") + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        writer = ShardWriter(tmp_dir, class_names)
+        for rel in unchanged:
+            writer.add(old_shards[old_records[rel]][0], label_of(rel), rel)
+        for rel, image, digest, error in _run_pool(tasks, workers, progress_every):
+            if record(rel, digest, error):
+                writer.add(image, label_of(rel), rel)
+                converted += 1
+        writer.close()
+        old_shards = None    # release the memory maps before swapping directories
+        save_manifest(manifest, os.path.join(tmp_dir, MANIFEST_NAME) if manifest_in_output else manifest_path)
+        replace_dir(tmp_dir, output_path)
+    else:
+        save_manifest(manifest, manifest_path)
+
+    seconds = time.perf_counter() - start
+    skipped = len(unchanged)
+    return {
+        "total": converted + skipped + len(errors),
+        "converted": converted,
+        "skipped": skipped,
+        "failed": len(errors),
+        "errors": errors,
+        "seconds": seconds,
+        "files_per_s": converted / seconds if seconds > 0 else 0.0,
+    }
+
+
+def print_summary(summary, max_errors=10):
+    print(f"Files: {summary['total']}, converted: {summary['converted']}, "
+          f"unchanged (skipped): {summary['skipped']}, failed: {summary['failed']}")
+    print(f"Time: {summary['seconds']:.1f} s, {summary['files_per_s']:.1f} files/s")
+    for rel, error in summary["errors"][:max_errors]:
+        print(f"  failed: {rel}: {error}")
+    if summary["failed"] > max_errors:
+        print(f"  . . . and {summary['failed'] - max_errors} more")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert an audio dataset to feature images (parallel, incremental)")
+    parser.add_argument("dataset_path")
+    parser.add_argument("output_path")
+    parser.add_argument("--kind", choices=tuple(KINDS), default="mel_mfcc",
+                        help="mel_mfcc = sound_to_image_mel_mfcc, mel = sound_to_image")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="png",
+                        help="png tree or memory-mapped .npy shards (mel_mfcc only)")
+    parser.add_argument("--workers", type=int, default=None, help="default: all cores")
+    parser.add_argument("--n-mels", type=int)
+    parser.add_argument("--n-mfcc", type=int, help="mel_mfcc only")
+    parser.add_argument("--n-fft", type=int)
+    parser.add_argument("--hop-length", type=int)
+    parser.add_argument("--manifest", help=f"default: <output_path>/{MANIFEST_NAME}")
+    parser.add_argument("--force", action="store_true", help="reconvert everything")
+    args = parser.parse_args(argv)
+
+    params = {name: value for name, value in (("n_mels", args.n_mels), ("n_mfcc", args.n_mfcc),
+                                              ("n_fft", args.n_fft), ("hop_length", args.hop_length))
+              if value is not None}
+    if args.kind == "mel" and "n_mfcc" in params:
+        parser.error("--n-mfcc only applies to --kind mel_mfcc")
+
+    summary = convert_dataset(args.dataset_path, args.output_path, args.kind, params,
+                              workers=args.workers, manifest_path=args.manifest, force=args.force,
+                              output_format=args.format)
+    print_summary(summary)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,151 @@
 import os
 import librosa
-import librosa.display
 import numpy as np
-import matplotlib.pyplot as plt
 import cv2
 from PIL import Image
 
+from utils.audio_io import load_audio, resample
+
 SAMPLE_RATE = 22050
 n_fft = 2048
 n_mels = 128
 n_mfcc = 20
 hop_length = 512          
 target_size = (224, 224)
+MFCC_N_MELS = 128
+
+# Feature drawn into each RGB channel; the Resnet34_Mel_MFCC model expects
+# (mel, mfcc, empty). "chroma" is only computed when it appears here.
+CHANNEL_LAYOUT = ("mel", "mfcc", "empty")
+CHANNEL_INTERPOLATION = {
+    "mel": cv2.INTER_LINEAR,
+    "mfcc": cv2.INTER_LINEAR,
+    "chroma": cv2.INTER_NEAREST,
+}
+
+def _norm255(x):
+    # ===== Normalize to 0–255 (per-feature) =====
+    x = x.astype(np.float32)
+    x = cv2.normalize(x, None, 0, 255, cv2.NORM_MINMAX)
+    return x.astype(np.uint8)
+
+
+def compute_features(y, sr=SAMPLE_RATE, channels=None, n_mels=n_mels, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length, S=None):
+    """
+    Single-STFT feature engine: computes the power spectrogram once (or uses
+    the one passed as S) and derives only the features named in channels.
+    Returns a dict {"mel": mel_db, "mfcc": mfcc, "chroma": chroma}.
+    Results are identical to calling librosa.feature.melspectrogram / mfcc /
+    chroma_stft on y, which would each run their own STFT.
+    """
+    if channels is None:
+        channels = CHANNEL_LAYOUT
+
+    if S is None:
+        S = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length)) ** 2
+
+    features = {}
+    if "mel" in channels or "mfcc" in channels:
+        mel = librosa.feature.melspectrogram(S=S, sr=sr, n_mels=n_mels)
+        if "mel" in channels:
+            features["mel"] = librosa.power_to_db(mel, ref=np.max)
+        if "mfcc" in channels:
+            # librosa.feature.mfcc(y=...) always uses a 128-band mel spectrogram
+            mel_mfcc = mel if n_mels == MFCC_N_MELS else librosa.feature.melspectrogram(S=S, sr=sr, n_mels=MFCC_N_MELS)
+            features["mfcc"] = librosa.feature.mfcc(S=librosa.power_to_db(mel_mfcc), n_mfcc=n_mfcc)
+    if "chroma" in channels:
+        features["chroma"] = librosa.feature.chroma_stft(S=S, sr=sr)
+
+    return features
+
+
+def mel_mfcc_image(y, sr=SAMPLE_RATE, n_mels=n_mels, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length, channels=None, S=None):
+    """
+    Build the 224x224 RGB uint8 image for one clip that is already in memory
+    (default layout: mel-dB, MFCC, empty). sound_to_image_mel_mfcc saves this
+    image as PNG.
+    """
+    if channels is None:
+        channels = CHANNEL_LAYOUT
+
+    if sr != SAMPLE_RATE and S is None:
+        y = resample(np.asarray(y, dtype=np.float32), sr, SAMPLE_RATE)
+        sr = SAMPLE_RATE
+
+    # ===== Features =====
+    features = compute_features(y, sr, channels, n_mels=n_mels, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length, S=S)
+
+    # ===== Make time-frames equal (axis=1) =====
+    T = max(x.shape[1] for x in features.values())
+
+    # ===== Normalize, flip, resize per channel =====
+    # flip แนวตั้ง เพื่อให้แกน y อยู่ด้านล่างเหมือนภาพ spectrogram ปกติ in spacshow
+    # mel/mfcc จะใช้ linear ก็ได้, แต่ chroma ใช้ NEAREST เพื่อให้แท่ง 12 แถวคม
+    planes = []
+    for name in channels:
+        if name == "empty":
+            # ===== Empty channel (optional) =====
+            planes.append(np.zeros(target_size[::-1], dtype=np.uint8))
+            continue
+        x = librosa.util.fix_length(features[name], size=T, axis=1)
+        img = np.flipud(_norm255(x))
+        planes.append(cv2.resize(img, target_size, interpolation=CHANNEL_INTERPOLATION[name]))
+
+    # ===== Stack to RGB =====
+    return np.stack(planes, axis=-1)
+
+
+def _save_atomic(save, path_image):
+    # Write next to the target and rename, so an interrupted run never leaves a half-written PNG
+    os.makedirs(os.path.dirname(path_image) or ".", exist_ok=True)
+    tmp_path = f"{path_image}.{os.getpid()}.tmp"
+    try:
+        save(tmp_path)
+        os.replace(tmp_path, path_image)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path_image
+
+
+def file_to_mel_mfcc_image(file_path, n_mels=n_mels, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length):
+    """One audio file -> (224, 224, 3) uint8 mel/MFCC feature image."""
+    y, sr = load_audio(file_path, sr=SAMPLE_RATE, cache=False)
+    return mel_mfcc_image(y, sr, n_mels=n_mels, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
+
+
+def convert_file_mel_mfcc(file_path, path_image, n_mels=n_mels, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length):
+    """One audio file -> one mel/MFCC PNG (the feature image the model expects)."""
+    rgb_image = file_to_mel_mfcc_image(file_path, n_mels=n_mels, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
+    return _save_atomic(lambda tmp: Image.fromarray(rgb_image).save(tmp, format="PNG"), path_image)
+
+
+def convert_file_mel(file_path, path_image, n_mels=256, n_fft=2048, hop_length=256):
+    """One audio file -> one 224x224 matplotlib log-mel PNG (the older VGG16 input)."""
+    # matplotlib is only needed here, keep it off the app's import path
+    import librosa.display
+    import matplotlib.pyplot as plt
+
+    # โหลดไฟล์เสียง
+    signal, sample_rate = load_audio(file_path, sr=SAMPLE_RATE, cache=False)
+
+    # สร้าง mel spectrogram
+    mel_spectrogram = librosa.feature.melspectrogram(y=signal, sr=sample_rate, n_fft=n_fft, hop_length=hop_length, n_mels=n_mels)
+
+    # convert mel to log scale (dB)
+    log_mel_spectrogram = librosa.power_to_db(mel_spectrogram, ref=np.max)
+
+    # สร้างภาพของ log mel spectrogram
+    plt.figure(figsize=(2.24, 2.24))
+    try:
+        librosa.display.specshow(log_mel_spectrogram, sr=sample_rate, hop_length=hop_length, cmap='inferno')
+        plt.axis('off')
+        plt.tight_layout(pad=0)
+        # บันทึกภาพ
+        return _save_atomic(lambda tmp: plt.savefig(tmp, format="png", bbox_inches='tight', pad_inches=0), path_image)
+    finally:
+        plt.close()  # ปิด plot เพื่อลดการใช้หน่วยความจำ
+
 
 def sound_to_image_mel_mfcc(dataset_path, output_path, n_mels=n_mels,n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length):
     print(f"Converting sound to mel spectrogram imgage . . . {dataset_path}")
@@ -23,61 +157,10 @@ def sound_to_image_mel_mfcc(dataset_path, output_path, n_mels=n_mels,n_mfcc=n_mf
                     print(f"Converting file: {file_path} to Image")
                     
                     try:
-                        y, sr = librosa.load(file_path,sr=22050)
-
-                        # ===== Features =====
-                        mel = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels, n_fft=n_fft, hop_length=hop_length)
-                        mel_db = librosa.power_to_db(mel, ref=np.max)
-
-                        mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
-
-                        chroma = librosa.feature.chroma_stft(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length)
-
-                        # ===== Make time-frames equal (axis=1) =====
-                        T = max(mel_db.shape[1], mfcc.shape[1], chroma.shape[1])
-                        mel_db = librosa.util.fix_length(mel_db, size=T, axis=1)
-                        mfcc   = librosa.util.fix_length(mfcc,   size=T, axis=1)
-                        chroma = librosa.util.fix_length(chroma, size=T, axis=1)
-
-
-                        # ===== Normalize to 0–255 (per-feature) =====
-                        def norm255(x):
-                            x = x.astype(np.float32)
-                            x = cv2.normalize(x, None, 0, 255, cv2.NORM_MINMAX)
-                            return x.astype(np.uint8)
-
-                        # mel_img    = norm255(mel_db)
-                        # mfcc_img   = norm255(mfcc)
-                        # chroma_img = norm255(chroma)
-
-                        # flip แนวตั้ง เพื่อให้แกน y อยู่ด้านล่างเหมือนภาพ spectrogram ปกติ in spacshow
-                        mel_img    = np.flipud(norm255(mel_db))   # flip แนวตั้ง
-                        mfcc_img   = np.flipud(norm255(mfcc))     # flip แนวตั้ง
-                        chroma_img = np.flipud(norm255(chroma))   # flip แนวตั้ง
-
-
-                        # ===== Resize =====
-                        # mel/mfcc จะใช้ linear ก็ได้, แต่ chroma ใช้ NEAREST เพื่อให้แท่ง 12 แถวคม
-                        mel_resized    = cv2.resize(mel_img,    target_size, interpolation=cv2.INTER_LINEAR)
-                        mfcc_resized   = cv2.resize(mfcc_img,   target_size, interpolation=cv2.INTER_LINEAR)
-                        chroma_resized = cv2.resize(chroma_img, target_size, interpolation=cv2.INTER_NEAREST)
-
-                        # ===== Empty channel (optional) =====
-                        empty_channel = np.zeros_like(mel_resized, dtype=np.uint8)
-
-                        # ===== Stack to RGB =====
-                        # ตัวอย่างนี้: เอาเฉพาะ chroma ในช่อง R ที่เหลือปิด (0)
-                        rgb_image = np.stack([mel_resized, mfcc_resized, empty_channel], axis=-1)
                         # กำหนดชื่อประเภทและที่อยู่ไฟล์ภาพ
                         name_image = f.split('.')[0]
-                        
-                        # สร้างโฟลเดอร์ถ้ายังไม่มี
                         path_image = f'{output_path}/{name_image}.png'
-                        os.makedirs(os.path.dirname(path_image), exist_ok=True)
-
-                        # plt.savefig(path_image, bbox_inches='tight', pad_inches=0)
-                        # plt.close()
-                        Image.fromarray(rgb_image).save(path_image)
+                        convert_file_mel_mfcc(file_path, path_image, n_mels=n_mels, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
                         print(f"Saved image Finish: {path_image}")
 
                     except Exception as e:
@@ -95,32 +178,11 @@ def sound_to_image(dataset_path, output_path, n_mels=256, n_fft=2048, hop_length
                     print(f"Converting file: {file_path} to Image")
                     
                     try:
-                        # โหลดไฟล์เสียง
-                        signal, sample_rate = librosa.load(file_path, sr=SAMPLE_RATE)
-
-                        # สร้าง mel spectrogram
-                        mel_spectrogram = librosa.feature.melspectrogram(y=signal, sr=sample_rate, n_fft=n_fft, hop_length=hop_length, n_mels=n_mels)
-                        
-                        # convert mel to log scale (dB)
-                        log_mel_spectrogram = librosa.power_to_db(mel_spectrogram, ref=np.max)
-
-                        # สร้างภาพของ log mel spectrogram
-                        plt.figure(figsize=(2.24, 2.24))
-                        librosa.display.specshow(log_mel_spectrogram, sr=sample_rate, hop_length=hop_length, cmap='inferno')
-                        plt.axis('off')
-                        plt.tight_layout(pad=0)
-
                         # กำหนดชื่อประเภทและที่อยู่ไฟล์ภาพ
                         name_image = f.split('.')[0]
-                        
-                        # สร้างโฟลเดอร์ถ้ายังไม่มี
                         path_image = f'{output_path}/{name_image}.png'
-                        os.makedirs(os.path.dirname(path_image), exist_ok=True)
-                        # บันทึกภาพ
-                        plt.savefig(path_image, bbox_inches='tight', pad_inches=0)
-                        plt.close()  # ปิด plot เพื่อลดการใช้หน่วยความจำ
+                        convert_file_mel(file_path, path_image, n_mels=n_mels, n_fft=n_fft, hop_length=hop_length)
                         print(f"Saved image Finish: {path_image}")
 
                     except Exception as e:
                         print(f"Could not process {file_path}: {e}")
-
@@ -1,6 +1,9 @@
 from pydub import AudioSegment
-from pydub.silence import detect_nonsilent 
 import os 
+import numpy as np
+
+from service.silence import EnergyProfile
+from utils.audio_io import load_segment
 
 # def cut_sound_per_action(input_path, output_dir, sample_rate, action_duration=400, length_duration=700):
 #     print("Cutting sound per action . . . ")
@@ -28,64 +31,125 @@ import os
 #     return True
 
 
-def cut_sound_per_action(input_path, output_dir, sample_rate=None,
-                         action_duration=500, length_duration=700,
-                         silence_thresh=-35, frame_ms=5):
+def cut_segments(sound, action_duration=500, length_duration=700,
+                 silence_thresh=-35, frame_ms=5, profile=None):
     """
-    Cut sound into segments:
-    - ใช้ detect_nonsilent() เหมือนเดิม
+    Cut an AudioSegment into fixed-length AudioSegments (one per action).
+    - ใช้ detect_nonsilent() เหมือนเดิม (vectorized, see service/silence.py)
     - แต่เลื่อนจุดเริ่ม (start) ไปที่มิลลิวินาทีแรกที่เสียงดังเกิน silence_thresh (-35 dBFS)
     - เติม silence ถ้าสั้นกว่า length_duration และตัดให้ครบ
+    Returns [] when nothing is detected.
     """
+    if profile is None:
+        profile = EnergyProfile.from_segment(sound)
 
-    print("Cutting sound per action . . .")
+    # ตรวจหา non-silent ช่วงต่าง ๆ + เลื่อน start ไปยังจุดที่ดังเกิน -35 dBFS ครั้งแรก
+    ranges = strict_ranges(profile, action_duration, silence_thresh, frame_ms)
 
-    os.makedirs(output_dir, exist_ok=True)
-    sound = AudioSegment.from_file(input_path)
+    # ===== ตัดไฟล์ตามช่วงที่ตรวจเจอ =====
+    segments = []
+    for strict_start, end in ranges:
+        segment = sound[strict_start:end]
 
-    # ตรวจหา non-silent ช่วงต่าง ๆ
-    nonsilent_ranges = detect_nonsilent(
-        sound,
+        # ถ้าสั้น เติม silence
+        if len(segment) < length_duration:
+            silence_to_add = AudioSegment.silent(duration=length_duration - len(segment))
+            segment += silence_to_add
+
+        # บังคับความยาว 1000 ms
+        segment = segment[:length_duration]
+        segments.append(segment)
+
+    return segments
+
+
+def strict_ranges(profile, action_duration=500, silence_thresh=-35, frame_ms=5):
+    """[strict_start, end] in ms of every action in the clip described by profile."""
+    nonsilent_ranges = profile.detect_nonsilent(
         min_silence_len=action_duration,
         silence_thresh=silence_thresh,
         seek_step=1
     )
+    strict_starts = profile.first_crossings(nonsilent_ranges, silence_thresh, frame_ms)
+    return [[strict_start, end] for strict_start, (_, end) in zip(strict_starts, nonsilent_ranges)]
 
-    if not nonsilent_ranges:
-        print("No sound detection in this file")
-        return False
 
-    # ===== helper หา "มิลลิวินาทีแรกที่เสียงดังเกิน thresh" =====
-    def first_crossing_ms(seg: AudioSegment, start_ms: int, end_ms: int,
-                          thresh_db: float, hop_ms: int) -> int:
-        limit = min(end_ms, max(0, len(seg) - hop_ms))
-        t = max(0, start_ms)
-        while t <= limit:
-            chunk = seg[t:t + hop_ms]
-            db = chunk.dBFS
-            if db != float('-inf') and db > thresh_db:
-                return t
-            t += 1  # เดินละเอียดทีละ 1 ms
-        return start_ms
+def cut_sound_per_action(input_path, output_dir, sample_rate=None,
+                         action_duration=500, length_duration=700,
+                         silence_thresh=-35, frame_ms=5):
+    """
+    Cut sound into segments and export them as {output_dir}/value_N.wav
+    (see cut_segments for how the segments are chosen).
+    """
 
-    # ===== ตัดไฟล์ตามช่วงที่ตรวจเจอ =====
-    for i, (start, end) in enumerate(nonsilent_ranges):
-        # เลื่อน start ไปยังจุดที่ดังเกิน -35 dBFS ครั้งแรก
-        strict_start = first_crossing_ms(sound, start, end, silence_thresh, frame_ms)
+    print("Cutting sound per action . . .")
 
-        segment = sound[strict_start:end]
+    os.makedirs(output_dir, exist_ok=True)
+    sound = load_segment(input_path)
 
-        # ถ้าสั้น เติม silence
-        if len(segment) < length_duration:
-            silence_to_add = AudioSegment.silent(duration=length_duration - len(segment))
-            segment += silence_to_add
+    segments = cut_segments(sound, action_duration, length_duration,
+                            silence_thresh, frame_ms)
 
-        # บังคับความยาว 1000 ms
-        segment = segment[:length_duration]
+    if not segments:
+        print("No sound detection in this file")
+        return False
 
+    for i, segment in enumerate(segments):
         output_file = f"{output_dir}/value_{i + 1}.wav"
         segment.export(output_file, format="wav")
         print(f"Exported: {output_file}")
 
-    print(f"Finished cutting sound per action , {len(nonsilent_ranges)} actions")
+    print(f"Finished cutting sound per action , {len(segments)} actions")
     return True
+
+
+def cut_sound_per_action_array(y, sample_rate, action_duration=500,
+                               length_duration=700, silence_thresh=-35,
+                               frame_ms=5, profile=None):
+    """
+    In-memory version of cut_sound_per_action: takes a float32 array and
+    returns a list of float32 segments (empty list when nothing is detected).
+    Pass the EnergyProfile from amplify_array to skip building it again.
+    """
+
+    print("Cutting sound per action . . .")
+
+    if profile is None:
+        profile = EnergyProfile.from_float(y, sample_rate)
+
+    ranges = strict_ranges(profile, action_duration, silence_thresh, frame_ms)
+
+    if not ranges:
+        print("No sound detection in this file")
+        return []
+
+    # Same frame rounding as AudioSegment slicing, then pad with silence / trim
+    samples = profile.samples
+    segment_frames = int(length_duration * sample_rate / 1000.0)
+    segments = []
+    for strict_start, end in ranges:
+        start_f = int(strict_start * sample_rate / 1000.0)
+        end_f = int(min(end, profile.len_ms) * sample_rate / 1000.0)
+        chunk = samples[start_f:min(end_f, start_f + segment_frames)]
+
+        segment = np.zeros(segment_frames, dtype=np.float32)
+        segment[:len(chunk)] = chunk
+        segment /= profile.max_amplitude
+        segments.append(segment)
+
+    print(f"Finished cutting sound per action , {len(segments)} actions")
+    return segments
+
+
+def salience_order(segments, frame_length=512):
+    """
+    Segment indices, most salient first: peak short-time energy (sum of
+    squares per frame_length samples), a cheap stand-in for how clearly the
+    impact was captured. Used to classify the best segment first.
+    """
+    scores = []
+    for segment in segments:
+        n = len(segment) // frame_length * frame_length
+        frames = np.asarray(segment[:n], dtype=np.float64).reshape(-1, frame_length) if n else np.zeros((1, 1))
+        scores.append(float(np.max(np.sum(frames ** 2, axis=1))))
+    return sorted(range(len(segments)), key=lambda i: -scores[i])
@@ -2,13 +2,15 @@ from pydub import AudioSegment
 from pydub.silence import split_on_silence
 import os 
 
+from utils.audio_io import load_segment
+
 def cut_sound_per_action_split_on_silence(input_path, output_dir, action_duration=400, length_duration=1000):
     print("Cutting sound per action . . . ")
 
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
     
-    sound = AudioSegment.from_file(input_path)
+    sound = load_segment(input_path)
     segments = split_on_silence(sound,
                                 min_silence_len=action_duration,
                                 silence_thresh=-40,
@@ -0,0 +1,125 @@
+"""
+Export the Keras .h5 model to TFLite (float32 / float16 / int8) or ONNX and
+check that the exported model still agrees with the original.
+
+    python -m service.export_model --model models/X.h5 --format tflite --quantize int8 \
+        --calibration ./dataset/sound --out models/X_int8.tflite
+
+--calibration points at our mel/MFCC PNGs, a feature shard dir
+(utils/feature_shards.py) or at WAV/MP3 segments (converted with
+mel_mfcc_image); int8 uses them as the representative dataset and all
+formats use them for the top-1 agreement check.
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+
+from service.inference import KerasBackend, load_backend, top1_agreement, INPUT_SHAPE
+
+
+def load_calibration_images(path, limit=200):
+    """(N, 224, 224, 3) float32 feature images from a folder of PNGs, shards or audio segments."""
+    from utils.feature_shards import FeatureShards
+    if FeatureShards.exists(path):
+        return FeatureShards(path).batch(0, limit).astype(np.float32)
+
+    from PIL import Image
+    images = []
+    for dirpath, _, filenames in os.walk(path):
+        for f in sorted(filenames):
+            file_path = os.path.join(dirpath, f)
+            if f.endswith('.png'):
+                images.append(np.asarray(Image.open(file_path).convert('RGB').resize(INPUT_SHAPE[:2])))
+            elif f.endswith(('.wav', '.mp3')):
+                from utils.audio_io import load_audio
+                from service.converting_sound_to_mel_image import mel_mfcc_image
+                y, sr = load_audio(file_path, sr=22050, cache=False)
+                images.append(mel_mfcc_image(y, sr))
+            if len(images) >= limit:
+                return np.stack(images).astype(np.float32)
+    if not images:
+        raise ValueError(f"No calibration images or audio found in {path}")
+    return np.stack(images).astype(np.float32)
+
+
+def export_tflite(model, out_path, quantize=None, calibration_images=None):
+    """quantize: None (float32), "float16" or "int8" (needs calibration_images)."""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        if calibration_images is None:
+            raise ValueError("int8 quantization needs calibration images")
+
+        def representative_dataset():
+            for img in calibration_images:
+                yield [img[np.newaxis].astype(np.float32)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif quantize is not None:
+        raise ValueError(f"Unknown quantization '{quantize}'")
+
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    return out_path
+
+
+def export_onnx(model, out_path, opset=13):
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=out_path)
+    return out_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the Keras model to TFLite / ONNX")
+    parser.add_argument("--model", required=True, help="Keras .h5 model")
+    parser.add_argument("--format", choices=("tflite", "onnx"), required=True)
+    parser.add_argument("--quantize", choices=("float16", "int8"), default=None, help="TFLite only")
+    parser.add_argument("--calibration", help="folder of mel/MFCC PNGs or audio segments")
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    parser.add_argument("--min-agreement", type=float, default=0.98,
+                        help="fail if top-1 agreement with the Keras model is lower")
+    parser.add_argument("--out", help="output path (default: next to the model)")
+    args = parser.parse_args(argv)
+
+    reference = KerasBackend(args.model)
+    images = None
+    if args.calibration:
+        images = load_calibration_images(args.calibration, args.calibration_limit)
+        print(f"Loaded {len(images)} calibration images")
+
+    out = args.out
+    if out is None:
+        suffix = f"_{args.quantize}" if args.quantize else ""
+        out = os.path.splitext(args.model)[0] + suffix + "." + args.format
+
+    if args.format == "tflite":
+        export_tflite(reference.model, out, args.quantize, images)
+    else:
+        export_onnx(reference.model, out)
+    print(f"Exported {args.format} model to: {out}")
+
+    if images is None:
+        print("No --calibration given, skipping the agreement check")
+        return 0
+
+    agreement = top1_agreement(reference, load_backend(args.format, out), images)
+    print(f"Top-1 agreement with Keras model: {agreement * 100:.2f}% ({len(images)} images)")
+    if agreement < args.min_agreement:
+        print(f"Agreement below {args.min_agreement * 100:.1f}%, do not deploy this export")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
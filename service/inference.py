@@ -0,0 +1,198 @@
+"""
+Inference backends for the prediction path. Every backend has
+predict(batch) -> (N, n_classes) probabilities for an (N, 224, 224, 3)
+float32 batch, so process_and_predict does not care which runtime is used.
+
+- "keras":  the original .h5 through tensorflow.keras (model.predict)
+- "compiled": the .h5 as fixed-shape tf.function graphs traced once at
+            startup, batches padded up to BATCH_BUCKETS (no retracing)
+- "tflite": a .tflite export (float32 / float16 / int8), tflite_runtime or
+            ai_edge_litert if installed (fast import), else tf.lite
+- "onnx":   an .onnx export through onnxruntime (CPU)
+- "cached": the .h5, but a float32 .tflite copy is cached next to it on the
+            first start and loaded instead on every later (cold) start
+- "remote": an inference server shared by several bins (model_path is its
+            URL, see service/inference_server.py)
+Export with: python -m service.export_model --help
+"""
+
+import os
+import numpy as np
+
+BACKENDS = ("keras", "compiled", "tflite", "onnx", "cached", "remote")
+
+# Batch sizes the compiled backend traces; a drop rarely has more than 4 segments
+BATCH_BUCKETS = (1, 2, 4, 8)
+INPUT_SHAPE = (224, 224, 3)
+
+
+class KerasBackend:
+    def __init__(self, model_path=None, model=None):
+        if model is None:
+            from tensorflow.keras.models import load_model
+            model = load_model(model_path)
+        self.model = model
+
+    def predict(self, batch):
+        return self.model.predict(batch, batch_size=len(batch), verbose=0)
+
+
+class CompiledKerasBackend:
+    """
+    model.predict builds a data adapter and dispatch machinery on every call,
+    which is wasted work for 1-5 images. This traces one concrete function per
+    batch bucket at startup and reuses it for every drop: a batch is padded
+    with zeros up to the next bucket so the input signature never changes.
+    """
+
+    def __init__(self, model_path=None, model=None, buckets=BATCH_BUCKETS):
+        import tensorflow as tf
+        if model is None:
+            model = tf.keras.models.load_model(model_path)
+        self.model = model
+        self.buckets = tuple(sorted(buckets))
+
+        shape = tuple(model.input_shape[1:]) if model.input_shape else INPUT_SHAPE
+
+        forward = tf.function(lambda x: model(x, training=False))
+        self._functions = {
+            n: forward.get_concrete_function(tf.TensorSpec((n,) + shape, tf.float32))
+            for n in self.buckets
+        }
+        self._padded = {n: np.zeros((n,) + shape, dtype=np.float32) for n in self.buckets}
+
+    def _bucket(self, n):
+        for size in self.buckets:
+            if n <= size:
+                return size
+        return self.buckets[-1]
+
+    def predict(self, batch):
+        outputs = []
+        for i in range(0, len(batch), self.buckets[-1]):
+            chunk = batch[i:i + self.buckets[-1]]
+            n = len(chunk)
+            size = self._bucket(n)
+            padded = self._padded[size]
+            padded[:n] = chunk
+            padded[n:] = 0
+            outputs.append(self._functions[size](padded).numpy()[:n])
+        return np.concatenate(outputs)
+
+
+class TFLiteBackend:
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from ai_edge_litert.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = [batch_size] + list(self._input["shape"][1:])
+            self.interpreter.resize_tensor_input(self._input["index"], shape)
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch):
+        self._resize(len(batch))
+
+        # int8 models with quantized I/O: quantize input / dequantize output
+        scale, zero_point = self._input["quantization"]
+        if scale:
+            batch = np.round(batch / scale + zero_point)
+        self.interpreter.set_tensor(self._input["index"], batch.astype(self._input["dtype"]))
+        self.interpreter.invoke()
+        pred = self.interpreter.get_tensor(self._output["index"])
+
+        scale, zero_point = self._output["quantization"]
+        if scale:
+            pred = (pred.astype(np.float32) - zero_point) * scale
+        return pred
+
+
+class OnnxBackend:
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self._input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+def load_backend(kind, model_path, num_threads=None):
+    """Create the inference backend selected in config (one of BACKENDS)."""
+    if kind == "keras":
+        return KerasBackend(model_path)
+    if kind == "compiled":
+        return CompiledKerasBackend(model_path)
+    if kind == "tflite":
+        return TFLiteBackend(model_path, num_threads=num_threads)
+    if kind == "onnx":
+        return OnnxBackend(model_path, num_threads=num_threads)
+    if kind == "cached":
+        return load_cached_backend(model_path, num_threads=num_threads)
+    if kind == "remote":
+        from service.inference_server import RemoteBackend
+        return RemoteBackend(model_path)
+    raise ValueError(f"Unknown inference backend '{kind}', expected one of {BACKENDS}")
+
+
+def load_cached_backend(model_path, cache_path=None, num_threads=None):
+    """
+    Loading the Keras .h5 rebuilds the whole graph and takes seconds on a Pi.
+    Keep a float32 TFLite copy (same predictions) next to it and load that
+    instead, re-exporting whenever the .h5 is newer than the cache.
+    """
+    if cache_path is None:
+        cache_path = os.path.splitext(model_path)[0] + "_cache.tflite"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(model_path):
+        return TFLiteBackend(cache_path, num_threads=num_threads)
+
+    backend = KerasBackend(model_path)
+    try:
+        from service.export_model import export_tflite
+        tmp_path = cache_path + ".tmp"
+        export_tflite(backend.model, tmp_path)
+        os.replace(tmp_path, cache_path)
+        print(f"Cached TFLite model for fast start: {cache_path}")
+    except Exception as e:
+        print(f"Could not cache TFLite model ({e}), using Keras")
+    return backend
+
+
+def classify_batch(backend, batch):
+    """
+    Classify every segment of one drop with a single predict call.
+    batch is an (N, 224, 224, 3) float32 array; returns [(class_idx, confidence)]
+    in the same order as the batch.
+    """
+    if len(batch) == 0:
+        return []
+    pred = backend.predict(batch)
+    class_indices = pred.argmax(axis=1)
+    confidences = pred.max(axis=1)
+    return [(int(idx), float(conf)) for idx, conf in zip(class_indices, confidences)]
+
+
+def top1_agreement(reference, candidate, images, batch_size=16):
+    """Fraction of images where both backends pick the same class."""
+    agree = 0
+    for i in range(0, len(images), batch_size):
+        batch = images[i:i + batch_size]
+        agree += int(np.sum(reference.predict(batch).argmax(axis=1) == candidate.predict(batch).argmax(axis=1)))
+    return agree / max(len(images), 1)
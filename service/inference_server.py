@@ -0,0 +1,285 @@
+"""
+Inference server: one process loads the model and serves several bins.
+
+    python -m service.inference_server --backend cached --model models/X.h5 --host 0.0.0.0
+
+- POST /predict         body: .npy of (N, 224, 224, 3) feature images (uint8 or
+                        float32) -> .npy of (N, n_classes) float32 probabilities
+- POST /classify_audio  body: .npy of a float32 recording, header X-Sample-Rate
+                        -> amplify, cut and features on the server, same reply
+                        (0 rows when nothing was detected)
+- GET  /health          JSON with the backend and batching counters
+
+Concurrent requests are coalesced by MicroBatcher: the first request opens a
+batch, later ones join it until max_batch images or max_wait_ms have passed,
+then one backend.predict call serves all of them. Requests that are not
+(N, 224, 224, 3) numbers get a 400 before they are queued; if a batch
+still fails, each request in it is retried on its own.
+
+On a bin, set INFERENCE_BACKEND = "remote" in app.py; RemoteBackend has the
+same predict(batch) as the in-process backends.
+"""
+
+import argparse
+import http.client
+import io
+import json
+import queue
+import threading
+import time
+import numpy as np
+from urllib.parse import urlparse
+
+from service.inference import BACKENDS, INPUT_SHAPE, load_backend
+
+DEFAULT_PORT = 8765
+MAX_BATCH = 8
+MAX_WAIT_MS = 5.0
+
+_STOP = object()
+
+
+def to_npy(array):
+    buf = io.BytesIO()
+    np.save(buf, array, allow_pickle=False)
+    return buf.getvalue()
+
+
+def from_npy(data):
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+def check_images(images, input_shape=INPUT_SHAPE):
+    """ValueError unless images is a numeric (N, *input_shape) array."""
+    if images.dtype.kind not in "uif":
+        raise ValueError(f"images must be uint8/float, got {images.dtype}")
+    if images.ndim != len(input_shape) + 1 or images.shape[1:] != tuple(input_shape):
+        raise ValueError(f"images must be (N, {', '.join(map(str, input_shape))}), got {images.shape}")
+
+
+class _Request:
+    __slots__ = ("images", "done", "result", "error")
+
+    def __init__(self, images):
+        self.images = images
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    def __init__(self, backend, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, input_shape=INPUT_SHAPE):
+        self.backend = backend
+        self.input_shape = tuple(input_shape)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        self.images = 0
+        self._thread = threading.Thread(target=self._run, name="MicroBatcher", daemon=True)
+        self._thread.start()
+
+    def predict(self, images, timeout=None):
+        """Blocking; (N, n_classes) probabilities for this request's images."""
+        images = np.asarray(images)
+        # Checked before queueing: a bad request must not fail the others in its batch
+        check_images(images, self.input_shape)
+        request = _Request(images.astype(np.float32, copy=False))
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("Inference request timed out")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self, first):
+        batch, n = [first], len(first.images)
+        deadline = time.monotonic() + self.max_wait
+        while n < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(request)
+            n += len(request.images)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            sizes = [len(r.images) for r in batch]
+            try:
+                pred = self.backend.predict(np.concatenate([r.images for r in batch]))
+                for request, part in zip(batch, np.split(pred, np.cumsum(sizes)[:-1])):
+                    request.result = part
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0].error = e
+                else:
+                    # One request may be at fault: retry each on its own
+                    for request in batch:
+                        try:
+                            request.result = self.backend.predict(request.images)
+                        except Exception as e:
+                            request.error = e
+            self.batches += 1
+            self.requests += len(batch)
+            self.images += sum(sizes)
+            for request in batch:
+                request.done.set()
+
+    def stop(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+
+def audio_to_images(audio, sample_rate):
+    """Server side of /classify_audio: the app's in-memory feature path."""
+    from service.amplify import normalize_peak
+    from service.cut_sound import cut_sound_per_action_array
+    from service.converting_sound_to_mel_image import mel_mfcc_image
+    from utils.preprocess_the_image import stack_images
+
+    normalized = normalize_peak(np.array(audio, dtype=np.float32), sample_rate)
+    if normalized.audio is None:
+        return np.zeros((0, 224, 224, 3), dtype=np.float32)
+    segments = cut_sound_per_action_array(normalized.audio, sample_rate, profile=normalized.profile)
+    return stack_images([mel_mfcc_image(segment, sample_rate,
+                                        n_mels=128, n_mfcc=20, n_fft=2048, hop_length=512)
+                         for segment in segments])
+
+
+def make_server(batcher, host="127.0.0.1", port=DEFAULT_PORT, info=None):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"    # keep-alive for the bins' persistent connections
+        disable_nagle_algorithm = True   # headers and body go out as two writes
+
+        def _reply(self, code, body, content_type):
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._reply(404, b"not found", "text/plain")
+                return
+            stats = {**(info or {}), "batches": batcher.batches, "requests": batcher.requests,
+                     "images": batcher.images,
+                     "mean_batch": batcher.images / batcher.batches if batcher.batches else 0.0}
+            self._reply(200, json.dumps(stats).encode(), "application/json")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path not in ("/predict", "/classify_audio"):
+                self._reply(404, b"not found", "text/plain")
+                return
+            try:
+                data = from_npy(body)
+                if self.path == "/predict":
+                    check_images(data, batcher.input_shape)
+            except (ValueError, EOFError, OSError) as e:   # empty, truncated or not .npy
+                self._reply(400, f"{type(e).__name__}: {e}".encode(), "text/plain")
+                return
+            try:
+                if self.path == "/predict":
+                    images = data
+                else:
+                    images = audio_to_images(data, int(self.headers.get("X-Sample-Rate", 22050)))
+                pred = batcher.predict(images) if len(images) else np.zeros((0, 0), dtype=np.float32)
+                self._reply(200, to_npy(pred.astype(np.float32)), "application/octet-stream")
+            except Exception as e:
+                self._reply(500, f"{type(e).__name__}: {e}".encode(), "text/plain")
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+class RemoteBackend:
+    """
+    Client for the inference server, usable wherever a backend is: predict(batch).
+    Feature images are sent as uint8 (they are 0-255 integers, 4x less data);
+    pass wire_dtype=np.float32 for other inputs.
+    """
+
+    def __init__(self, url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=10.0, wire_dtype=np.uint8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or DEFAULT_PORT
+        self.timeout = timeout
+        self.wire_dtype = wire_dtype
+        self._local = threading.local()
+
+    def _post(self, path, body, headers=None):
+        for attempt in (0, 1):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request("POST", path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+            except (ConnectionError, http.client.HTTPException):
+                # server restarted / idle connection closed: reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+                continue
+            if response.status != 200:
+                raise RuntimeError(f"Inference server error {response.status}: {data.decode(errors='replace')}")
+            return from_npy(data)
+
+    def predict(self, batch):
+        return self._post("/predict", to_npy(np.asarray(batch).astype(self.wire_dtype, copy=False)))
+
+    def classify_audio(self, audio, sample_rate):
+        """Probabilities for every segment the server cuts from a raw recording."""
+        return self._post("/classify_audio", to_npy(np.asarray(audio, dtype=np.float32)),
+                          {"X-Sample-Rate": str(sample_rate)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the sorting model to several bins")
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "remote"], default="cached")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to serve other bins on the network")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--num-threads", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from service.warmup import warm_up
+    backend = load_backend(args.backend, args.model, num_threads=args.num_threads)
+    warm_up(backend, batch_sizes=range(1, args.max_batch + 1))
+    batcher = MicroBatcher(backend, args.max_batch, args.max_wait_ms)
+    server = make_server(batcher, args.host, args.port, info={"backend": args.backend, "model": args.model})
+    print(f"Inference server on http://{args.host}:{args.port} "
+          f"(max batch {args.max_batch}, max wait {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Exiting program")
+    finally:
+        server.server_close()
+        batcher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Three-stage drop pipeline: detection+capture -> feature extraction+inference
+-> actuation, each in its own thread and connected by bounded queues, so the
+next drop can be captured while the previous one is classified or sorted.
+
+Ordering: every item gets a sequence number at capture and the actuation
+stage handles items strictly in that order, so the item classified is the
+item that gets sorted. Items dropped by the back-pressure policy
+("drop_newest"/"drop_oldest") skip inference but are still sorted: they
+reach actuation with best_idx=fallback_idx, the bin set aside for them.
+"""
+
+import queue
+import threading
+import time
+
+from utils.metrics import metrics
+
+DROP_POLICIES = ("block", "drop_newest", "drop_oldest")
+# capture_fn errors that lose one item only (e.g. a trigger older than the
+# audio buffer); anything else (the audio source died) stops the pipeline
+CAPTURE_SKIP_ERRORS = (ValueError, TimeoutError)
+
+_STOP = object()
+
+
+class DropItem:
+    __slots__ = ("seq", "audio", "best_idx", "dropped", "times")
+
+    def __init__(self, seq, audio, trigger_time):
+        self.seq = seq
+        self.audio = audio
+        self.best_idx = None
+        self.dropped = False
+        # time.monotonic() per stage boundary
+        self.times = {"trigger": trigger_time, "captured": time.monotonic()}
+
+    def latency_report(self):
+        t = self.times
+        parts = [f"{name} +{(t[name] - t['trigger']) * 1000:.0f} ms"
+                 for name in ("captured", "classified", "actuated") if name in t]
+        return f"Item {self.seq}: " + ", ".join(parts)
+
+
+class DropPipeline:
+    def __init__(self, capture_fn, classify_fn, actuate_fn, queue_size=2, drop_policy="block",
+                 fallback_idx=None):
+        """
+        capture_fn()      -> (audio, trigger_time) for the next drop; blocks until one happens
+        classify_fn(audio) -> class index or None
+        actuate_fn(best_idx) sorts the item (best_idx is None when unclassified)
+        fallback_idx: bin for items skipped by "drop_newest"/"drop_oldest" (required for those)
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {DROP_POLICIES}")
+        if drop_policy != "block" and fallback_idx is None:
+            raise ValueError(f"drop_policy {drop_policy!r} needs fallback_idx, the bin skipped items go to")
+
+        self.capture_fn = capture_fn
+        self.classify_fn = classify_fn
+        self.actuate_fn = actuate_fn
+        self.drop_policy = drop_policy
+        self.fallback_idx = fallback_idx
+
+        self._classify_q = queue.Queue(maxsize=queue_size)
+        # Unbounded so skipped items never block capture; classified items
+        # are bounded by the slots (back-pressure on the classify stage only)
+        self._actuate_q = queue.Queue()
+        self._actuate_slots = threading.BoundedSemaphore(queue_size)
+        self._running = False
+        self._threads = []
+        self.error = None       # exception that stopped the capture stage
+        self.classifying = None # seq of the item in classify_fn / actuate_fn right now
+        self.actuating = None
+
+        self.captured = 0
+        self.dropped = 0
+        self.completed = 0
+
+    # ====== stages ======
+    def _capture_stage(self):
+        seq = 0
+        try:
+            while self._running:
+                try:
+                    result = self.capture_fn()
+                except CAPTURE_SKIP_ERRORS as e:
+                    print(f"Capture failed, item skipped: {e}")
+                    metrics.inc("items_capture_failed")
+                    continue
+                if result is None or not self._running:
+                    continue
+                audio, trigger_time = result
+                seq += 1
+                self.captured += 1
+                metrics.inc("items_captured")
+                self._enqueue(DropItem(seq, audio, trigger_time))
+        except Exception as e:
+            # Nothing new can come in: let the other stages finish the items
+            # already captured, then join() raises this
+            print(f"Capture failed, stopping the pipeline: {e}")
+            self.error = e
+            self._running = False
+            self._classify_q.put(_STOP)
+
+    def _classify_stage(self):
+        while True:
+            item = self._classify_q.get()
+            if item is _STOP:
+                self._actuate_q.put(_STOP)
+                return
+            self.classifying = item.seq
+            try:
+                item.best_idx = self.classify_fn(item.audio)
+            except Exception as e:
+                print(f"Item {item.seq}: classification failed: {e}")
+                item.best_idx = None
+            item.audio = None
+            item.times["classified"] = time.monotonic()
+            self._actuate_slots.acquire()
+            self._actuate_q.put(item)
+
+    def _actuate_stage(self):
+        next_seq = 1
+        pending = {}
+        while True:
+            item = self._actuate_q.get()
+            if item is _STOP:
+                return
+            if not item.dropped:
+                self._actuate_slots.release()
+            pending[item.seq] = item
+            # Reorder: dropped items may overtake the one being classified
+            while next_seq in pending:
+                item = pending.pop(next_seq)
+                next_seq += 1
+                self.actuating = item.seq
+                try:
+                    self.actuate_fn(item.best_idx)
+                except Exception as e:
+                    print(f"Item {item.seq}: actuation failed: {e}")
+                item.times["actuated"] = time.monotonic()
+                self.completed += 1
+                metrics.item_done(item.times["actuated"])
+                metrics.observe("item_latency_seconds", item.times["actuated"] - item.times["trigger"])
+                print(item.latency_report())
+
+    # ====== back-pressure ======
+    def _enqueue(self, item):
+        if self.drop_policy == "block":
+            self._classify_q.put(item)
+            return
+        try:
+            self._classify_q.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+
+        if self.drop_policy == "drop_oldest":
+            try:
+                victim = self._classify_q.get_nowait()
+            except queue.Empty:
+                victim = None
+            if victim is _STOP:
+                # stop() was called: keep the stop marker last, skip the new item
+                self._classify_q.put_nowait(_STOP)
+                victim = item
+            else:
+                self._classify_q.put(item)
+        else:
+            victim = item
+
+        if victim is not None:
+            self._skip(victim)
+
+    def _skip(self, item):
+        self.dropped += 1
+        metrics.inc("items_skipped_backpressure")
+        item.dropped = True
+        item.best_idx = self.fallback_idx
+        item.audio = None
+        item.times["classified"] = time.monotonic()
+        print(f"Item {item.seq}: pipeline full, skipped inference ({self.drop_policy}), "
+              f"sorting to bin {self.fallback_idx}")
+        self._actuate_q.put(item)   # never blocks: capture goes on
+
+    # ====== public APIs ======
+    def start(self):
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._capture_stage, name="capture", daemon=True),
+            threading.Thread(target=self._classify_stage, name="classify", daemon=True),
+            threading.Thread(target=self._actuate_stage, name="actuate", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop capturing new drops; items already captured are still sorted."""
+        self._running = False
+        self._classify_q.put(_STOP)
+        for t in self._threads[1:]:
+            t.join(timeout)
+
+    def actuation_idle(self):
+        """True when every item captured before the one being classified has been sorted."""
+        return self.classifying is not None and self.completed >= self.classifying - 1
+
+    def join(self):
+        """Wait for the pipeline; re-raises the exception that stopped capturing, if any."""
+        for t in self._threads:
+            t.join()
+        if self.error is not None:
+            raise self.error
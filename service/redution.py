@@ -1,14 +1,18 @@
-import librosa
-import noisereduce as nr
+import threading
+import numpy as np
 import soundfile as sf
 
+from utils.audio_io import load_audio
+
 def reduce_audio_noise(
     input_path: str,
     sample_rate: int = 22050,
     prop_decrease: float = 0.3
 ):
  
-    audio_data, sr = librosa.load(input_path, sr=sample_rate)
+    import noisereduce as nr
+
+    audio_data, sr = load_audio(input_path, sr=sample_rate)
 
     noise_sample = audio_data[:sr]
 
@@ -25,3 +29,96 @@ def reduce_audio_noise(
     print(f" ===> Finished noise reduction <===")
 
     return output_path
+
+
+class SpectralGate:
+    """
+    Streaming noise suppression for triggered clips.
+    - update(idle_audio): exponentially-updated noise spectrum (per-bin mean
+      and spread of the dB power) learned from audio between drops, e.g.
+      AudioCapture.latest(0.5) while nothing is falling.
+    - gate_power(S): spectral gating of a power spectrogram in one vectorized
+      pass: bins below mean + n_std * std of the noise are attenuated by
+      prop_decrease (mask smoothed over time/frequency like noisereduce).
+    - segments_power(segments): batch STFT + gating of equal-length segments;
+      hand the result to mel_mfcc_image(S=...) so the features reuse it.
+    - reduce(y): time-domain array in, denoised array out (no temp file).
+    gain: amplitude factor applied to the clip after capture (amplify), so
+    the noise profile is compared at the same level.
+    """
+
+    def __init__(self, sample_rate=22050, n_fft=2048, hop_length=512, alpha=0.2,
+                 n_std=1.5, prop_decrease=0.8, smooth=(3, 5), max_idle_rise_db=10.0):
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.alpha = alpha
+        self.n_std = n_std
+        self.prop_decrease = prop_decrease
+        self.smooth = smooth          # (frequency bins, frames)
+        self.max_idle_rise_db = max_idle_rise_db
+        self.noise_db = None          # (n_fft // 2 + 1,) mean dB per bin
+        self.noise_std_db = None
+        self.updates = 0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.noise_db is not None
+
+    def _power(self, y):
+        import librosa
+        return np.abs(librosa.stft(np.asarray(y, dtype=np.float32), n_fft=self.n_fft,
+                                   hop_length=self.hop_length)) ** 2
+
+    @staticmethod
+    def _db(S):
+        return 10.0 * np.log10(np.maximum(S, 1e-10))
+
+    def update(self, idle_audio):
+        """Fold idle audio into the noise profile; False when it was skipped as too loud."""
+        S_db = self._db(self._power(idle_audio))
+        mean, var = S_db.mean(axis=-1), S_db.var(axis=-1)
+        with self._lock:
+            if self.noise_db is None:
+                self.noise_db, self.noise_std_db = mean, np.sqrt(var)
+            else:
+                # A passing sound is not noise: skip blocks far above the profile
+                if np.median(mean - self.noise_db) > self.max_idle_rise_db:
+                    return False
+                a = self.alpha
+                self.noise_db = (1 - a) * self.noise_db + a * mean
+                self.noise_std_db = np.sqrt((1 - a) * self.noise_std_db ** 2 + a * var)
+            self.updates += 1
+        return True
+
+    def mask(self, S, gain=1.0):
+        """Amplitude mask (same shape as S, any leading batch axes) in [1 - prop_decrease, 1]."""
+        from scipy.ndimage import uniform_filter
+        with self._lock:
+            threshold = self.noise_db + self.n_std * self.noise_std_db + 20.0 * np.log10(gain)
+        signal = (self._db(S) > threshold[:, np.newaxis]).astype(np.float32)
+        size = (1,) * (S.ndim - 2) + tuple(self.smooth)
+        signal = uniform_filter(signal, size=size, mode="nearest")
+        return signal * self.prop_decrease + (1.0 - self.prop_decrease)
+
+    def gate_power(self, S, gain=1.0):
+        if not self.ready:
+            return S
+        return S * self.mask(S, gain) ** 2
+
+    def segments_power(self, segments, gain=1.0):
+        """Gated power spectrograms of equal-length segments, one batch STFT for all."""
+        if len(segments) == 0:
+            return []
+        return list(self.gate_power(self._power(np.stack(segments)), gain))
+
+    def reduce(self, y, gain=1.0):
+        """Denoised copy of y (float32) through STFT -> gate -> ISTFT."""
+        import librosa
+        y = np.asarray(y, dtype=np.float32)
+        if not self.ready:
+            return y.copy()
+        D = librosa.stft(y, n_fft=self.n_fft, hop_length=self.hop_length)
+        D *= self.mask(np.abs(D) ** 2, gain)
+        return librosa.istft(D, hop_length=self.hop_length, length=len(y)).astype(np.float32)
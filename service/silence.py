@@ -0,0 +1,142 @@
+import numpy as np
+
+# Same scaling as utils/convert_to_byte.convert_to_2bytes
+INT16_SCALE = 32767
+
+
+class EnergyProfile:
+    """
+    Cumulative sum of squares of one clip, so the RMS of any millisecond
+    window is two lookups instead of a pydub slice.
+    Windows follow AudioSegment slicing (ms -> frame with int()) and the RMS
+    is truncated to an integer like audioop.rms, so detect_nonsilent and
+    first_crossings give the same ranges as pydub on the same 16-bit audio.
+    Build it once per clip and share it between amplify and cut stages.
+    """
+
+    def __init__(self, samples, sample_rate, channels=1, max_amplitude=32768.0, squares=None):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.max_amplitude = max_amplitude
+
+        if squares is None:
+            squares = np.asarray(samples, dtype=np.float64) ** 2
+        energy = squares if channels == 1 else squares.reshape(-1, channels).sum(axis=1)
+        self.n_frames = len(energy)
+        self.csum = np.empty(self.n_frames + 1)
+        self.csum[0] = 0.0
+        np.cumsum(energy, out=self.csum[1:])
+        # len(AudioSegment) in ms
+        self.len_ms = round(1000 * (self.n_frames / sample_rate))
+
+    @classmethod
+    def from_float(cls, y, sample_rate):
+        # Quantize to 16-bit exactly like convert_to_2bytes
+        samples = (np.asarray(y) * INT16_SCALE).astype(np.int16)
+        return cls(samples, sample_rate)
+
+    @classmethod
+    def from_segment(cls, sound):
+        samples = np.array(sound.get_array_of_samples())
+        return cls(samples, sound.frame_rate, sound.channels, sound.max_possible_amplitude)
+
+    def window_rms(self, starts_ms, win_ms):
+        """RMS of sound[t:t + win_ms] for every t in starts_ms."""
+        starts_ms = np.asarray(starts_ms, dtype=np.int64)
+        start_f = (starts_ms * self.sample_rate / 1000.0).astype(np.int64)
+        end_f = (np.minimum(starts_ms + win_ms, self.len_ms) * self.sample_rate / 1000.0).astype(np.int64)
+        sum_squares = (self.csum[np.minimum(end_f, self.n_frames)]
+                       - self.csum[np.minimum(start_f, self.n_frames)])
+        n = (end_f - start_f) * self.channels
+        rms = np.sqrt(sum_squares / np.maximum(n, 1))
+        if np.issubdtype(np.asarray(self.samples).dtype, np.integer):
+            rms = np.floor(rms)
+        return np.where(n > 0, rms, 0.0)
+
+    def detect_silence(self, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+        """Vectorized pydub.silence.detect_silence."""
+        seg_len = self.len_ms
+        if seg_len < min_silence_len:
+            return []
+
+        thresh = (10 ** (silence_thresh / 20)) * self.max_amplitude
+
+        last_slice_start = seg_len - min_silence_len
+        slice_starts = np.arange(0, last_slice_start + 1, seek_step)
+        if last_slice_start % seek_step:
+            slice_starts = np.append(slice_starts, last_slice_start)
+
+        silence_starts = slice_starts[self.window_rms(slice_starts, min_silence_len) <= thresh]
+        if len(silence_starts) == 0:
+            return []
+
+        # Merge overlapping / touching silent windows into ranges
+        diffs = np.diff(silence_starts)
+        breaks = np.flatnonzero((diffs != seek_step) & (diffs > min_silence_len))
+        range_starts = np.concatenate(([silence_starts[0]], silence_starts[breaks + 1]))
+        range_ends = np.concatenate((silence_starts[breaks], [silence_starts[-1]])) + min_silence_len
+
+        return [[int(s), int(e)] for s, e in zip(range_starts, range_ends)]
+
+    def detect_nonsilent(self, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+        """Vectorized pydub.silence.detect_nonsilent (same [start, end] ms ranges)."""
+        silent_ranges = self.detect_silence(min_silence_len, silence_thresh, seek_step)
+        len_seg = self.len_ms
+
+        if not silent_ranges:
+            return [[0, len_seg]]
+
+        if silent_ranges[0][0] == 0 and silent_ranges[0][1] == len_seg:
+            return []
+
+        prev_end_i = 0
+        nonsilent_ranges = []
+        for start_i, end_i in silent_ranges:
+            nonsilent_ranges.append([prev_end_i, start_i])
+            prev_end_i = end_i
+
+        if end_i != len_seg:
+            nonsilent_ranges.append([prev_end_i, len_seg])
+
+        if nonsilent_ranges[0] == [0, 0]:
+            nonsilent_ranges.pop(0)
+
+        return nonsilent_ranges
+
+    def first_crossings(self, ranges, thresh_db, hop_ms):
+        """
+        หา "มิลลิวินาทีแรกที่เสียงดังเกิน thresh" ของทุกช่วงใน ranges
+        Same result as checking sound[t:t + hop_ms].dBFS > thresh_db for
+        t = start, start + 1, ... in one pass over the clip.
+        Ranges with no crossing keep their original start.
+        """
+        if not ranges:
+            return []
+
+        last_t = max(0, self.len_ms - hop_ms)
+        t = np.arange(last_t + 1)
+        rms = self.window_rms(t, hop_ms)
+        with np.errstate(divide='ignore'):
+            db = 20 * np.log10(rms / self.max_amplitude)
+        above = db > thresh_db
+
+        # next_crossing[t] = first crossing at or after t (last_t + 1 if none)
+        next_crossing = np.where(above, t, last_t + 1)
+        next_crossing = np.minimum.accumulate(next_crossing[::-1])[::-1]
+
+        strict_starts = []
+        for start_ms, end_ms in ranges:
+            limit = min(end_ms, last_t)
+            t0 = max(0, start_ms)
+            if t0 <= limit and next_crossing[t0] <= limit:
+                strict_starts.append(int(next_crossing[t0]))
+            else:
+                strict_starts.append(start_ms)
+        return strict_starts
+
+
+def detect_nonsilent(y, sample_rate, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+    """detect_nonsilent for a float32 array (same ranges as pydub on convert_to_2bytes(y))."""
+    profile = EnergyProfile.from_float(y, sample_rate)
+    return profile.detect_nonsilent(min_silence_len, silence_thresh, seek_step)
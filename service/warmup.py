@@ -0,0 +1,26 @@
+import numpy as np
+
+from service.amplify import amplify_array
+from service.cut_sound import cut_sound_per_action_array
+from service.converting_sound_to_mel_image import mel_mfcc_image
+from service.inference import classify_batch
+from utils.preprocess_the_image import stack_images
+from utils.synthetic_audio import impact_sound
+
+
+def warm_up(model, sample_rate=22050, duration=1.5, batch_sizes=(1, 2, 3)):
+    """
+    Run a synthetic drop through every stage (amplify, cut, features,
+    inference) so librosa's numba JIT and the model's first-call setup
+    happen before the first real item instead of during it.
+    """
+    print("Warming up the pipeline with a synthetic drop . . .")
+    audio = impact_sound(sample_rate, duration, impact_times=(0.3, 0.9))
+    amplified, profile = amplify_array(audio, sample_rate)
+    segments = cut_sound_per_action_array(amplified, sample_rate, profile=profile)
+    images = [mel_mfcc_image(segment, sample_rate) for segment in segments]
+
+    batch = stack_images(images)
+    for n in batch_sizes:
+        classify_batch(model, np.repeat(batch[:1], n, axis=0))
+    print("Warm-up finished")
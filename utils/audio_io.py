@@ -0,0 +1,125 @@
+"""
+Audio I/O shared by every stage, instead of a librosa.load per stage.
+
+- load_audio(path, sr): decode once with soundfile (WAV, FLAC, OGG and MP3
+  through libsndfile >= 1.1, no ffmpeg subprocess), mix to mono and resample
+  only when the file is not already at `sr`. Same float32 samples as
+  librosa.load(path, sr=sr).
+- Resampling goes through one cached soxr.ResampleStream per
+  (in_rate, out_rate, channels), reset between clips.
+- Recently loaded clips are kept (read-only) so two stages reading the same
+  file share one buffer; pass cache=False for bulk conversion.
+- load_segment(path): pydub AudioSegment for the pydub-based cutters; WAV
+  goes through pydub's own reader, other formats are decoded here.
+"""
+
+import collections
+import os
+import threading
+import numpy as np
+import soundfile as sf
+
+SAMPLE_RATE = 22050
+CACHE_SIZE = 8
+RESAMPLE_QUALITY = "HQ"    # librosa's default res_type is soxr_hq
+
+_resamplers = {}
+_resamplers_lock = threading.Lock()
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class _Resampler:
+    def __init__(self, in_rate, out_rate, channels):
+        import soxr
+        self.stream = soxr.ResampleStream(in_rate, out_rate, channels, dtype="float32",
+                                          quality=RESAMPLE_QUALITY)
+        self.lock = threading.Lock()
+
+    def __call__(self, y):
+        with self.lock:
+            self.stream.clear()
+            return self.stream.resample_chunk(y, last=True)
+
+
+def resample(y, orig_sr, target_sr):
+    """float32 (n,) or (n, channels) from orig_sr to target_sr; no-op when equal."""
+    if orig_sr == target_sr:
+        return y
+    channels = 1 if y.ndim == 1 else y.shape[1]
+    key = (orig_sr, target_sr, channels)
+    with _resamplers_lock:
+        resampler = _resamplers.get(key)
+        if resampler is None:
+            resampler = _resamplers[key] = _Resampler(orig_sr, target_sr, channels)
+    y_hat = resampler(np.ascontiguousarray(y, dtype=np.float32))
+    # librosa.resample fixes the length to ceil(n * ratio); the soxr stream can be one short
+    n = int(np.ceil(len(y) * target_sr / orig_sr))
+    if len(y_hat) > n:
+        y_hat = y_hat[:n]
+    elif len(y_hat) < n:
+        pad = [(0, n - len(y_hat))] + [(0, 0)] * (y_hat.ndim - 1)
+        y_hat = np.pad(y_hat, pad)
+    return y_hat
+
+
+def _decode(path, sr, mono):
+    try:
+        y, native_sr = sf.read(path, dtype="float32", always_2d=True)
+    except sf.LibsndfileError:
+        # formats libsndfile cannot read (e.g. m4a): librosa's audioread fallback
+        import librosa
+        y, native_sr = librosa.load(path, sr=None, mono=False)
+        y = np.atleast_2d(y).T.astype(np.float32)
+
+    if y.shape[1] == 1:
+        y = y[:, 0]
+    elif mono:
+        y = y.mean(axis=1, dtype=np.float32)
+    if sr is not None and sr != native_sr:
+        y = resample(y, native_sr, sr)
+        native_sr = sr
+    if y.ndim == 2:
+        y = y.T    # librosa layout: (channels, n)
+    return np.ascontiguousarray(y, dtype=np.float32), native_sr
+
+
+def load_audio(path, sr=SAMPLE_RATE, mono=True, cache=True):
+    """
+    Drop-in for librosa.load(path, sr=sr, mono=mono) -> (float32 y, sr).
+    sr=None keeps the file's rate. Cached arrays are read-only; copy before
+    modifying in place.
+    """
+    if not cache:
+        return _decode(path, sr, mono)
+
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, sr, mono)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    y, file_sr = _decode(path, sr, mono)
+    y.setflags(write=False)
+    with _cache_lock:
+        _cache[key] = (y, file_sr)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return y, file_sr
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def load_segment(path):
+    """pydub AudioSegment of a file without an ffmpeg subprocess for MP3."""
+    from pydub import AudioSegment
+
+    if path.lower().endswith(".wav"):
+        return AudioSegment.from_file(path)    # pydub reads WAV itself
+    samples, file_sr = sf.read(path, dtype="int16", always_2d=True)
+    return AudioSegment(data=samples.tobytes(), sample_width=2,
+                        frame_rate=file_sr, channels=samples.shape[1])
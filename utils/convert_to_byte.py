@@ -12,4 +12,9 @@ def convert_to_2bytes(audio_data, sample_rate):
         channels=1
     )
 
-    return audio_segment
\ No newline at end of file
+    return audio_segment
+
+def convert_to_float(audio_segment):
+    # Same scaling as librosa.load / soundfile for 16-bit PCM (divide by 2**15)
+    samples = np.array(audio_segment.get_array_of_samples(), dtype=np.float32)
+    return samples / audio_segment.max_possible_amplitude
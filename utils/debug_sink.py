@@ -0,0 +1,21 @@
+import os
+import soundfile as sf
+from PIL import Image
+
+
+def save_debug_artifacts(debug_dir, tag, sample_rate, audio=None, segments=(), images=()):
+    """
+    Optional disk sink for the in-memory pipeline: writes the input clip,
+    each cut segment and each feature image under {debug_dir}/{tag}/.
+    """
+    out_dir = os.path.join(debug_dir, tag)
+    os.makedirs(out_dir, exist_ok=True)
+
+    if audio is not None:
+        sf.write(os.path.join(out_dir, "input.wav"), audio, sample_rate)
+    for i, segment in enumerate(segments):
+        sf.write(os.path.join(out_dir, f"value_{i + 1}.wav"), segment, sample_rate)
+    for i, rgb_image in enumerate(images):
+        Image.fromarray(rgb_image).save(os.path.join(out_dir, f"value_{i + 1}.png"))
+
+    print(f"Saved debug artifacts to: {out_dir}")
@@ -0,0 +1,229 @@
+"""
+Memory-mapped feature shards: the uint8 (224, 224, 3) feature images of a
+dataset in fixed-record .npy files instead of one PNG per segment.
+
+    <shard_dir>/index.json           class names, shard list, record shape
+    <shard_dir>/shard_00000.npy      uint8 (N, 224, 224, 3), np.load(mmap_mode="r")
+    <shard_dir>/shard_00000_meta.npz labels (int16, -1 = no class folder), sources
+
+Reading never decodes anything: FeatureShards.batch(start, stop) is a view
+into the mapped file (zero-copy within one shard), cast to float32 only by
+whoever feeds the model.
+
+    python -m utils.feature_shards to-shards ./dataset/images ./dataset/shards
+    python -m utils.feature_shards to-png ./dataset/shards ./dataset/images_back
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import numpy as np
+
+INDEX_NAME = "index.json"
+RECORD_SHAPE = (224, 224, 3)
+SHARD_SIZE = 1024     # records per shard (~150 MB of uint8 images)
+
+
+def label_of(rel_path):
+    """Class = first folder of the path relative to the dataset root ("" when flat)."""
+    parts = rel_path.replace(os.sep, "/").split("/")
+    return parts[0] if len(parts) > 1 else ""
+
+
+class ShardWriter:
+    """
+    Append records, close() writes the index. Each shard is an open_memmap of
+    SHARD_SIZE records; the last one is trimmed to its real length on close.
+    """
+
+    def __init__(self, out_dir, class_names, shard_size=SHARD_SIZE, record_shape=RECORD_SHAPE):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.class_names = list(class_names)
+        self._class_index = {name: i for i, name in enumerate(self.class_names)}
+        self.shard_size = shard_size
+        self.record_shape = tuple(record_shape)
+        self.shards = []
+        self.count = 0
+        self._images = None
+        self._labels = []
+        self._sources = []
+
+    def _shard_name(self, i):
+        return f"shard_{i:05d}"
+
+    def add(self, image, label, source):
+        """image: uint8 record_shape array; label: class name (or "" / None)."""
+        if self._images is None:
+            path = os.path.join(self.out_dir, self._shard_name(len(self.shards)) + ".npy")
+            self._images = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8,
+                                                     shape=(self.shard_size,) + self.record_shape)
+        n = len(self._labels)
+        self._images[n] = image
+        self._labels.append(self._class_index.get(label, -1))
+        self._sources.append(source)
+        self.count += 1
+        if len(self._labels) == self.shard_size:
+            self._flush()
+
+    def _flush(self):
+        if self._images is None:
+            return
+        name = self._shard_name(len(self.shards))
+        path = os.path.join(self.out_dir, name + ".npy")
+        n = len(self._labels)
+        self._images.flush()
+        if n < self.shard_size:
+            trimmed = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=np.uint8,
+                                                shape=(n,) + self.record_shape)
+            trimmed[:] = self._images[:n]
+            trimmed.flush()
+            del trimmed
+        self._images = None
+        if n < self.shard_size:
+            os.replace(path + ".tmp", path)
+        np.savez(os.path.join(self.out_dir, name + "_meta.npz"),
+                 labels=np.asarray(self._labels, dtype=np.int16),
+                 sources=np.asarray(self._sources, dtype=str))
+        self.shards.append({"name": name, "count": n})
+        self._labels, self._sources = [], []
+
+    def close(self):
+        self._flush()
+        index = {
+            "class_names": self.class_names,
+            "record_shape": list(self.record_shape),
+            "dtype": "uint8",
+            "count": self.count,
+            "shards": self.shards,
+        }
+        with open(os.path.join(self.out_dir, INDEX_NAME), "w") as f:
+            json.dump(index, f, indent=1)
+        return index
+
+
+class FeatureShards:
+    """Read-only, memory-mapped view of a shard directory."""
+
+    def __init__(self, shard_dir):
+        with open(os.path.join(shard_dir, INDEX_NAME)) as f:
+            index = json.load(f)
+        self.shard_dir = shard_dir
+        self.class_names = index["class_names"]
+        self.record_shape = tuple(index["record_shape"])
+        self.images = []
+        labels, sources = [], []
+        for shard in index["shards"]:
+            base = os.path.join(shard_dir, shard["name"])
+            self.images.append(np.load(base + ".npy", mmap_mode="r"))
+            with np.load(base + "_meta.npz") as meta:
+                labels.append(meta["labels"])
+                sources.append(meta["sources"])
+        self.labels = np.concatenate(labels) if labels else np.zeros(0, dtype=np.int16)
+        self.sources = np.concatenate(sources) if sources else np.zeros(0, dtype=str)
+        self._offsets = np.cumsum([0] + [len(images) for images in self.images])
+
+    @staticmethod
+    def exists(shard_dir):
+        return os.path.exists(os.path.join(shard_dir, INDEX_NAME))
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def _locate(self, i):
+        shard = int(np.searchsorted(self._offsets, i, side="right") - 1)
+        return shard, i - int(self._offsets[shard])
+
+    def __getitem__(self, i):
+        """(uint8 image view, label) of record i."""
+        if i < 0:
+            i += len(self)
+        shard, j = self._locate(i)
+        return self.images[shard][j], int(self.labels[i])
+
+    def batch(self, start, stop):
+        """uint8 images [start, stop): a view when inside one shard, else one copy."""
+        stop = min(stop, len(self))
+        shard, j = self._locate(start)
+        if stop <= self._offsets[shard + 1]:
+            return self.images[shard][j:j + stop - start]
+        return np.concatenate([self[i][0][np.newaxis] for i in range(start, stop)])
+
+    def iter_batches(self, batch_size=32):
+        """(images, labels) per batch; batches do not cross shards, so images are views."""
+        for shard, images in enumerate(self.images):
+            offset = int(self._offsets[shard])
+            for j in range(0, len(images), batch_size):
+                view = images[j:j + batch_size]
+                yield view, self.labels[offset + j:offset + j + len(view)]
+
+
+def png_tree_to_shards(png_root, shard_dir, shard_size=SHARD_SIZE):
+    """Pack <png_root>/<class>/<name>.png into shards; returns the index."""
+    from PIL import Image
+
+    files = []
+    for dirpath, _, filenames in os.walk(png_root):
+        for f in sorted(filenames):
+            if f.endswith('.png'):
+                files.append(os.path.relpath(os.path.join(dirpath, f), png_root))
+    files.sort()
+    class_names = sorted({label_of(rel) for rel in files} - {""})
+
+    writer = ShardWriter(shard_dir, class_names, shard_size)
+    for rel in files:
+        img = Image.open(os.path.join(png_root, rel)).convert('RGB')
+        if img.size != RECORD_SHAPE[1::-1]:
+            img = img.resize(RECORD_SHAPE[1::-1])
+        writer.add(np.asarray(img), label_of(rel), rel)
+    return writer.close()
+
+
+def shards_to_png_tree(shard_dir, png_root):
+    """Unpack shards back into PNGs at their source paths; returns the number written."""
+    from PIL import Image
+
+    shards = FeatureShards(shard_dir)
+    for i, source in enumerate(shards.sources):
+        path = os.path.join(png_root, os.path.splitext(str(source))[0] + ".png")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        Image.fromarray(np.asarray(shards[i][0])).save(path)
+    return len(shards)
+
+
+def replace_dir(tmp_dir, target_dir):
+    """Swap a freshly written shard dir into place."""
+    old_dir = target_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(target_dir):
+        os.replace(target_dir, old_dir)
+    os.replace(tmp_dir, target_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert between a PNG feature tree and .npy shards")
+    sub = parser.add_subparsers(dest="command", required=True)
+    to_shards = sub.add_parser("to-shards", help="PNG tree -> shards")
+    to_shards.add_argument("png_root")
+    to_shards.add_argument("shard_dir")
+    to_shards.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    to_png = sub.add_parser("to-png", help="shards -> PNG tree")
+    to_png.add_argument("shard_dir")
+    to_png.add_argument("png_root")
+    args = parser.parse_args(argv)
+
+    if args.command == "to-shards":
+        index = png_tree_to_shards(args.png_root, args.shard_dir, args.shard_size)
+        print(f"Packed {index['count']} images into {len(index['shards'])} shards, "
+              f"classes: {index['class_names']}")
+    else:
+        n = shards_to_png_tree(args.shard_dir, args.png_root)
+        print(f"Wrote {n} PNGs to: {args.png_root}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
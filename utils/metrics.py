@@ -0,0 +1,189 @@
+"""
+Lightweight metrics for the running bin: named spans, counters and
+histograms, a Prometheus text endpoint on localhost and a periodic summary
+line. Cheap enough to stay on in production (a span is two perf_counter()
+calls plus one locked append).
+
+    from utils.metrics import metrics
+
+    with metrics.span("inference"):
+        ...
+    metrics.inc("items_silent")
+    metrics.observe("segments_per_item", len(segments))
+
+    metrics.serve(port=9108)          # curl localhost:9108/metrics
+    metrics.start_summary_log(60)     # one summary line per minute
+"""
+
+import bisect
+import collections
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "ecosonic_"
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10)
+
+# Spans in pipeline order, used to order the summary line
+STAGES = ("capture", "amplify", "segment", "features", "inference", "motor_move", "servo")
+
+
+class Histogram:
+    """Cumulative Prometheus buckets plus a rolling window for p50/p95."""
+
+    def __init__(self, buckets=SECONDS_BUCKETS, window=256):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)   # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = collections.deque(maxlen=window)
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantile(self, q):
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def _bucket_labels(histogram):
+    return [f"{b:g}" for b in histogram.buckets] + ["+Inf"]
+
+
+class Metrics:
+    def __init__(self, rate_window_s=60.0):
+        self._lock = threading.Lock()
+        self.counters = collections.OrderedDict()
+        self.histograms = collections.OrderedDict()
+        self.rate_window_s = rate_window_s
+        self._items = collections.deque()   # completion times for items/min
+        self.started = time.monotonic()
+        self._server = None
+        self._summary_stop = None
+
+    # ====== recording ======
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name):
+        """Time the block into the `<name>_seconds` histogram (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name + "_seconds", time.perf_counter() - start)
+
+    def item_done(self, now=None):
+        """Count one sorted item for items_total and the items/min rate."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.counters["items"] = self.counters.get("items", 0) + 1
+            self._items.append(now)
+
+    def items_per_minute(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            while self._items and now - self._items[0] > self.rate_window_s:
+                self._items.popleft()
+            n = len(self._items)
+        window = min(self.rate_window_s, max(now - self.started, 1e-9))
+        return n * 60.0 / window
+
+    # ====== output ======
+    def prometheus_text(self):
+        lines = []
+        rate = self.items_per_minute()
+        with self._lock:
+            for name, value in self.counters.items():
+                lines.append(f"# TYPE {PREFIX}{name}_total counter")
+                lines.append(f"{PREFIX}{name}_total {value}")
+            for name, h in self.histograms.items():
+                metric = PREFIX + name
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(_bucket_labels(h), h.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum {h.sum:.6f}")
+                lines.append(f"{metric}_count {h.count}")
+        lines.append(f"# TYPE {PREFIX}items_per_minute gauge")
+        lines.append(f"{PREFIX}items_per_minute {rate:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """One line: items/min, counters and p50/p95 per stage in ms."""
+        parts = [f"{self.items_per_minute():.1f} items/min"]
+        with self._lock:
+            parts += [f"{name}={value}" for name, value in self.counters.items()]
+            names = [s + "_seconds" for s in STAGES if s + "_seconds" in self.histograms]
+            names += [n for n in self.histograms if n not in names]
+            for name in names:
+                h = self.histograms[name]
+                p50, p95 = h.quantile(0.5), h.quantile(0.95)
+                if name.endswith("_seconds"):
+                    parts.append(f"{name[:-8]} {p50 * 1000:.0f}/{p95 * 1000:.0f} ms")
+                else:
+                    parts.append(f"{name} {p50:g}/{p95:g}")
+        return "Metrics: " + ", ".join(parts)
+
+    # ====== exporters ======
+    def serve(self, port=9108, host="127.0.0.1"):
+        """Prometheus text on http://host:port/metrics from a daemon thread."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics_http", daemon=True).start()
+        print(f"Metrics on http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def start_summary_log(self, interval_s=60.0):
+        self._summary_stop = threading.Event()
+
+        def run():
+            while not self._summary_stop.wait(interval_s):
+                print(self.summary())
+
+        threading.Thread(target=run, name="metrics_log", daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._summary_stop is not None:
+            self._summary_stop.set()
+
+
+# Process-wide registry used by app.py and the pipeline
+metrics = Metrics()
@@ -1,9 +1,23 @@
-from tensorflow.keras.preprocessing import image
 import numpy as np
 
 def convert_to_array(image_path):
+    from tensorflow.keras.preprocessing import image
     img = image.load_img(image_path, target_size=(224,224), color_mode='rgb')
     img_array = image.img_to_array(img)
     # img_array = img_array /255.0
     img_array = np.expand_dims(img_array, axis=0)
-    return img_array
\ No newline at end of file
+    return img_array
+
+def image_to_array(rgb_image):
+    # In-memory version of convert_to_array for a (224, 224, 3) uint8 image
+    img_array = np.asarray(rgb_image, dtype=np.float32)
+    # img_array = img_array /255.0
+    img_array = np.expand_dims(img_array, axis=0)
+    return img_array
+
+def stack_images(rgb_images):
+    # Stack N (224, 224, 3) uint8 images into one (N, 224, 224, 3) float32 batch
+    batch = np.empty((len(rgb_images), 224, 224, 3), dtype=np.float32)
+    for i, rgb_image in enumerate(rgb_images):
+        batch[i] = rgb_image
+    return batch
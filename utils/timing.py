@@ -0,0 +1,32 @@
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """Wall-clock breakdown of named phases (e.g. startup), printed by report()."""
+
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self._last = self.t0
+        self.phases = []
+
+    def mark(self, name):
+        """Record the time since the previous mark/phase (or t0) as phase `name`."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.phases.append((name, self._last - start))
+
+    def report(self, title="Startup time"):
+        total = time.perf_counter() - self.t0
+        print(f"{title}: {total:.2f} s")
+        for name, seconds in self.phases:
+            print(f"  {name:<16} {seconds:7.2f} s  ({seconds / total * 100:4.1f}%)")